@@ -15,22 +15,84 @@
         sliders may allow for user-created note sets when the "Play Chime" button is active.)
 
     •Keys 1-8 - For most scales, each note of the current note set may be played manually using these keys.
-        If a scale has more than eight notes, keys 9, 0, -, =, and BACKSPACE are incorporated.
+        If a scale has more than eight notes, keys 9, 0, -, =, and BACKSPACE are incorporated. The keys, and
+        whether held keys repeat and released keys stop their notes, can be changed in key_bindings.json
+        (see key_bindings.py).
+    •Delete - Stops the chime and the scale at once, and fades out every note still ringing (the drones keep playing)
+
+    Setting the environment variable UKULELE_CHIMES_METRICS to a file name records how late and how evenly the
+    notes play. The histograms are written to that file when the window closes, and F12 shows them in the window.
+
+    Setting the environment variable UKULELE_CHIMES_LONG_SESSION to 1 keeps the threads, sounds, and memory used
+    by the chime within fixed limits, for sessions left running for hours (see resource_guard.py).
+
+    Setting the environment variable UKULELE_CHIMES_SCALES to the path of a json file uses the scales in it instead
+    of the ones in music_scales.json (see scale_registry.py for how it is laid out).
+
+    Setting the environment variable UKULELE_CHIMES_RECORD to a file name records every note, and every change
+    of the settings, to an event log (see event_log.py), which Ukulele_Chimes_Replay.py plays back.
+
+    Setting the environment variable UKULELE_CHIMES_REVERB to room, hall, or cathedral adds the reverb of that
+    room to the notes and the drones (see reverb.py).
+
+    Setting the environment variable UKULELE_CHIMES_TEMPO to a number of beats per minute changes the tempo of
+    Play Scale (60 by default).
 
 """
 
+import os
 import sys
-import json
-import random
 import time
-import math
-import numpy
 import threading
+
+# The time to the first window is measured from here, so it includes loading PyQt5, pygame, and numpy
+START_TIME = time.perf_counter()
+
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
-from PyQt5 import uic
 import pygame
+from compiled_ui import load_ui
+from sample_bank import SampleBank
+from drone_synth import DRONE_FREQUENCIES
+from chime_state import ChimeState
+from chime_session import ChimeSession
+from key_bindings import KeyDispatcher, load_bindings
+from music_theory import TheoryTable, ROOT_NAMES
+from playback_metrics import PlaybackMetrics
+from widget_table import WidgetTable
+
+
+class SessionSignals(QObject):
+    """Overall class to carry what the session reports, from the GUI thread or from its scheduler's workers, to
+    slots that always run on the GUI thread."""
+
+    # The chime or the scale started (True) or stopped (False)
+    chime_changed = pyqtSignal(bool)
+    scale_playing = pyqtSignal(bool)
+
+    # The scale degree (0-12) the scale just played
+    scale_step = pyqtSignal(int)
+
+    # The frequencies of the drones now playing
+    drones_changed = pyqtSignal(object)
+
+    # The seconds taken to build every drone loop
+    drones_ready = pyqtSignal(float)
+
+    def __init__(self, parent=None):
+        """A method to map the kinds of the session's on_playback calls to the signals."""
+
+        super().__init__(parent)
+        self.signals = {'chime': self.chime_changed,
+                        'scale': self.scale_playing,
+                        'scale_step': self.scale_step,
+                        'drones': self.drones_changed}
+
+    def report(self, kind, value):
+        """A method to emit the signal for one change reported by the session (its on_playback)."""
+
+        self.signals[kind].emit(value)
 
 
 class UkuleleChimes(QWidget):
@@ -41,35 +103,29 @@ class UkuleleChimes(QWidget):
 
         super(UkuleleChimes, self).__init__(parent)
 
-        # Load GUI layout
-        uic.loadUi("Ukulele_Chimes_Layout.ui", self)
+        # Load GUI layout, from Python code generated from the .ui file the first time the program runs
+        load_ui("Ukulele_Chimes_Layout.ui", self, 'ui_cache')
 
-        # Load json file containing music scales
-        filename = 'music_scales.json'
-        with open(filename, encoding='utf-8') as f:
-            self.all_scale_data = json.load(f)
-        self.scales = self.all_scale_data["Scales"]
+        # Find the labels and sliders of the note columns once, instead of by name on every update
+        self.widgets = WidgetTable(self)
 
-        # Load json file containing musical key roots
-        filename = 'roots.json'
-        with open(filename, encoding='utf-8') as f:
-            self.all_root_data = json.load(f)
+        # Load the json files containing music scales and musical key roots. The degrees, intervals, and note
+        # names of each scale/mode/root are worked out the first time they are needed.
+        scales_path = os.environ.get('UKULELE_CHIMES_SCALES') or 'music_scales.json'
+        self.theory = TheoryTable.load(scales_path, 'roots.json', None, lazy=True)
+        self.all_scale_data = self.theory.all_scale_data
+        self.scales = self.all_scale_data["Scales"]
+        self.scale_registry = self.theory.registry
+        self.all_root_data = self.theory.all_root_data
         self.roots = self.all_root_data["Roots"]
 
-        # Initialize pygame.mixer
-        pygame.init()
+        # Initialize pygame.mixer (the only part of pygame that is used)
         pygame.mixer.init()
         pygame.mixer.set_num_channels(16)
 
         # Create a list of all scale names
-        self.scale_names = []
+        self.scale_names = list(self.scale_registry.names())
         self.mode_degrees = []
-        for key, value in self.scales.items():
-            self.scale_names.append(value["name"])
-
-        self.playing_chimes_list = []
-
-        self.allow_play = True
 
         # Window setup
         self.title = "Ukulele Chimes"
@@ -79,36 +135,26 @@ class UkuleleChimes(QWidget):
         self.setFixedWidth(self.window_width)
         self.setFixedHeight(self.window_height)
 
-        self.root_list = ['G', 'G♯/A♭', 'A', 'A♯/B♭', 'B', 'C', 'C♯/D♭', 'D', 'D♯/E♭', 'E', 'F', 'F♯/G♭']
+        self.root_list = list(ROOT_NAMES)
 
         # Connect the root dial
         self.root_label_display = self.findChild(QLabel, 'root_label_display')
         self.root = (int(self.root_dial.value()))
-        self.root_label_display.setText(self.root_list[self.root])
+        self.widgets.set_text(self.root_label_display, self.root_list[self.root])
         self.root_dial = self.findChild(QDial, 'root_dial')
         self.root_dial.valueChanged.connect(self.root_dial_changed)
 
-        # Load and assign the audio files
-        self.notes = []
-        for i in range(0, 24):
-            si = '%02d' % i
-            self.notes.append({i: f'AudioFiles/note_{si}.wav'})
+        # The audio files are read into memory in the background once the window is up (or when first played)
+        self.sample_bank = SampleBank('AudioFiles', 24)
 
         # Create the drone note list
-        self.drones = []
-        d = 196
-        for i in range(0, 24):
-            self.drones.append(d)
-            d *= 1.059463
+        self.drones = list(DRONE_FREQUENCIES)
 
         # Connect the drone volume sliders
         self.drone_volume_slider_00 = self.findChild(QSlider, "drone_slider_00")
         self.drone_volume_slider_01 = self.findChild(QSlider, "drone_slider_01")
-
-        # Create the current note set with default settings
-        self.current_note_set = []
-        for i in range(5, 18):
-            self.current_note_set.append({'note': self.notes[i], 'volume': 5, 'tempo': 5, 'drone': self.drones[i]})
+        self.drone_volume_slider_00.valueChanged.connect(self.drone_volume_slider_changed)
+        self.drone_volume_slider_01.valueChanged.connect(self.drone_volume_slider_changed)
 
         # Connect the current scale label
         self.current_scale_label = self.findChild(QLabel, "current_scale_label")
@@ -117,22 +163,20 @@ class UkuleleChimes(QWidget):
         self.scale_combo_box = self.findChild(QComboBox, "scale_combo_box")
         for scale in self.scale_names:
             self.scale_combo_box.addItem(scale)
+        self.scale_combo_box.currentTextChanged.connect(self.update_current_scale)
 
         self.current_display_notes = []
 
-        self.start_time = time.time()
-
-        self.drone_root = self.current_note_set[0]['drone']
+        self.drone_root = self.drones[self.root]
 
         # Connect the mode slider
         self.mode_slider = self.findChild(QSlider, "mode_slider")
         self.current_mode = self.mode_slider.value()
-        self.previous_mode = self.current_mode
         self.mode_slider.valueChanged.connect(self.mode_slider_changed)
 
         # Establish the current scale and current mode degrees
-        self.current_scale = self.scales["major"]
-        for scale_degree in self.current_scale["degrees"]:
+        self.current_scale = self.scale_registry["major"]
+        for scale_degree in self.current_scale.degrees:
             self.mode_degrees.append(scale_degree)
 
         # Create the mode_intervals list, which is used for the scale degree labels.
@@ -142,10 +186,8 @@ class UkuleleChimes(QWidget):
         # Connect the play chime buttons
         self.play_chime_button.clicked.connect(self.chime_on_off)
 
-        self.play_chime_notes = False
-
-        self.drone_root_label = self.current_scale["degrees"][0]
-        self.drone_5th_label = self.current_scale["degrees"][4]
+        self.drone_root_label = self.current_scale.degrees[0]
+        self.drone_5th_label = self.current_scale.degrees[4]
 
         # Connect the play scale button
         self.play_scale_button.clicked.connect(self.play_scale)
@@ -153,457 +195,209 @@ class UkuleleChimes(QWidget):
         # Connect the Reset All button
         self.reset_all_button.clicked.connect(self.reset_all)
 
-        self.scale_note_finder()
+        # Connect the note volume sliders
+        for slider in self.widgets.volume_sliders:
+            slider.valueChanged.connect(self.volume_slider_changed)
+
+        # Hold the settings in one place. Changing a setting marks only the values that depend on it as dirty,
+        # and _check_events recomputes those values once, instead of on every repaint.
+        self.state = ChimeState(root=self.root,
+                                scale="major",
+                                mode=self.current_mode,
+                                volumes=[slider.value() for slider in self.widgets.volume_sliders],
+                                drone_volumes=[self.drone_volume_slider_00.value(),
+                                               self.drone_volume_slider_01.value()])
+
+        # Optional timing histograms, and an overlay to show them (toggled with F12)
+        self.metrics_path = os.environ.get('UKULELE_CHIMES_METRICS')
+        self.metrics = PlaybackMetrics() if self.metrics_path else None
+        self.metrics_overlay = None
+
+        # The chime, the scale, and the drones are played by the session, which shares the same state. Its notes
+        # are timed on the scheduler's thread, and anything it reports comes back through Qt signals.
+        self.session_signals = SessionSignals(self)
+        self.session_signals.chime_changed.connect(self.chime_changed)
+        self.session_signals.scale_playing.connect(self.scale_playing)
+        self.session_signals.scale_step.connect(self.scale_step_played)
+        self.session_signals.drones_changed.connect(self.drones_changed)
+        self.session_signals.drones_ready.connect(self.drones_ready)
+        self.session = ChimeSession(self.sample_bank, self.theory, self.state, voices=16,
+                                    tempo=float(os.environ.get('UKULELE_CHIMES_TEMPO') or 60),
+                                    metrics=self.metrics,
+                                    long_session=os.environ.get('UKULELE_CHIMES_LONG_SESSION') == '1',
+                                    record=os.environ.get('UKULELE_CHIMES_RECORD') or None,
+                                    on_drones_ready=self.session_signals.drones_ready.emit,
+                                    reverb=os.environ.get('UKULELE_CHIMES_REVERB') or None,
+                                    on_playback=self.session_signals.report)
+
+        # Each key is looked up in a table of ready-to-play notes, rebuilt by _check_events when the settings change
+        bindings, repeat, release = load_bindings('key_bindings.json')
+        self.key_dispatcher = KeyDispatcher(self.session, bindings, repeat, release)
+        self.key_dispatcher.on('stop', self.stop_key)
+        if self.metrics is not None:
+            self.key_dispatcher.on('metrics', self.toggle_metrics_overlay)
 
-        self.update_note_labels()
+        self._check_events()
 
-        self.drone_note()
+        self.first_window_time = None
 
-        self.update_current_note_set()
+    def showEvent(self, event):
+        """A method to start loading the audio files, and to measure the time to the first window, once the
+        window is shown."""
 
-    def mode_finder(self):
-        """A method to create a list of scale degrees based on the current mode of the current scale."""
+        super().showEvent(event)
 
-        self.mode_degrees.clear()
-        temp_mode_degrees = []
-        temp2_mode_degrees = []
+        if self.first_window_time is None:
+            self.first_window_time = 0.0
+            threading.Thread(target=self.sample_bank.load, name='sample_loader', daemon=True).start()
 
-        scale_degrees = self.current_scale["degrees"]  # List of degrees
-        current_mode_degree = scale_degrees[self.current_mode - 1]  # Mode 1 = 0
+            # Measured once the event loop has drawn the window
+            QTimer.singleShot(0, self.window_shown)
 
-        if self.current_scale["name"] == "Chromatic":
-            self.mode_degrees = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
-        else:
-            for degree in scale_degrees:
-                if degree < current_mode_degree:
-                    degree += 12
-                    temp_mode_degrees.append(degree)
-                else:
-                    temp_mode_degrees.append(degree)
-            temp_mode_degrees.append(current_mode_degree + 12)
-            for i in temp_mode_degrees:
-                if i not in temp2_mode_degrees:
-                    temp2_mode_degrees.append(i)
-            for item in temp2_mode_degrees:
-                item -= current_mode_degree
-                self.mode_degrees.append(item)
-
-        self.mode_degrees.sort()
+    def window_shown(self):
+        """A method to record the time from the program starting to its first window."""
 
-    def update_current_scale(self):
-        """A method to update the self.current_scale variable."""
-        new_scale = self.scale_combo_box.currentText()
-        for key in self.scales:
-            if new_scale == self.scales[key]["name"]:
-                if new_scale != self.current_scale["name"]:
-                    self.scale_changed(key)
-                else:
-                    pass
-            else:
-                pass
+        self.first_window_time = time.perf_counter() - START_TIME
+        if self.metrics is not None:
+            self.metrics.record('startup.first_window', self.first_window_time)
 
-    def update_current_scale_label(self):
-        """A method to update the self.current_scale_label with the root, scale, and mode"""
+    def drones_ready(self, seconds):
+        """A method to record the time taken to build every drone loop."""
 
-        one_mode = ["Whole Tone", "Chromatic"]
-        two_modes = ["Augmented", "Diminished"]
+        if self.metrics is not None:
+            self.metrics.record('startup.drones_ready', seconds)
 
-        mode_index = self.current_mode - 1
-        current_scale_label_0a = self.current_display_notes[0]
-        current_scale_label_0b = str(self.current_scale["name"])
-        current_scale_label_0c = " Scale"
+    def theory_entry(self):
+        """A method to look up the current scale/mode/root in the music theory table."""
 
-        if self.current_scale["name"] in one_mode:
-            current_scale_label_0d = ''
-        elif self.current_scale["name"] in two_modes:
-            current_scale_label_0d = ", " + self.current_scale["modes"][mode_index]
-        else:
-            current_scale_label_0d = ", Mode " + str(self.current_mode)
+        return self.theory.lookup(self.state.scale, self.current_mode, self.root)
+
+    def mode_finder(self):
+        """A method to create a list of scale degrees based on the current mode of the current scale."""
 
-        current_scale_label_0 = current_scale_label_0a + " " \
-                                + current_scale_label_0b \
-                                + current_scale_label_0c \
-                                + current_scale_label_0d
+        self.mode_degrees = list(self.theory_entry().degrees)
 
-        current_scale_label_1 = self.current_scale["modes"][mode_index]
+    def update_current_scale(self):
+        """A method to respond to a new scale being selected in the scale combo box."""
+        new_scale = self.scale_registry.from_name(self.scale_combo_box.currentText())
+        if new_scale is not None and new_scale.key != self.state.scale:
+            self.scale_changed(new_scale.key)
 
-        if self.current_scale["name"] == self.current_scale["modes"][mode_index] or "Mode" in current_scale_label_1:
-            self.label = current_scale_label_0
-        else:
-            self.label = current_scale_label_0 \
-                         + " (" + current_scale_label_1 \
-                         + ")"
-        self.current_scale_label.setText(self.label)
+    def update_current_scale_label(self):
+        """A method to update the self.current_scale_label with the root, scale, and mode"""
+
+        self.label = self.theory_entry().label
+        self.widgets.set_text(self.current_scale_label, self.label)
 
     def mode_interval_finder(self):
         """A method to name the intervals (i.e. 1, 2, ♭3, etc.) for the current mode"""
 
-        temp_ints = []
-        temp_ints.clear()
-        for interval in self.mode_intervals:
-            temp_ints.append(interval)
-        self.mode_intervals.clear()
-
-        if len(self.mode_degrees) == 13:
-            chromatic_scale = ['1', '♭2', '2', '♭3', '3', '4', '♭5',
-                               '5', '♭6', '6', '♭7', '7', '8']
-            for interval in chromatic_scale:
-                self.mode_intervals.append(interval)
+        self.mode_intervals = list(self.theory_entry().intervals)
 
-        elif len(self.mode_degrees) < 13:
-            if 0 in self.mode_degrees:
-                self.mode_intervals.append('1')
+    def scale_note_finder(self):
+        """A method to determine the correct note names for the current scale/mode"""
 
-            if 1 in self.mode_degrees:
-                self.mode_intervals.append('♭2')
-            else:
-                self.mode_intervals.append('')
-
-            if 2 in self.mode_degrees:
-                if 1 in self.mode_degrees and len(self.current_scale["degrees"]) == 9:
-                    self.mode_intervals.append('2')
-                elif 1 in self.mode_degrees:
-                    self.mode_intervals.append('𝄫3')
-                else:
-                    self.mode_intervals.append('2')
-            else:
-                self.mode_intervals.append('')
-
-            if 3 in self.mode_degrees:
-                if len(self.current_scale["degrees"]) > 7:
-                    if 1 not in self.mode_degrees and 2 not in self.mode_degrees:
-                        self.mode_intervals.append('♯2')
-                    elif '𝄫3' in self.mode_intervals:
-                        self.mode_intervals.append('𝄫4')
-                    else:
-                        self.mode_intervals.append('♭3')
-                elif len(self.current_scale["degrees"]) == 7:
-                    if self.current_scale["name"] == 'Augmented' and self.current_mode % 2 != 0:
-                        self.mode_intervals.append('♯2')
-                    elif self.current_scale["name"] == 'Pelog' and self.current_mode == 4:
-                        self.mode_intervals.append('♯2')
-                    else:
-                        self.mode_intervals.append('♭3')
-                else:
-                    self.mode_intervals.append('♭3')
-            else:
-                self.mode_intervals.append('')
-
-            if 4 in self.mode_degrees:
-                if len(self.current_scale["degrees"]) == 8:
-                    if '♭3' in self.mode_intervals:
-                        self.mode_intervals.append('♭4')
-                    elif '𝄫3' in self.mode_intervals:
-                        self.mode_intervals.append('♭4')
-                    else:
-                        self.mode_intervals.append('3')
-                elif len(self.current_scale["degrees"]) == 6:
-                    self.mode_intervals.append('3')
-                elif len(self.current_scale["degrees"]) == 7:
-                    if self.current_scale["name"] == 'Pelog' and self.current_mode == 1:
-                        self.mode_intervals.append('♭4')
-                    else:
-                        self.mode_intervals.append('3')
-                elif len(self.current_scale["degrees"]) == 9:
-                    self.mode_intervals.append('3')
-            else:
-                self.mode_intervals.append('')
-
-            if 5 in self.mode_degrees:
-                if len(self.current_scale["degrees"]) == 8:
-                    if self.current_scale["name"] == 'Enigmatic' and self.current_mode == 5:
-                        self.mode_intervals.append('𝄫5')
-                    elif '𝄫4' in self.mode_intervals:
-                        self.mode_intervals.append('𝄫5')
-                    elif '♭4' in self.mode_intervals:
-                        self.mode_intervals.append('𝄫5')
-                    elif '𝄫3' in self.mode_intervals:
-                        self.mode_intervals.append('4')
-                    elif '♭3' in self.mode_intervals:
-                        self.mode_intervals.append('4')
-                    elif '3' in self.mode_intervals:
-                        self.mode_intervals.append('4')
-                    else:
-                        self.mode_intervals.append('♯3')
-                else:
-                    self.mode_intervals.append('4')
-            else:
-                self.mode_intervals.append('')
-
-            if 6 in self.mode_degrees:
-                if len(self.current_scale["degrees"]) == 8:
-                    if '4' in self.mode_intervals:
-                        self.mode_intervals.append('♭5')
-                    elif '♭4' in self.mode_intervals:
-                        self.mode_intervals.append('♭5')
-                    elif '𝄫4' in self.mode_intervals:
-                        self.mode_intervals.append('♭5')
-                    else:
-                        self.mode_intervals.append('♯4')
-                elif len(self.current_scale["degrees"]) == 6:
-                    if self.current_scale["name"] == 'Hirajōshi' and self.current_mode == 5:
-                        self.mode_intervals.append('♯4')
-                    else:
-                        self.mode_intervals.append('♭5')
-                elif len(self.current_scale["degrees"]) == 7:
-                    if self.current_scale["name"] == 'Pelog' and self.current_mode == 2:
-                        self.mode_intervals.append('♯4')
-                    elif self.current_scale["name"] == 'Whole Tone':
-                        self.mode_intervals.append('♯4')
-                    else:
-                        self.mode_intervals.append('♭5')
-                elif len(self.current_scale["degrees"]) == 9:
-                    if '4' in self.mode_intervals:
-                        self.mode_intervals.append('♭5')
-                    else:
-                        self.mode_intervals.append('♯4')
-            else:
-                self.mode_intervals.append('')
-
-            if 7 in self.mode_degrees:
-                if len(self.current_scale["degrees"]) == 8:
-                    if self.current_scale["name"] == 'Enigmatic Minor' and self.current_mode == 3:
-                        self.mode_intervals.append('𝄪4')
-                    elif self.current_scale["name"] == 'Enigmatic Minor' and self.current_mode == 4:
-                        self.mode_intervals.append('𝄫6')
-                    elif self.current_scale["name"] == 'Enigmatic Major' and self.current_mode == 2:
-                        self.mode_intervals.append('𝄪4')
-                    elif self.current_scale["name"] == 'Enigmatic Major' and self.current_mode == 4:
-                        self.mode_intervals.append('𝄫6')
-                    elif self.current_scale["name"] == 'Hungarian Major' and self.current_mode == 2:
-                        self.mode_intervals.append('𝄫6')
-                    elif self.current_scale["name"] == 'Composite II' and self.current_mode == 4:
-                        self.mode_intervals.append('𝄫6')
-                    elif self.current_scale["name"] == 'Ionian ♭5' and self.current_mode == 7:
-                        self.mode_intervals.append('𝄫6')
-                    elif self.current_scale["name"] == 'Locrian ♮7' and self.current_mode == 7:
-                        self.mode_intervals.append('𝄫6')
-                    elif self.current_scale["name"] == 'Persian' and self.current_mode == 7:
-                        self.mode_intervals.append('𝄫6')
-                    else:
-                        self.mode_intervals.append('5')
-                else:
-                    self.mode_intervals.append('5')
-            else:
-                self.mode_intervals.append('')
-
-            if 8 in self.mode_degrees:
-                if len(self.current_scale["degrees"]) == 8:
-                    if '5' in self.mode_intervals:
-                        self.mode_intervals.append('♭6')
-                    elif '♭5' in self.mode_intervals:
-                        self.mode_intervals.append('♭6')
-                    elif '𝄫5' in self.mode_intervals:
-                        self.mode_intervals.append('♭6')
-                    else:
-                        self.mode_intervals.append('♯5')
-                elif len(self.current_scale["degrees"]) == 6:
-                    if self.current_scale["name"] == 'Major Pentatonic' and self.current_mode == 3:
-                        self.mode_intervals.append('♯5')
-                    elif self.current_scale["name"] == 'Minor Pentatonic' and self.current_mode == 4:
-                        self.mode_intervals.append('♯5')
-                    else:
-                        self.mode_intervals.append('♭6')
-                elif len(self.current_scale["degrees"]) == 7:
-                    if self.current_scale["name"] == 'Whole Tone':
-                        self.mode_intervals.append('♯5')
-                    elif self.current_scale["name"] == 'Augmented' and self.current_mode % 2 == 0:
-                        self.mode_intervals.append('♯5')
-                    elif self.current_scale["name"] == 'Pelog' and self.current_mode == 4:
-                        self.mode_intervals.append('♯5')
-                    else:
-                        self.mode_intervals.append('♭6')
-                elif len(self.current_scale["degrees"]) == 9:
-                    if self.current_scale["name"] == 'Bebop Dorian' and self.current_mode == 3:
-                        self.mode_intervals.append('♭6')
-                    elif '♯4' in self.mode_intervals:
-                        self.mode_intervals.append('♯5')
-                    else:
-                        self.mode_intervals.append('♭6')
-            else:
-                self.mode_intervals.append('')
-
-            if 9 in self.mode_degrees:
-                if len(self.current_scale["degrees"]) == 8:
-                    if self.current_scale["name"] == 'Enigmatic Minor' and self.current_mode == 2:
-                        self.mode_intervals.append('𝄪5')
-                    elif self.current_scale["name"] == 'Enigmatic Major' and self.current_mode == 2:
-                        self.mode_intervals.append('𝄪5')
-                    elif '♭6' in self.mode_intervals:
-                        self.mode_intervals.append('𝄫7')
-                    elif '𝄫6' in self.mode_intervals:
-                        self.mode_intervals.append('𝄫7')
-                    else:
-                        self.mode_intervals.append('6')
-                elif len(self.current_scale["degrees"]) == 6:
-                    self.mode_intervals.append('6')
-                elif len(self.current_scale["degrees"]) == 7:
-                    if '♭6' in self.mode_intervals:
-                        self.mode_intervals.append('𝄫7')
-                    else:
-                        self.mode_intervals.append('6')
-                elif len(self.current_scale["degrees"]) == 9:
-                    self.mode_intervals.append('6')
-            else:
-                self.mode_intervals.append('')
-
-            if 10 in self.mode_degrees:
-                if len(self.current_scale["degrees"]) == 8:
-                    if '𝄫6' in self.mode_intervals:
-                        self.mode_intervals.append('♭7')
-                    elif '♭6' in self.mode_intervals:
-                        self.mode_intervals.append('♭7')
-                    elif '6' in self.mode_intervals:
-                        self.mode_intervals.append('♭7')
-                    elif self.mode_degrees[-2] == 10:
-                        self.mode_intervals.append('♭7')
-                    else:
-                        self.mode_intervals.append('♯6')
-                elif len(self.current_scale["degrees"]) == 6:
-                    self.mode_intervals.append('♭7')
-                elif len(self.current_scale["degrees"]) == 7:
-                    self.mode_intervals.append('♭7')
-                elif len(self.current_scale["degrees"]) == 9:
-                    if self.current_scale["name"] == 'Bebop Dorian' and self.current_mode == 8:
-                        self.mode_intervals.append('♯6')
-                    else:
-                        self.mode_intervals.append('♭7')
-            else:
-                self.mode_intervals.append('')
+        self.current_display_notes = list(self.theory_entry().display_notes)
 
-            if 11 in self.mode_degrees:
-                self.mode_intervals.append('7')
+    def _check_events(self):
+        """A method to recompute the values made out of date by the settings that changed since the last call."""
+
+        start_time = time.perf_counter()
+        skipped = self.widgets.skipped
+
+        self.root = self.state.root
+        self.current_mode = self.state.mode
+        self.current_scale = self.scale_registry[self.state.scale]
+
+        for name in self.state.take_dirty():
+            if name == 'mode_range':
+                self.mode_slider.setMaximum(self.current_scale.mode_count)
+            elif name == 'degrees':
+                self.mode_finder()
+            elif name == 'intervals':
+                self.mode_interval_finder()
+            elif name == 'display_notes':
+                self.scale_note_finder()
+            elif name == 'keys':
+                self.key_dispatcher.rebuild()
+            elif name == 'labels':
+                self.update_note_labels()
+                self.mute_unused_notes()
+                self.update_scale_degree_labels()
+                self.update_current_scale_label()
+            elif name == 'drones':
+                self.drone_note()
             else:
-                self.mode_intervals.append('')
+                self.session.apply_change(name)
 
-            if 12 in self.mode_degrees:
-                self.mode_intervals.append('8')
+        if self.metrics is not None:
+            self.metrics.record('check_events', time.perf_counter() - start_time)
+            self.metrics.gauge('check_events.skipped_widget_calls', self.widgets.skipped - skipped)
 
-    def scale_note_finder(self):
-        """A method to determine the correct note names for the current scale/mode"""
+    def check_chime_button(self):
+        """A method to update the Play Chime button to match whether the chime is on."""
 
-        if len(self.current_display_notes) < len(self.mode_degrees):
-            pass
+        if self.session.chime_on:
+            self.widgets.set_text(self.play_chime_button, "Stop Chime")
         else:
-            self.current_display_notes.clear()
-
-        temp_ints = []
-        temp_ints.clear()
-
-        temp_degrees = []
+            self.widgets.set_text(self.play_chime_button, "Play Chime")
 
-        for degree in self.mode_degrees:
-            temp_degrees.append(degree)
+    def chime_changed(self, on):
+        """A method to respond to the chime starting or stopping."""
 
-        for interval in self.mode_intervals:
-            temp_ints.append(interval)
-
-        root_note = self.current_scale["roots"][str(self.current_mode)][self.root]  # 'C'
+        self.check_chime_button()
 
-        current_key = self.roots[root_note]
+    def scale_playing(self, playing):
+        """A method to respond to the scale starting, or finishing or being stopped. The last note played is no
+        longer lit up once the scale is over."""
 
-        for key, value in current_key.items():
-            if key in temp_ints:
-                self.current_display_notes.append(value)
+        if not playing:
+            self.mute_unused_notes()
 
-        if self.current_scale["name"] == "Chromatic" and self.root == 11 and self.current_mode == 11:
-            self.current_display_notes[11] = '♫'
+    def scale_step_played(self, degree):
+        """A method to light up the note label of the scale degree the scale just played."""
 
-    def paintEvent(self, event):
-        """A method to draw and update the graphicsView."""
-        self._check_events()
+        # Style sheet for the note being played
+        playing = "font: 10pt 'Malgun Gothic'; background-color: rgb(150, 190, 150)"
 
-    def _check_events(self):
-        self.update_current_scale_label()
-        self.update_current_scale()
-        self.update_note_labels()
-        self.update_current_note_set()
-        self.mode_slider_changed()
-        self.update_current_drones()
-        self.check_chime_button()
+        self.mute_unused_notes()
+        self.widgets.set_style(self.widgets.note_labels[degree], playing)
 
-    def check_chime_button(self):
+    def drones_changed(self, frequencies):
+        """A method to show the frequencies of the drones now playing on the drone labels."""
 
-        if self.play_chime_notes and not self.playing_chimes():
-            self.play_chime_button.setText("Stop Chime")
-            for degree in self.mode_degrees:
-                self.do_in_background_as_well(self.play_chime, [degree])
-        elif not self.play_chime_notes:
-            self.play_chime_button.setText("Play Chime")
+        for i, label in enumerate((self.drone_label_00, self.drone_label_01)):
+            label.setToolTip(f'{frequencies[i]:.2f} Hz' if i < len(frequencies) else '')
 
     def scale_changed(self, key):
+        """A method to respond to the scale being changed. The mode is reset to the first mode."""
+        self.state.set('scale', key)
+        self.state.set('mode', 1)
         self.mode_slider.setValue(1)
-        self.current_mode = self.mode_slider.value()
-        self.current_scale = self.scales[key]
-        self.scale_note_finder()
-        self.mode_slider.setMaximum(len(self.current_scale["degrees"]) - 1)
-        self.mode_interval_finder()
-        self.mute_unused_notes()
-        self.mode_finder()
-
-        self.drone_first.stop()
-        self.drone_second.stop()
-        self.update_current_note_set()
-        self.drone_note()
+        self._check_events()
 
     def root_dial_changed(self):
         """A method to respond to the root dial being altered."""
-        self.root = (int(self.root_dial.value()))
-        self.root_label_display.setText(self.root_list[self.root])
-        self.scale_note_finder()
-        self.mute_unused_notes()
-        self.mode_finder()
-
-        self.drone_first.stop()
-        self.drone_second.stop()
-        self.update_current_note_set()
-        self.drone_note()
+        self.widgets.set_text(self.root_label_display, self.root_list[int(self.root_dial.value())])
+        self.state.set('root', int(self.root_dial.value()))
+        self._check_events()
 
     def mode_slider_changed(self):
         """A method to respond to the mode slider being moved."""
-        self.current_mode = self.mode_slider.value()
-        self.update_current_scale()
-        self.scale_note_finder()
-        self.update_note_labels()
-        self.mute_unused_notes()
-        self.mode_interval_finder()
-        self.mode_finder()
-        self.update_scale_degree_labels()
-
-        count = 1
-        if self.current_mode != self.previous_mode:
-            self.root_dial_changed()
-            count += 1
-            if count > 1:
-                self.previous_mode = self.current_mode
-                count = 0
-
-    def update_current_note_set(self):
-        """A method to determine which audio samples to use, based on the current scale, root, and mode"""
-
-        # Update the notes used based on the root dial setting
-        for i in range(0, 13):
-            si = "%02d" % i
-            si = int(si) + self.root
-            if int(si) < 10:
-                si = "0" + str(si)
-            else:
-                pass
-
-            self.current_note_set[i]['note'] = self.notes[int(si)]
-
-            self.current_note_set[i]['drone'] = self.drones[int(si)]
-
-        # Update each notes' volume based on the current value of the volume sliders
-        for i in range(0, 13):
-            si = "%02d" % i
-            slider_name = "volume_slider_" + si
-            slider = getattr(self, slider_name)
+        self.state.set('mode', self.mode_slider.value())
+        self._check_events()
 
-            self.current_note_set[i]['volume'] = slider.value() / 10
+    def volume_slider_changed(self):
+        """A method to respond to any of the note volume sliders being moved."""
+        for i, slider in enumerate(self.widgets.volume_sliders):
+            self.state.set_volume(i, slider.value())
+        self._check_events()
 
-        self.drone_first.set_volume(self.drone_volume_slider_00.value() / 10)
-        self.drone_second.set_volume(self.drone_volume_slider_01.value() / 10)
+    def drone_volume_slider_changed(self):
+        """A method to respond to either of the drone volume sliders being moved."""
+        self.state.set_drone_volume(0, self.drone_volume_slider_00.value())
+        self.state.set_drone_volume(1, self.drone_volume_slider_01.value())
+        self._check_events()
 
     def mute_unused_notes(self):
         """A method to mute notes not used in the current scale."""
@@ -623,38 +417,20 @@ class UkuleleChimes(QWidget):
             else:
                 pass
 
+        # Only the labels that change between light and dark are restyled
         for i in range(0, 13):
-            si = "%02d" % i
-
-            # Find the note labels
-            label_name = "note_" + si + "_label"
-            note_label = getattr(self, label_name)
-
-            # Find the scale degree labels
-            degree_label_name = "scale_degree_" + si + "_label"
-            degree_label = getattr(self, degree_label_name)
-
-            if i in self.mode_degrees:
-                note_label.setStyleSheet(light)
-                degree_label.setStyleSheet(light)
-            else:
-                note_label.setStyleSheet(dark)
-                degree_label.setStyleSheet(dark)
+            style = light if i in self.mode_degrees else dark
+            self.widgets.set_style(self.widgets.note_labels[i], style)
+            self.widgets.set_style(self.widgets.degree_labels[i], style)
 
     def update_scale_degree_labels(self):
         """A method to update the scale degree labels when a new scale and/or mode is selected"""
 
         for i in range(0, 12):
-            si = "%02d" % i
-
-            # Find the scale degree label
-            scale_degree_label_name = "scale_degree_" + si + "_label"
-            scale_degree_label_widget = getattr(self, scale_degree_label_name)
-
             if i in self.unmuted_notes:
-                scale_degree_label_widget.setText(self.mode_intervals[i])
+                self.widgets.set_text(self.widgets.degree_labels[i], self.mode_intervals[i])
             else:
-                scale_degree_label_widget.setText('')
+                self.widgets.set_text(self.widgets.degree_labels[i], '')
 
     def update_note_labels(self):
         """A method to update the note labels."""
@@ -669,276 +445,127 @@ class UkuleleChimes(QWidget):
         index = 0
 
         for i in range(0, 13):
-            si = "%02d" % i  # String Index
-            label_name = "note_" + si + "_label"
-            label_widget = getattr(self, label_name)
-
             if i in self.mode_degrees:
                 label = self.current_display_notes[index]
                 index += 1
             else:
                 label = ''
 
-            previous_label = label_widget.text()
-
-            label_widget.setText(label)
+            self.widgets.set_text(self.widgets.note_labels[i], label)
 
     def update_current_drones(self):
         """A method to update the drone notes displayed and played"""
 
-        self.drone_root_label = self.note_00_label.text()
-        self.drone_root = self.current_note_set[0]['drone']
-
-        if len(self.mode_degrees) != 6:
-            if "5" in self.mode_intervals:
-                self.drone_5th_label = self.note_07_label.text()
-                self.drone_5th = self.current_note_set[7]['drone']
-            elif "♭5" in self.mode_intervals:
-                self.drone_5th_label = self.note_06_label.text()
-                self.drone_5th = self.current_note_set[6]['drone']
-            elif "♯5" in self.mode_intervals:
-                self.drone_5th_label = self.note_08_label.text()
-                self.drone_5th = self.current_note_set[8]['drone']
-            elif "𝄫5" in self.mode_intervals:
-                self.drone_5th_label = self.note_05_label.text()
-                self.drone_5th = self.current_note_set[5]['drone']
-            elif "𝄪5" in self.mode_intervals:
-                self.drone_5th_label = self.note_09_label.text()
-                self.drone_5th = self.current_note_set[9]['drone']
-            else:
-                self.drone_5th_label = self.note_05_label.text()
-                self.drone_5th = self.current_note_set[5]['drone']
-        else:
-            if "5" in self.mode_intervals:
-                self.drone_5th_label = self.note_07_label.text()
-                self.drone_5th = self.current_note_set[7]['drone']
-            elif "♭5" in self.mode_intervals:
-                self.drone_5th_label = self.note_06_label.text()
-                self.drone_5th = self.current_note_set[6]['drone']
-            elif "♯5" in self.mode_intervals:
-                self.drone_5th_label = self.note_08_label.text()
-                self.drone_5th = self.current_note_set[8]['drone']
-            elif "𝄫5" in self.mode_intervals:
-                self.drone_5th_label = self.note_05_label.text()
-                self.drone_5th = self.current_note_set[5]['drone']
-            else:
-                self.drone_5th_label = self.note_05_label.text()
-                self.drone_5th = self.current_note_set[5]['drone']
+        self.drone_root_label = self.widgets.text(self.widgets.note_labels[0])
+        self.drone_root = self.drones[self.root]
 
-        self.drone_label_00.setText(self.drone_root_label)
-        self.drone_label_01.setText(self.drone_5th_label)
+        # The second drone is the fifth in most scales, otherwise the closest note to it
+        fifth = self.theory_entry().fifth
+        self.drone_5th_label = self.widgets.text(self.widgets.note_labels[fifth])
+        self.drone_5th = self.drones[self.root + fifth]
+
+        self.widgets.set_text(self.drone_label_00, self.drone_root_label)
+        self.widgets.set_text(self.drone_label_01, self.drone_5th_label)
 
     def keyPressEvent(self, QKeyEvent):
         """A method to play notes when keys are pressed."""
 
-        if len(self.mode_degrees) > 5:
-            if QKeyEvent.key() == Qt.Key_1:
-                self.play_note(0, self.current_note_set[self.mode_degrees[0]]['note'][self.root + self.mode_degrees[0]],
-                               self.current_note_set[self.mode_degrees[0]]['volume'])
-            elif QKeyEvent.key() == Qt.Key_2:
-                self.play_note(1, self.current_note_set[self.mode_degrees[1]]['note'][self.root + self.mode_degrees[1]],
-                               self.current_note_set[self.mode_degrees[1]]['volume'])
-            elif QKeyEvent.key() == Qt.Key_3:
-                self.play_note(2, self.current_note_set[self.mode_degrees[2]]['note'][self.root + self.mode_degrees[2]],
-                               self.current_note_set[self.mode_degrees[2]]['volume'])
-            elif QKeyEvent.key() == Qt.Key_4:
-                self.play_note(3, self.current_note_set[self.mode_degrees[3]]['note'][self.root + self.mode_degrees[3]],
-                               self.current_note_set[self.mode_degrees[3]]['volume'])
-            elif QKeyEvent.key() == Qt.Key_5:
-                self.play_note(4, self.current_note_set[self.mode_degrees[4]]['note'][self.root + self.mode_degrees[4]],
-                               self.current_note_set[self.mode_degrees[4]]['volume'])
-            elif QKeyEvent.key() == Qt.Key_6:
-                self.play_note(5, self.current_note_set[self.mode_degrees[5]]['note'][self.root + self.mode_degrees[5]],
-                               self.current_note_set[self.mode_degrees[5]]['volume'])
-        if len(self.mode_degrees) > 6:
-            if QKeyEvent.key() == Qt.Key_7:
-                self.play_note(6, self.current_note_set[self.mode_degrees[6]]['note'][self.root + self.mode_degrees[6]],
-                               self.current_note_set[self.mode_degrees[6]]['volume'])
-        if len(self.mode_degrees) > 7:
-            if QKeyEvent.key() == Qt.Key_8:
-                self.play_note(7, self.current_note_set[self.mode_degrees[7]]['note'][self.root + self.mode_degrees[7]],
-                               self.current_note_set[self.mode_degrees[7]]['volume'])
-        if len(self.mode_degrees) > 8:
-            if QKeyEvent.key() == Qt.Key_9:
-                self.play_note(8, self.current_note_set[self.mode_degrees[8]]['note'][self.root + self.mode_degrees[8]],
-                               self.current_note_set[self.mode_degrees[8]]['volume'])
-        if len(self.mode_degrees) > 9:
-            if QKeyEvent.key() == Qt.Key_0:
-                self.play_note(9, self.current_note_set[self.mode_degrees[9]]['note'][self.root + self.mode_degrees[9]],
-                               self.current_note_set[self.mode_degrees[9]]['volume'])
-        if len(self.mode_degrees) > 10:
-            if QKeyEvent.key() == Qt.Key_Minus:
-                self.play_note(10, self.current_note_set[self.mode_degrees[10]]['note'][self.root + self.mode_degrees[10]],
-                               self.current_note_set[self.mode_degrees[10]]['volume'])
-            elif QKeyEvent.key() == Qt.Key_Equal:
-                self.play_note(11, self.current_note_set[self.mode_degrees[11]]['note'][self.root + self.mode_degrees[11]],
-                               self.current_note_set[self.mode_degrees[11]]['volume'])
-            elif QKeyEvent.key() == Qt.Key_Backspace:
-                self.play_note(12, self.current_note_set[self.mode_degrees[12]]['note'][self.root + self.mode_degrees[12]],
-                               self.current_note_set[self.mode_degrees[12]]['volume'])
-
-        if QKeyEvent.key() == Qt.Key_Delete:
-            self.allow_play = False
-
-    def chime_on_off(self):
-        """A method to respond to the Play Chime button. Turns the chime function on or off"""
-
-        if self.play_chime_notes:
-            self.play_chime_notes = False
-        elif not self.play_chime_notes:
-            self.play_chime_notes = True
-
-        # self.check_chime_button()
-
-    def do_in_background(self, fcn, ts, kwargs):
-
-        self.start_time = time.time()
+        key_press_time = time.perf_counter()
 
-        # Sleep for the amount of time left over from the start time to the current time stamp
-        sleep_time = self.start_time + 1 - time.time()
-        time.sleep(sleep_time)
+        action = self.key_dispatcher.press(QKeyEvent.key(), QKeyEvent.isAutoRepeat())
 
-        thread_object = threading.Thread(target=fcn, args=kwargs)
-        thread_object.start()
+        if action is not None and action[0] == 'note' and self.metrics is not None:
+            self.metrics.record('key.press_to_trigger', time.perf_counter() - key_press_time)
 
-    def do_in_background_also(self, fcn):
+    def keyReleaseEvent(self, QKeyEvent):
+        """A method to stop notes when keys are let go (only if key_bindings.json sets "release" to "damp")."""
 
-        thread_object = threading.Thread(target=fcn)
-        thread_object.start()
+        self.key_dispatcher.release(QKeyEvent.key(), QKeyEvent.isAutoRepeat())
 
-    def do_in_background_as_well(self, fcn, kwargs):
+    def stop_key(self):
+        """A method to respond to the key bound to "stop" (DELETE by default). Stops the chime and the scale, and
+        fades out every note still ringing."""
 
-        thread_object = threading.Thread(target=fcn, args=kwargs)
-        thread_object.start()
+        self.session.stop()
 
-    def play_chime(self, degree):
-        """A method to randomly play notes from the current scale (a la wind chimes). Responds to Play Chime button."""
+    def toggle_metrics_overlay(self):
+        """A method to show or hide the timing histograms over the window."""
 
-        current_note_dict = self.current_note_set[degree]
+        if self.metrics_overlay is None:
+            self.metrics_overlay = QLabel(self)
+            self.metrics_overlay.setStyleSheet("font: 8pt 'Consolas', monospace; color: rgb(220, 255, 220); "
+                                               "background-color: rgba(0, 0, 0, 200); padding: 6px")
+            self.metrics_overlay.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+            self.metrics_overlay.setAttribute(Qt.WA_TransparentForMouseEvents)
+            self.metrics_overlay.setGeometry(0, 0, self.window_width, self.window_height)
 
-        self.playing_chimes_list.append(True)
+            # Refresh the overlay twice a second while it is shown
+            self.metrics_timer = QTimer(self)
+            self.metrics_timer.timeout.connect(self.update_metrics_overlay)
+            self.metrics_overlay.hide()
 
-        rand_time = random.randint(0, 25) / 5
-
-        time.sleep(float(rand_time))
+        if self.metrics_overlay.isVisible():
+            self.metrics_timer.stop()
+            self.metrics_overlay.hide()
+        else:
+            self.update_metrics_overlay()
+            self.metrics_overlay.show()
+            self.metrics_overlay.raise_()
+            self.metrics_timer.start(500)
 
-        # rand = random.choice(self.mode_degrees)
-        current_note = current_note_dict['note'][self.root + degree]
-        current_volume = current_note_dict['volume']
-        self.play_note(13, current_note, current_volume)
+    def update_metrics_overlay(self):
+        """A method to refresh the text of the timing overlay."""
 
-        self.playing_chimes_list.pop()
+        self.metrics_overlay.setText(self.metrics.report() or 'No notes played yet')
 
-    def playing_chimes(self):
+    def chime_on_off(self):
+        """A method to respond to the Play Chime button. Turns the chime function on or off"""
 
-        for value in self.playing_chimes_list:
-            if value:
-                return True
-        return False
+        if self.session.chime_on:
+            self.session.stop_chime()
+        else:
+            self.session.start_chime()
 
     def play_scale(self):
         """A method to play the current scale/mode in ascending order. Responds to Play Scale button."""
 
-        mixer = pygame.mixer
-        mixer.Channel(14)
-
-        self.start_time = time.time()
-
-        for ts, i in enumerate(self.mode_degrees):
-            self.do_in_background(self.play_note, ts, (14, self.current_note_set[i]['note'][self.root + i],
-                                                       self.current_note_set[i]['volume']))
-
-    def sleep(self, value):
-
-        time.sleep(value)
-
-    def play_note(self, channel, note, volume):
-        """A method to play the musical notes."""
-
-        mixer = pygame.mixer
-        mixer.Channel(channel)
-        sound = mixer.Sound(note)
-        sound.set_volume(volume)
-        sound.play()
+        self.session.play_scale()
 
     def drone_note(self):
-
-        bits = 16
+        """A method to update the drone labels, and play the root and fifth drone notes on a loop."""
 
         self.update_current_drones()
-
-        pygame.mixer.pre_init(44100, -bits, 2)
-        mixer = pygame.mixer
-        mixer2 = pygame.mixer
-        mixer.Channel(14)
-        mixer2.Channel(15)
-
-        duration = 1.0  # in seconds
-        # freqency for the left speaker
-        frequency_l = float(self.drone_root)
-        # frequency for the right speaker
-        frequency_r = float(self.drone_5th)
-
-        sample_rate = 44100
-
-        n_samples = int(round(duration * sample_rate))
-
-        # setup our numpy array to handle 16 bit ints, which is what we set our mixer to expect with "bits" up above
-        buf = numpy.zeros((n_samples, 2), dtype=numpy.int16)
-        buf2 = numpy.zeros((n_samples, 2), dtype=numpy.int16)
-        max_sample = 2 ** (bits - 1) - 1
-
-        for s in range(n_samples):
-            t = float(s) / sample_rate  # time in seconds
-
-            # grab the x-coordinate of the sine wave at a given time,
-            # while constraining the sample to what our mixer is set to with "bits"
-            buf[s][0] = int(round(max_sample * math.sin(2 * math.pi * frequency_l * t)))  # left
-            buf[s][1] = int(round(max_sample * math.sin(2 * math.pi * frequency_l * t)))  # right
-
-        for s in range(n_samples):
-            t = float(s) / sample_rate  # time in seconds
-
-            # grab the x-coordinate of the sine wave at a given time,
-            # while constraining the sample to what our mixer is set to with "bits"
-            buf2[s][0] = int(round(max_sample * math.sin(2 * math.pi * frequency_r * t)))  # left
-            buf2[s][1] = int(round(max_sample * math.sin(2 * math.pi * frequency_r * t)))  # right
-
-        sound = pygame.sndarray.make_sound(buf)
-        sound2 = pygame.sndarray.make_sound(buf2)
-        # play once, then loop forever
-        self.drone_first = mixer.Sound(sound)
-        self.drone_second = mixer2.Sound(sound2)
-        self.drone_first.play(loops=-1)
-        self.drone_second.play(loops=-1)
-        self.drone_first.set_volume(self.drone_volume_slider_00.value() / 20)
-        self.drone_second.set_volume(self.drone_volume_slider_01.value() / 20)
+        self.session.update_drones()
 
     def reset_all(self):
         """A method to reset all settings to their default state"""
 
         # Reset the root
         self.root = 5
-        self.root_dial.setValue(self.root)
-        self.root_label_display.setText(self.root_list[self.root])
+        self.widgets.set_value(self.root_dial, self.root)
+        self.widgets.set_text(self.root_label_display, self.root_list[self.root])
 
         # Reset the mode slider
-        self.mode_slider.setValue(1)
+        self.widgets.set_value(self.mode_slider, 1)
 
         # Reset the drones
-        self.drone_slider_00.setValue(0)
-        self.drone_slider_01.setValue(0)
+        for slider in self.widgets.drone_sliders:
+            self.widgets.set_value(slider, 0)
 
         # Reset the current scale
         self.scale_combo_box.setCurrentText("Major")
 
-        # Reset the volume sliders
-        for i in range(0, 13):
-            si = "%02d" % i
-            slider_name = "volume_slider_" + si
-            slider = getattr(self, slider_name)
+        # Reset the volume sliders. Sliders already at 5 are left alone, so they don't each send a change.
+        for slider in self.widgets.volume_sliders:
+            self.widgets.set_value(slider, 5)
+
+    def closeEvent(self, event):
+        """A method to stop the audio when the window is closed."""
 
-            slider.setValue(5)
+        self.session.close()
+        if self.metrics is not None:
+            self.metrics.dump(self.metrics_path)
+        super().closeEvent(event)
 
 
 class MyApplication(QApplication):
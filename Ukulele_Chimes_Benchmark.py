@@ -0,0 +1,488 @@
+#! python3
+# Ukulele_Chimes_Benchmark.py - Times the parts of Ukulele Chimes that affect how quickly it starts and responds,
+# without a sound device or a screen, and compares the results with a saved baseline.
+
+"""
+
+    Usage:
+        python Ukulele_Chimes_Benchmark.py --save-baseline          Run every benchmark and save the results as the baseline
+        python Ukulele_Chimes_Benchmark.py                          Run every benchmark and compare them with the baseline
+        python Ukulele_Chimes_Benchmark.py --only play_note sweep   Run only the benchmarks whose names start with these
+
+    •Startup - A new process importing Ukulele_Chimes, creating the window, and showing it (the time to the first
+        window), and each step of __init__ on its own
+    •Play Note - Triggering one note
+    •Key Press - A key press, from the window's keyPressEvent to the note being triggered, and rebuilding the key table
+    •Drone Note - Building and starting the drones, with and without the synthesizer's cache
+    •Pitch Shift - Deriving a note outside the recorded range, or in another tuning, and fetching it once cached
+    •Check Events - One _check_events pass after the root changes, and one with nothing to do
+    •Sweep - Every root and mode of every scale, through the dial, slider, and combo box
+    •Scale - Playing the scale in real time at a fast tempo: how late each step plays after its deadline, and the
+        jitter of the time between steps (see scale_sequencer.py)
+    •Reverb - Convolving one block of the mix with each room's reverb (a block plays for 23.2 ms, so that is the
+        real-time budget of one core)
+
+    Each result is the time of one call in milliseconds (min, median, mean, p95, max). A benchmark counts as a
+    regression when its median is slower than the baseline by more than the tolerance. The exit code is 1 if
+    there are any regressions.
+
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+
+# Run without a sound device or a screen. Set before pygame and Qt are imported.
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+
+BENCHMARK_VERSION = 1
+
+# Medians faster than this (in milliseconds) are too close to the timer's noise to call a regression
+NOISE_FLOOR = 0.05
+
+
+def summarize(times):
+    """A function to summarize a list of times (in seconds) in milliseconds."""
+
+    ms = sorted(t * 1000 for t in times)
+    return {'runs': len(ms),
+            'min': ms[0],
+            'median': statistics.median(ms),
+            'mean': statistics.fmean(ms),
+            'p95': ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))],
+            'max': ms[-1]}
+
+
+def time_calls(fcn, repeat, setup=None):
+    """A function to time repeat calls of fcn. setup, if given, is called untimed before each call."""
+
+    times = []
+    for i in range(0, repeat):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        fcn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def startup_child():
+    """A function to time a cold start in this (new) process, and print the times as json."""
+
+    start = time.perf_counter()
+    import Ukulele_Chimes
+    imported = time.perf_counter()
+
+    app = Ukulele_Chimes.MyApplication(sys.argv)
+    created = time.perf_counter()
+
+    window = Ukulele_Chimes.UkuleleChimes()
+    initialized = time.perf_counter()
+
+    # Run the event loop until the window has been shown
+    window.show()
+    Ukulele_Chimes.QTimer.singleShot(0, app.quit)
+    app.exec()
+    shown = time.perf_counter()
+
+    window.session.close()
+    print(json.dumps({'import': imported - start,
+                      'application': created - imported,
+                      'init': initialized - created,
+                      'total': initialized - start,
+                      'first_window': shown - start}))
+    return 0
+
+
+def bench_startup(results, runs):
+    """A function to time cold starts in new processes."""
+
+    phases = {}
+    for i in range(0, runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--startup-child'],
+                                check=True, capture_output=True, text=True).stdout
+        for name, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            phases.setdefault(name, []).append(seconds)
+
+    for name, times in phases.items():
+        results[f'startup.cold_{name}'] = summarize(times)
+
+
+def bench_init_steps(results, runs):
+    """A function to time each of the slow steps of UkuleleChimes.__init__ on its own, in this process."""
+
+    import pygame
+    from PyQt5 import uic
+    from PyQt5.QtWidgets import QWidget
+    from compiled_ui import load_ui
+    from music_theory import TheoryTable
+    from sample_bank import SampleBank
+
+    results['startup.load_ui'] = summarize(time_calls(lambda: uic.loadUi('Ukulele_Chimes_Layout.ui', QWidget()), runs))
+    results['startup.load_ui_compiled'] = summarize(time_calls(
+        lambda: load_ui('Ukulele_Chimes_Layout.ui', QWidget(), 'ui_cache'), runs))
+
+    results['startup.theory_lazy'] = summarize(time_calls(
+        lambda: TheoryTable.load('music_scales.json', 'roots.json', None, lazy=True).lookup('major', 1, 5), runs))
+    results['startup.theory_cached'] = summarize(time_calls(
+        lambda: TheoryTable.load('music_scales.json', 'roots.json', 'music_theory_cache.json'), runs))
+    results['startup.theory_compile'] = summarize(time_calls(
+        lambda: TheoryTable.load('music_scales.json', 'roots.json', None), runs))
+
+    def quit_pygame(i):
+        pygame.quit()
+
+    results['startup.pygame_init'] = summarize(time_calls(pygame.init, runs, quit_pygame))
+    results['startup.mixer_init'] = summarize(time_calls(pygame.mixer.init, runs, quit_pygame))
+
+    results['startup.sample_bank'] = summarize(time_calls(lambda: SampleBank('AudioFiles', 24).load(), runs))
+
+
+def bench_init(results, runs):
+    """A function to time UkuleleChimes.__init__ in this process, once everything has been imported."""
+
+    import Ukulele_Chimes
+
+    windows = []
+
+    def create():
+        windows.append(Ukulele_Chimes.UkuleleChimes())
+
+    def close_last(i):
+        while windows:
+            windows.pop().session.close()
+
+    results['startup.init_warm'] = summarize(time_calls(create, runs, close_last))
+    close_last(0)
+
+
+def bench_play_note(results, runs, window):
+    """A function to time triggering a note, the same call made by the keys, the chime, and the scale."""
+
+    from mixer_engine import MixerEngine
+
+    degrees = window.mode_degrees
+    notes = [window.root + degrees[i % len(degrees)] for i in range(0, runs)]
+    position = iter(notes)
+
+    results['play_note'] = summarize(time_calls(lambda: window.session.play_note(next(position), 0.5), runs))
+    window.session.mixer_engine.stop_all()
+
+    # The time to mix one block with every voice busy, which bounds how late a note can start.
+    # A separate engine is used, so the stream playing the window's engine does not share the work.
+    live = window.session.mixer_engine
+    engine = MixerEngine(live.voices, live.sample_rate, live.channels, live.block_frames)
+
+    def fill(i):
+        while engine.active_voices() < engine.voices:
+            engine.trigger(window.sample_bank.samples(notes[engine.trigger_count % len(notes)]), 0.5)
+
+    results['play_note.mix_block_full'] = summarize(time_calls(engine.render, runs, fill))
+
+
+def bench_key_press(results, runs, window):
+    """A function to time key presses through the window, for a key bound to a note and one that is not bound,
+    and rebuilding the table the keys are looked up in."""
+
+    from PyQt5.QtGui import QKeyEvent
+    from PyQt5.QtCore import QEvent, Qt
+
+    engine = window.session.mixer_engine
+    window.key_dispatcher.prepare(window.key_dispatcher.generation)
+
+    def clear(i):
+        if engine.active_voices() >= engine.voices // 2:
+            engine.stop_all()
+
+    for name, key in (('note', Qt.Key_1), ('unbound', Qt.Key_A)):
+        event = QKeyEvent(QEvent.KeyPress, key, Qt.NoModifier)
+        results[f'key_press.{name}'] = summarize(time_calls(lambda: window.keyPressEvent(event), runs, clear))
+    engine.stop_all()
+
+    results['key_press.rebuild'] = summarize(time_calls(window.key_dispatcher.rebuild, runs))
+
+
+def bench_drone_note(results, runs, window):
+    """A function to time building and starting the drones, with the synthesizer's cache empty and full."""
+
+    from drone_synth import DroneSynth
+
+    session = window.session
+    synth = session.drone_synth
+
+    # Drones at 0 are never built or started, and 0 is the default
+    volumes = list(window.state.drone_volumes)
+    window.state.set_drone_volume(0, 5)
+    window.state.set_drone_volume(1, 5)
+
+    def force_cold(i):
+        session.drone_synth = DroneSynth(synth.sample_rate, synth.channels, cache_size=synth.cache_size)
+        session.drone_frequencies = (None, None)
+
+    def force_warm(i):
+        session.drone_frequencies = (None, None)
+
+    results['drone_note.cold'] = summarize(time_calls(window.drone_note, runs, force_cold))
+    results['drone_note.warm'] = summarize(time_calls(window.drone_note, runs, force_warm))
+
+    session.drone_synth = synth
+    for drone, volume in enumerate(volumes):
+        window.state.set_drone_volume(drone, volume)
+    window._check_events()
+
+
+def bench_pitch_shift(results, runs, window):
+    """A function to time deriving notes by resampling, an octave up, an octave down, and retuned."""
+
+    shifter = window.session.pitch_shifter
+
+    def clear(i):
+        shifter.clear()
+
+    for name, note, tuning in (('octave_up', 24 + 7, 'equal'), ('octave_down', -12, 'equal'), ('just', 9, 'just')):
+        shifter.set_tuning(tuning, window.state.root, 0.0)
+        results[f'pitch_shift.{name}'] = summarize(time_calls(lambda: shifter.samples(note), runs, clear))
+
+    results['pitch_shift.cached'] = summarize(time_calls(lambda: shifter.samples(9), runs))
+
+    shifter.clear()
+    window.session.update_tuning()
+
+
+def bench_check_events(results, runs, window):
+    """A function to time one _check_events pass after the root changes, and one with nothing to recompute."""
+
+    start_root = window.state.root
+
+    def change_root(i):
+        window.state.set('root', (start_root + i + 1) % 12)
+
+    results['check_events.root_change'] = summarize(time_calls(window._check_events, runs, change_root))
+    results['check_events.idle'] = summarize(time_calls(window._check_events, runs))
+
+    window.state.set('root', start_root)
+    window._check_events()
+
+
+def bench_sweep(results, runs, window):
+    """A function to time a sweep through every root and mode of every scale, through the widgets."""
+
+    counts = {'steps': 0}
+
+    def sweep():
+        for scale in window.scale_registry:
+            window.scale_combo_box.setCurrentText(scale.name)
+            for mode in range(1, scale.mode_count + 1):
+                window.mode_slider.setValue(mode)
+                for root in range(0, 12):
+                    window.root_dial.setValue(root)
+                    counts['steps'] += 1
+
+    times = time_calls(sweep, runs)
+    results['sweep'] = summarize(times)
+
+    # The same sweep, per setting
+    steps = counts['steps'] // runs
+    results['sweep.per_step'] = summarize([t / steps for t in times])
+
+    window.reset_all()
+
+
+def bench_scale(results, runs, window):
+    """A function to play the scale in real time, and record how late each step played and the jitter of each
+    run, as timed by the sequencer itself."""
+
+    session = window.session
+    sequencer = session.scale_sequencer
+    tempo = sequencer.tempo
+    session.set_tempo(600)
+
+    lateness = []
+    jitter = []
+    for i in range(0, runs):
+        session.play_scale()
+        while session.scale_on:
+            time.sleep(0.01)
+        lateness.extend(actual - deadline for deadline, actual in sequencer.fire_times)
+        jitter.append(sequencer.stats()['jitter'])
+
+    results['scale.lateness'] = summarize(lateness)
+    results['scale.jitter'] = summarize(jitter)
+
+    session.set_tempo(tempo)
+    session.mixer_engine.stop_all()
+
+
+def bench_reverb(results, runs, window):
+    """A function to time the reverb of each room over one block of the mix."""
+
+    import numpy
+    from reverb import ConvolutionReverb, ROOMS
+
+    engine = window.session.mixer_engine
+    block = numpy.random.default_rng(0).uniform(-8000, 8000, (engine.block_frames, engine.channels))
+    block = block.astype(numpy.float32)
+
+    for room in ROOMS:
+        reverb = ConvolutionReverb.for_room(room, engine.block_frames, engine.sample_rate, engine.channels)
+        results[f'reverb.{room}'] = summarize(time_calls(lambda: reverb.process(block.copy()), runs))
+
+
+BENCHMARKS = ('startup', 'play_note', 'key_press', 'drone_note', 'pitch_shift', 'check_events', 'sweep', 'scale',
+              'reverb')
+
+
+def run_benchmarks(only, runs, startup_runs):
+    """A function to run the benchmarks, and return their results by name."""
+
+    def selected(name):
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    results = {}
+
+    if selected('startup'):
+        bench_startup(results, startup_runs)
+
+    # Widgets can only be created once there is an application
+    import Ukulele_Chimes
+    app = Ukulele_Chimes.MyApplication(sys.argv)
+
+    if selected('startup'):
+        bench_init_steps(results, runs)
+        bench_init(results, max(3, runs // 10))
+
+    window = Ukulele_Chimes.UkuleleChimes()
+    try:
+        if selected('play_note'):
+            bench_play_note(results, runs * 10, window)
+        if selected('key_press'):
+            bench_key_press(results, runs * 10, window)
+        if selected('drone_note'):
+            bench_drone_note(results, runs, window)
+        if selected('pitch_shift'):
+            bench_pitch_shift(results, runs, window)
+        if selected('check_events'):
+            bench_check_events(results, runs * 10, window)
+        if selected('sweep'):
+            bench_sweep(results, max(1, runs // 10), window)
+        if selected('scale'):
+            bench_scale(results, max(2, runs // 4), window)
+        if selected('reverb'):
+            bench_reverb(results, runs * 10, window)
+    finally:
+        window.session.close()
+
+    return results
+
+
+def environment():
+    """A function to describe the machine and library versions the benchmarks ran on."""
+
+    import numpy
+    import pygame
+    from PyQt5.QtCore import PYQT_VERSION_STR
+
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpus': os.cpu_count(),
+            'numpy': numpy.__version__,
+            'pygame': pygame.version.ver,
+            'pyqt': PYQT_VERSION_STR,
+            'audio_driver': os.environ.get('SDL_AUDIODRIVER'),
+            'qt_platform': os.environ.get('QT_QPA_PLATFORM')}
+
+
+def compare(results, baseline, tolerance):
+    """A function to compare the medians with the baseline. Returns a list of (name, median, baseline median,
+    ratio, is a regression), one for each benchmark in both."""
+
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]['median']
+        new = result['median']
+        ratio = new / old if old > 0 else float('inf')
+        regression = ratio > 1 + tolerance and new - old > NOISE_FLOOR
+        rows.append((name, new, old, ratio, regression))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Ukulele Chimes without a sound device or a screen.')
+    parser.add_argument('--only', nargs='*', choices=BENCHMARKS, help='run only these benchmarks')
+    parser.add_argument('--runs', type=int, default=20, help='repetitions of each benchmark (default: 20)')
+    parser.add_argument('--startup-runs', type=int, default=3, help='new processes to time cold starts (default: 3)')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='file to write the results to')
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help='baseline to compare the results with')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='how much slower than the baseline a median may be, as a fraction (default: 0.25)')
+    parser.add_argument('--startup-child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    # The program loads its files relative to its own folder
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.startup_child:
+        return startup_child()
+
+    results = run_benchmarks(args.only, args.runs, args.startup_runs)
+    report = {'version': BENCHMARK_VERSION,
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'environment': environment(),
+              'results': results}
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('version') != BENCHMARK_VERSION:
+            print(f'{args.baseline} is from a different version of the benchmarks, so it was not compared')
+            baseline = None
+
+    width = max(len(name) for name in results)
+    regressions = []
+
+    if baseline is None:
+        print(f'{"benchmark":<{width}}  {"median":>10}  {"p95":>10}  {"runs":>5}')
+        for name, result in results.items():
+            print(f'{name:<{width}}  {result["median"]:>8.3f}ms  {result["p95"]:>8.3f}ms  {result["runs"]:>5}')
+    else:
+        print(f'{"benchmark":<{width}}  {"median":>10}  {"baseline":>10}  {"change":>8}')
+        for name, new, old, ratio, regression in compare(results, baseline['results'], args.tolerance):
+            flag = '  REGRESSION' if regression else ''
+            print(f'{name:<{width}}  {new:>8.3f}ms  {old:>8.3f}ms  {(ratio - 1) * 100:>+7.1f}%{flag}')
+            if regression:
+                regressions.append(name)
+        if baseline.get('environment') != report['environment']:
+            print('The baseline was recorded on a different machine or library versions')
+
+    print(f'Results written to {args.output}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved as the baseline in {args.baseline}')
+
+    if regressions:
+        print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,488 @@
+#! python3
+# Ukulele_Chimes_Daemon.py - Runs Ukulele Chimes without a window (i.e. as background ambience on a machine
+# with no screen), controlled with text commands over a local Unix socket.
+
+"""
+
+    Usage:
+        python Ukulele_Chimes_Daemon.py --scale Kumoi --root D --chime         Start the daemon
+        python Ukulele_Chimes_Daemon.py --send "root F"                        Send a command to a running daemon
+        python Ukulele_Chimes_Daemon.py --zones zones.json                     Start one chime per zone (room)
+        python Ukulele_Chimes_Daemon.py --chime --record session.uclog         Record what plays to an event log
+
+    Commands (one per line, each is answered with one line of json):
+        status                      The current settings and what is playing
+        root <name or 0-11>         Change the root (i.e. root C, root F#, root 7)
+        scale <key or name>         Change the scale. The mode is reset to 1, the same as in the window.
+        mode <number>               Change the mode of the current scale
+        volume <0-12> <0-10>        Set the volume of one scale degree
+        volumes <13 values>         Set every note volume at once (i.e. volumes 5,5,5,5,5,5,5,5,5,5,5,5,5)
+        drone <0|1> <0-10>          Set the volume of the root (0) or fifth (1) drone
+        drones <2 values>           Set both drone volumes at once (i.e. drones 3,2)
+        octave <number>             Move the notes up or down by whole octaves (i.e. octave -1)
+        tuning <name> [cents]       Change the temperament (equal, just, pythagorean, meantone), and the detune
+        chime on|off|toggle         Start or stop the chime
+        wind <model> [seed]         Change how the chime is struck (rounds, uniform, poisson, gusty)
+        reverb <room|off> [mix]     Add the reverb of a room (room, hall, cathedral) at a level of 0-1, or remove it
+        play scale                  Play the current scale in ascending order
+        tempo <beats per minute>    Change the tempo of the scale (status shows how late and how evenly it played)
+        play <0-12>                 Play one scale degree
+        stop                        Stop the chime and the scale, and fade out the notes still ringing
+        shutdown                    Stop the daemon
+
+    Changes are applied to the running audio, which is never restarted.
+
+    Zones (started with --zones) share one copy of the audio files and the music theory, and each plays to its
+    own channels of the output. The commands above are sent to one zone at a time, and there are three more:
+        zone <name> <command>       Run a command in one zone (i.e. zone garden root F#)
+        route <name> <channels>     Move a zone to other output channels (i.e. route garden 2,3)
+        zones                       List the zones
+
+    The zones file sets the number of output channels, and the settings of each zone, e.g.
+        {"channels": 4,
+         "zones": {"lobby": {"scale": "Kumoi", "root": "D", "drones": "3,2", "outputs": [0, 1], "chime": true},
+                   "garden": {"scale": "major", "root": "G", "wind": "gusty", "outputs": [2, 3], "chime": true}}}
+    Each zone may also set mode, volumes, wind, seed, record, reverb, and reverb_mix, the same as the command line
+    options.
+
+    With --record, every note and every change of the settings is recorded to an event log (see event_log.py),
+    which Ukulele_Chimes_Replay.py plays back or mixes to a WAV file.
+
+"""
+
+import os
+import sys
+import json
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+
+# Keep pygame's greeting out of the command line output
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from sample_bank import SampleBank
+from music_theory import TheoryTable, find_root
+from chime_state import ChimeState, parse_levels
+from chime_session import ChimeSession
+from chime_zones import ZoneEngine
+from pitch_shifter import TEMPERAMENTS
+from chime_patterns import WIND_MODELS
+from reverb import ROOMS
+
+
+DEFAULT_SOCKET = '/tmp/ukulele_chimes.sock'
+
+
+class ChimeDaemon:
+    """Overall class to apply control commands to a ChimeSession."""
+
+    def __init__(self, session):
+        """A method to set up the daemon around a session."""
+
+        self.session = session
+        self.state = session.state
+        self.theory = session.theory
+
+        # Commands from different connections are applied one at a time
+        self.lock = threading.Lock()
+        self.shutdown_requested = threading.Event()
+
+    def execute(self, line):
+        """A method to run a single command. Returns a dictionary, which is sent back as json."""
+
+        words = line.split()
+        if not words:
+            return {'ok': False, 'error': 'Empty command'}
+
+        command, args = words[0].lower(), words[1:]
+
+        with self.lock:
+            try:
+                result = self.run_command(command, args)
+            except (ValueError, IndexError) as error:
+                return {'ok': False, 'error': str(error) or f'Bad arguments for {command}'}
+
+            # Bring the audio up to date with whatever changed
+            self.session.apply()
+
+            reply = {'ok': True}
+            if result is not None:
+                reply.update(result)
+            return reply
+
+    def run_command(self, command, args):
+        """A method to change the settings for one command. Returns extra values for the reply, if any."""
+
+        if command == 'status':
+            return self.session.status()
+
+        elif command == 'root':
+            self.state.set('root', find_root(' '.join(args)))
+
+        elif command == 'scale':
+            key = self.theory.find_scale(' '.join(args))
+            if key != self.state.scale:
+                self.state.set('scale', key)
+                self.state.set('mode', 1)
+
+        elif command == 'mode':
+            mode = int(args[0])
+            if not 1 <= mode <= self.theory.mode_count(self.state.scale):
+                raise ValueError(f'{self.theory.registry[self.state.scale].name} has modes '
+                                 f'1-{self.theory.mode_count(self.state.scale)}')
+            self.state.set('mode', mode)
+
+        elif command == 'volume':
+            degree = int(args[0])
+            if not 0 <= degree <= 12:
+                raise ValueError('The scale degree must be from 0 to 12')
+            self.state.set_volume(degree, parse_levels(args[1], 1)[0])
+
+        elif command == 'volumes':
+            for degree, level in enumerate(parse_levels(''.join(args), 13)):
+                self.state.set_volume(degree, level)
+
+        elif command == 'drone':
+            drone = int(args[0])
+            if drone not in (0, 1):
+                raise ValueError('The drone must be 0 (root) or 1 (fifth)')
+            self.state.set_drone_volume(drone, parse_levels(args[1], 1)[0])
+
+        elif command == 'drones':
+            for drone, level in enumerate(parse_levels(''.join(args), 2)):
+                self.state.set_drone_volume(drone, level)
+
+        elif command == 'octave':
+            octave = int(args[0])
+            if not -3 <= octave <= 3:
+                raise ValueError('The octave must be from -3 to 3')
+            self.state.set('octave', octave)
+
+        elif command == 'tuning':
+            if args[0].lower() not in TEMPERAMENTS:
+                raise ValueError(f'Unknown temperament: {args[0]} (expected one of {", ".join(TEMPERAMENTS)})')
+            self.state.set('tuning', args[0].lower())
+            self.state.set('detune', float(args[1]) if len(args) > 1 else 0.0)
+
+        elif command == 'wind':
+            self.session.set_wind(args[0].lower(), int(args[1]) if len(args) > 1 else None)
+            return {'wind': self.session.wind}
+
+        elif command == 'reverb':
+            room = args[0].lower()
+            self.session.set_reverb(None if room == 'off' else room, float(args[1]) if len(args) > 1 else 0.3)
+            return {'reverb': self.session.reverb_room}
+
+        elif command == 'chime':
+            setting = args[0].lower() if args else 'toggle'
+            if setting == 'toggle':
+                setting = 'off' if self.session.chime_on else 'on'
+            if setting == 'on':
+                self.session.start_chime()
+            elif setting == 'off':
+                self.session.stop_chime()
+            else:
+                raise ValueError('Use chime on, chime off, or chime toggle')
+            return {'chime': self.session.chime_on}
+
+        elif command == 'play':
+            if len(args) != 1 or not (args[0].lower() == 'scale' or args[0].isdigit()):
+                raise ValueError('Use play <0-12> or play scale')
+            if args[0].lower() == 'scale':
+                self.session.play_scale()
+            else:
+                degree = int(args[0])
+                if degree not in self.session.entry().degrees:
+                    raise ValueError(f'{degree} is not a degree of the current scale')
+                self.session.play_degree(degree)
+
+        elif command == 'tempo':
+            if len(args) != 1:
+                raise ValueError('Use tempo <beats per minute>')
+            self.session.set_tempo(float(args[0]))
+            return {'tempo': self.session.scale_sequencer.tempo}
+
+        elif command == 'stop':
+            self.session.stop()
+
+        elif command == 'shutdown':
+            self.shutdown_requested.set()
+
+        else:
+            raise ValueError(f'Unknown command: {command}')
+
+        return None
+
+
+class ZoneDaemon:
+    """Overall class to apply control commands to the zones of a ZoneEngine. Commands for one zone are passed to
+    that zone's ChimeDaemon."""
+
+    def __init__(self, engine):
+        """A method to set up a ChimeDaemon for each zone."""
+
+        self.engine = engine
+        self.daemons = {name: ChimeDaemon(session) for name, session in engine.zones.items()}
+
+        self.lock = threading.Lock()
+        self.shutdown_requested = threading.Event()
+
+    def execute(self, line):
+        """A method to run a single command. Returns a dictionary, which is sent back as json."""
+
+        words = line.split()
+        if not words:
+            return {'ok': False, 'error': 'Empty command'}
+
+        command, args = words[0].lower(), words[1:]
+
+        if command == 'zone':
+            if len(args) < 2:
+                return {'ok': False, 'error': 'Use zone <name> <command>'}
+            daemon = self.daemons.get(args[0])
+            if daemon is None:
+                return {'ok': False, 'error': f'Unknown zone: {args[0]} (expected one of {", ".join(self.daemons)})'}
+            reply = daemon.execute(' '.join(args[1:]))
+            if daemon.shutdown_requested.is_set():
+                self.shutdown_requested.set()
+            reply['zone'] = args[0]
+            return reply
+
+        with self.lock:
+            try:
+                if command == 'status':
+                    result = self.engine.status()
+                elif command == 'zones':
+                    result = {'zones': {name: session.entry().label for name, session in self.engine.zones.items()}}
+                elif command == 'route':
+                    self.engine.route(args[0], [int(channel) for channel in args[1].split(',')])
+                    result = {'outputs': list(self.engine.outputs[args[0]])}
+                elif command == 'stop':
+                    for session in self.engine.zones.values():
+                        session.stop()
+                    result = None
+                elif command == 'shutdown':
+                    self.shutdown_requested.set()
+                    result = None
+                else:
+                    raise ValueError(f'Unknown command: {command} (commands for one zone start with zone <name>)')
+            except (ValueError, IndexError) as error:
+                return {'ok': False, 'error': str(error) or f'Bad arguments for {command}'}
+
+        reply = {'ok': True}
+        if result is not None:
+            reply.update(result)
+        return reply
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """Overall class to read commands from one connection, one per line."""
+
+    def handle(self):
+        for raw_line in self.rfile:
+            line = raw_line.decode('utf-8', errors='replace').strip()
+            if not line:
+                continue
+            reply = self.server.daemon.execute(line)
+            self.wfile.write((json.dumps(reply, ensure_ascii=False) + '\n').encode('utf-8'))
+            if self.server.daemon.shutdown_requested.is_set():
+                threading.Thread(target=self.server.shutdown).start()
+                break
+
+
+class CommandServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Overall class to accept connections on the Unix socket."""
+
+    daemon_threads = True
+
+    def __init__(self, path, daemon):
+        self.daemon = daemon
+        super().__init__(path, CommandHandler)
+
+
+def send_command(path, command):
+    """A function to send one command to a running daemon, and return its reply."""
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall((command.strip() + '\n').encode('utf-8'))
+        client.shutdown(socket.SHUT_WR)
+        reply = b''
+        while not reply.endswith(b'\n'):
+            data = client.recv(65536)
+            if not data:
+                break
+            reply += data
+    return json.loads(reply.decode('utf-8'))
+
+
+def build_state(theory, scale='major', mode=1, root='C', volumes=None, drones='0,0'):
+    """A function to build a ChimeState from settings written the same as the command line options. Raises
+    ValueError if any of them is not valid."""
+
+    scale = theory.find_scale(scale)
+    if not 1 <= int(mode) <= theory.mode_count(scale):
+        raise ValueError(f'{theory.registry[scale].name} has modes 1-{theory.mode_count(scale)}')
+    if volumes is None:
+        volumes = ','.join(['5'] * 13)
+    return ChimeState(root=find_root(str(root)),
+                      scale=scale,
+                      mode=int(mode),
+                      volumes=parse_levels(volumes, 13),
+                      drone_volumes=parse_levels(drones, 2))
+
+
+def start_zones(path, theory, long_session=False):
+    """A function to initialize the mixer, and start every zone in a zones file. Returns the ZoneEngine. Raises
+    ValueError if the file has a setting that is not valid."""
+
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    zones = config.get('zones', {})
+    if not zones:
+        raise ValueError(f'{path} has no zones')
+
+    # Check every zone before any audio starts
+    settings = []
+    for name, zone in zones.items():
+        state = build_state(theory, zone.get('scale', 'major'), zone.get('mode', 1), zone.get('root', 'C'),
+                            zone.get('volumes'), zone.get('drones', '0,0'))
+        if zone.get('wind', 'rounds') not in WIND_MODELS:
+            raise ValueError(f'Unknown wind model for {name}: {zone["wind"]}')
+        if zone.get('reverb') is not None and zone['reverb'] not in ROOMS:
+            raise ValueError(f'Unknown reverb room for {name}: {zone["reverb"]}')
+        settings.append((name, state, zone))
+
+    pygame.mixer.init(channels=int(config.get('channels', 2)))
+
+    engine = ZoneEngine(SampleBank('AudioFiles', 24).load(), theory, long_session=long_session)
+    try:
+        for name, state, zone in settings:
+            session = engine.add_zone(name, state, zone.get('outputs', (0, 1)), zone.get('wind', 'rounds'),
+                                      zone.get('seed'), zone.get('record'), zone.get('reverb'),
+                                      float(zone.get('reverb_mix', 0.3)))
+            if zone.get('chime'):
+                session.start_chime()
+    except ValueError:
+        engine.close()
+        raise
+
+    return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run Ukulele Chimes without a window, controlled over a socket.')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f'Unix socket path (default: {DEFAULT_SOCKET})')
+    parser.add_argument('--send', metavar='COMMAND', help='send a command to a running daemon and print the reply')
+    parser.add_argument('--scale', default='major', help='scale key or name (default: major)')
+    parser.add_argument('--scale-file', default='music_scales.json',
+                        help='json file of scales (default: music_scales.json)')
+    parser.add_argument('--mode', type=int, default=1, help='mode of the scale (default: 1)')
+    parser.add_argument('--root', default='C', help='root note name or dial position 0-11 (default: C)')
+    parser.add_argument('--volumes', default=','.join(['5'] * 13), help='13 note volumes, 0-10 (default: all 5)')
+    parser.add_argument('--drones', default='0,0', help='2 drone volumes, 0-10 (default: 0,0)')
+    parser.add_argument('--drone-fade', type=float, default=0.5,
+                        help='seconds to crossfade a drone into its new note (default: 0.5)')
+    parser.add_argument('--reverb', choices=list(ROOMS), help='add the reverb of a room (default: none)')
+    parser.add_argument('--reverb-mix', type=float, default=0.3, help='level of the reverb, 0-1 (default: 0.3)')
+    parser.add_argument('--chime', action='store_true', help='start the chime right away')
+    parser.add_argument('--tempo', type=float, default=60,
+                        help='tempo of the scale, in beats per minute (default: 60)')
+    parser.add_argument('--wind', default='rounds', choices=list(WIND_MODELS), help='wind model (default: rounds)')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the chime pattern (default: random)')
+    parser.add_argument('--long-session', action='store_true',
+                        help='keep threads, sounds, and memory within fixed limits (for sessions left on for hours)')
+    parser.add_argument('--zones', metavar='FILE', help='run a chime for each zone in this json file')
+    parser.add_argument('--record', metavar='FILE', help='record every note and change of the settings to this file')
+    args = parser.parse_args(argv)
+
+    if args.send:
+        try:
+            reply = send_command(args.socket, args.send)
+        except OSError as error:
+            print(f'Could not reach the daemon at {args.socket}: {error}', file=sys.stderr)
+            return 1
+        print(json.dumps(reply, ensure_ascii=False, indent=2))
+        return 0 if reply.get('ok') else 1
+
+    if args.drone_fade < 0:
+        parser.error('--drone-fade cannot be negative')
+    if not 0 <= args.reverb_mix <= 1:
+        parser.error('--reverb-mix must be from 0 to 1')
+    if args.tempo <= 0:
+        parser.error('--tempo must be greater than 0')
+
+    try:
+        theory = TheoryTable.load(args.scale_file, 'roots.json', 'music_theory_cache.json')
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+
+    if args.zones:
+        # Only the mixer is needed, there is no window
+        try:
+            session = start_zones(args.zones, theory, args.long_session)
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+        daemon = ZoneDaemon(session)
+        label = ', '.join(f'{name}: {zone.entry().label}' for name, zone in session.zones.items())
+
+    else:
+        try:
+            state = build_state(theory, args.scale, args.mode, args.root, args.volumes, args.drones)
+        except ValueError as error:
+            parser.error(str(error))
+
+        # Only the mixer is needed, there is no window
+        pygame.mixer.init()
+        pygame.mixer.set_num_channels(16)
+
+        session = ChimeSession(SampleBank('AudioFiles', 24).load(), theory, state, wind=args.wind, seed=args.seed,
+                               long_session=args.long_session, record=args.record, drone_fade=args.drone_fade,
+                               reverb=args.reverb, reverb_mix=args.reverb_mix, tempo=args.tempo)
+        session.apply()
+        if args.chime:
+            session.start_chime()
+
+        daemon = ChimeDaemon(session)
+        label = session.entry().label
+
+    # Remove a socket left behind by a daemon that did not shut down cleanly
+    if os.path.exists(args.socket):
+        try:
+            send_command(args.socket, 'status')
+        except OSError:
+            os.remove(args.socket)
+        else:
+            print(f'A daemon is already running at {args.socket}', file=sys.stderr)
+            session.close()
+            return 1
+
+    server = CommandServer(args.socket, daemon)
+    os.chmod(args.socket, 0o600)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f'{label}, listening on {args.socket}')
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        session.close()
+        pygame.mixer.quit()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
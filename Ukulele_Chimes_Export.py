@@ -0,0 +1,227 @@
+#! python3
+# Ukulele_Chimes_Export.py - Renders an audio preview of every mode of every scale in every root, using a pool
+# of processes that share one sample bank.
+
+"""
+
+    Usage:
+        python Ukulele_Chimes_Export.py -o previews                    An ascending scale for every scale/mode/root
+        python Ukulele_Chimes_Export.py -o previews --chime 20         ...plus 20 seconds of the chime for each
+
+    Files are written to <output>/<scale>/mode_<n>/<root>_scale.wav (and <root>_chime.wav).
+    Each finished file is recorded in <output>/manifest.jsonl, so an interrupted export picks up where it left off,
+    and files whose settings, scale data, and audio files have not changed are skipped.
+
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Keep pygame's greeting out of the command line output
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from sample_bank import SampleBank
+from music_theory import TheoryTable
+from chime_state import ChimeState
+from Ukulele_Chimes_Render import SessionRenderer
+
+
+# Increase when a change to the renderer changes the files it writes
+EXPORT_VERSION = 1
+
+# The renderer used by each worker process. With the 'fork' start method the workers inherit the parent's renderer,
+# and with it the sample bank, which the operating system shares between them until something writes to it.
+_renderer = None
+
+
+def _init_worker(scales_path, roots_path):
+    """A function to load the renderer in a worker that did not inherit one from the parent."""
+
+    global _renderer
+    if _renderer is None:
+        theory = TheoryTable.load(scales_path, roots_path, None)
+        _renderer = SessionRenderer(SampleBank('AudioFiles', 24), theory)
+
+
+def _export_job(job):
+    """A function to render the files of one job in a worker. Returns the job and the seconds of audio written."""
+
+    state = ChimeState(root=job['root'], scale=job['scale'], mode=job['mode'])
+    audio_seconds = 0.0
+
+    os.makedirs(os.path.dirname(job['scale_path']), exist_ok=True)
+
+    _renderer.render_scale(job['scale_path'] + '.tmp', state, tempo=job['tempo'])
+    os.replace(job['scale_path'] + '.tmp', job['scale_path'])
+    audio_seconds += wav_seconds(job['scale_path'])
+
+    if job['chime_path'] is not None:
+        _renderer.render(job['chime_path'] + '.tmp', state, job['chime_seconds'], job['seed'])
+        os.replace(job['chime_path'] + '.tmp', job['chime_path'])
+        audio_seconds += job['chime_seconds']
+
+    return job, audio_seconds
+
+
+def wav_seconds(path):
+    """A function to return the length of a WAV file from its size (16-bit stereo at 44.1 kHz)."""
+
+    return max(0, os.path.getsize(path) - 44) / (44100 * 2 * 2)
+
+
+def ascii_name(text):
+    """A function to make a scale key or note name safe to use in a file name."""
+
+    for symbol, letter in (('♯', 's'), ('♭', 'b'), ('♮', 'n'), ('𝄪', 'x'), ('𝄫', 'bb'), ('/', '-'), (' ', '_')):
+        text = text.replace(symbol, letter)
+    return text.encode('ascii', 'ignore').decode('ascii')
+
+
+def source_fingerprint(theory, sample_bank):
+    """A function to fingerprint what every file is made from: the scale data and the audio files."""
+
+    digest = hashlib.sha256()
+    digest.update(str(EXPORT_VERSION).encode('ascii'))
+    digest.update(theory.source_hash.encode('ascii'))
+    for path in sample_bank.paths:
+        stat = os.stat(path)
+        digest.update(f'{path}:{stat.st_size}:{stat.st_mtime_ns}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def read_manifest(path):
+    """A function to read the fingerprint of every finished file. Later lines replace earlier ones."""
+
+    manifest = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    manifest[record['file']] = record['fingerprint']
+                except (ValueError, KeyError):
+                    # A line cut short by an interrupted export
+                    continue
+    except OSError:
+        pass
+    return manifest
+
+
+def build_jobs(theory, output, source, args):
+    """A function to list one job for every scale/mode/root, each with the fingerprint of its settings."""
+
+    jobs = []
+    for scale in theory.registry:
+        key = scale.key
+        if args.scales and key not in args.scales:
+            continue
+        for mode in range(1, scale.mode_count + 1):
+            for root in range(0, 12):
+                entry = theory.lookup(key, mode, root)
+                folder = os.path.join(output, ascii_name(key), f'mode_{mode}')
+                name = f'{root:02d}_{ascii_name(entry.display_notes[0])}'
+
+                settings = {'scale': key, 'mode': mode, 'root': root, 'tempo': args.tempo,
+                            'chime_seconds': args.chime, 'seed': args.seed, 'source': source}
+                fingerprint = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+                jobs.append({'scale': key, 'mode': mode, 'root': root,
+                             'tempo': args.tempo, 'chime_seconds': args.chime, 'seed': args.seed + root,
+                             'scale_path': os.path.join(folder, name + '_scale.wav'),
+                             'chime_path': os.path.join(folder, name + '_chime.wav') if args.chime > 0 else None,
+                             'fingerprint': fingerprint})
+    return jobs
+
+
+def is_up_to_date(job, manifest, output):
+    """A function to check whether a job's files exist and were made from the same settings and sources."""
+
+    for path in (job['scale_path'], job['chime_path']):
+        if path is None:
+            continue
+        if manifest.get(os.path.relpath(path, output)) != job['fingerprint'] or not os.path.exists(path):
+            return False
+    return True
+
+
+def main(argv=None):
+    global _renderer
+
+    parser = argparse.ArgumentParser(description='Render a preview of every scale, mode, and root.')
+    parser.add_argument('-o', '--output', default='previews', help='folder to write to (default: previews)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--tempo', type=float, default=120, help='tempo of the scale previews (default: 120)')
+    parser.add_argument('--chime', type=float, default=0, help='seconds of chime to render for each (default: none)')
+    parser.add_argument('--seed', type=int, default=1, help='seed for the chime pattern (default: 1)')
+    parser.add_argument('--scales', nargs='*', help='only export these scale keys (i.e. major kumoi)')
+    parser.add_argument('--force', action='store_true', help='render every file, even if it is up to date')
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+
+    # Load the scale data and samples once, before the workers start, so they can share them
+    theory = TheoryTable.load('music_scales.json', 'roots.json', 'music_theory_cache.json')
+    sample_bank = SampleBank('AudioFiles', 24).load()
+    _renderer = SessionRenderer(sample_bank, theory)
+
+    if args.scales:
+        unknown = [key for key in args.scales if key not in theory.registry]
+        if unknown:
+            parser.error(f'Unknown scale keys: {", ".join(unknown)}')
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = os.path.join(args.output, 'manifest.jsonl')
+    manifest = {} if args.force else read_manifest(manifest_path)
+
+    jobs = build_jobs(theory, args.output, source_fingerprint(theory, sample_bank), args)
+    pending = [job for job in jobs if not is_up_to_date(job, manifest, args.output)]
+    skipped = len(jobs) - len(pending)
+
+    print(f'{len(jobs)} scale/mode/root combinations, {skipped} up to date, {len(pending)} to render '
+          f'with {args.workers} workers')
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    done = 0
+    files = 0
+    audio_seconds = 0.0
+    render_start = time.perf_counter()
+
+    with open(manifest_path, 'a', encoding='utf-8') as manifest_file, \
+            ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=_init_worker,
+                                initargs=('music_scales.json', 'roots.json')) as executor:
+        for job, seconds in executor.map(_export_job, pending, chunksize=8):
+            # Record each finished file straight away, so an interrupted export can resume
+            for path in (job['scale_path'], job['chime_path']):
+                if path is not None:
+                    record = {'file': os.path.relpath(path, args.output), 'fingerprint': job['fingerprint']}
+                    manifest_file.write(json.dumps(record) + '\n')
+                    files += 1
+            manifest_file.flush()
+
+            done += 1
+            audio_seconds += seconds
+            if done % 250 == 0:
+                print(f'{done} of {len(pending)}')
+
+    elapsed = time.perf_counter() - render_start
+    total = time.perf_counter() - start_time
+
+    print(f'Rendered {files} files ({audio_seconds / 60:.1f} minutes of audio) in {elapsed:.1f} s: '
+          f'{files / max(elapsed, 1e-9):.1f} files/s, {audio_seconds / max(elapsed, 1e-9):.0f}x real time. '
+          f'{skipped} skipped, {total:.1f} s in total.')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,308 @@
+#! python3
+# Ukulele_Chimes_Render.py - Renders a chime session (the chime and the drones) straight to a WAV file,
+# without a sound device or a window, much faster than real time.
+
+"""
+
+    Usage:
+        python Ukulele_Chimes_Render.py --scale "Major Pentatonic" --root C --duration 3600 --seed 7 -o ambience.wav
+
+    •Scale - The scale key or name from music_scales.json (i.e. major_pentatonic or "Major Pentatonic")
+    •Mode - The mode of the scale (1 and up)
+    •Root - The root note, by name (i.e. C, F♯, Gb) or by root dial position (0-11)
+    •Volumes - The 13 note volumes (0-10), separated by commas, as set with the note volume sliders
+    •Drones - The 2 drone volumes (0-10), separated by commas, as set with the drone volume sliders
+    •Octave - Moves the notes up or down by whole octaves, past the range of the recordings
+    •Tuning - The temperament (equal, just, pythagorean, or meantone), built on the root
+    •Detune - Moves every note and drone by a number of cents
+    •Duration - The length of the session in seconds
+    •Wind - How the chime is struck: rounds (the same as the program), uniform, poisson, or gusty
+    •Seed - The same seed always produces the same chime pattern
+    •Reverb - Adds the reverb of a room (room, hall, or cathedral), at a level of 0-1 set with --reverb-mix
+
+"""
+
+import os
+import sys
+import time
+import wave
+import random
+import argparse
+
+# Keep pygame's greeting out of the command line output
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy
+from sample_bank import SampleBank
+from drone_synth import DroneSynth, DRONE_FREQUENCIES
+from music_theory import TheoryTable, find_root
+from chime_patterns import ChimePattern, WIND_MODELS
+from chime_state import ChimeState, parse_levels
+from mixer_engine import MixerEngine
+from pitch_shifter import PitchShifter, TEMPERAMENTS
+from event_log import group_events, apply_event
+from reverb import ConvolutionReverb, ROOMS
+
+
+class SessionRenderer:
+    """Overall class to mix a chime session into blocks of audio with numpy."""
+
+    def __init__(self, sample_bank, theory, voices=16, block_frames=4096, reverb=None, reverb_mix=0.3):
+        """A method to set up the renderer from a sample bank and music theory table.
+
+        The notes are mixed by a MixerEngine with the same number of voices as the live program. reverb, if
+        given, is one of reverb.ROOMS, added to every file written at a level of reverb_mix, the same as live."""
+
+        if reverb is not None and reverb not in ROOMS:
+            raise ValueError(f'Unknown room: {reverb} (expected one of {", ".join(ROOMS)})')
+
+        self.sample_bank = sample_bank.load()
+        self.theory = theory
+
+        self.sample_rate = sample_bank.sample_rate
+        self.channels = sample_bank.samples(0).shape[1]
+        self.block_frames = block_frames
+        self.voices = voices
+
+        # The reverb of the last file written, kept for its stats
+        self.reverb_room = reverb
+        self.reverb_mix = reverb_mix
+        self.reverb = None
+
+        self.drone_synth = DroneSynth(self.sample_rate, self.channels)
+        self.pitch_shifter = PitchShifter(self.sample_bank)
+
+    def chime_events(self, state, duration, seed, wind='rounds'):
+        """A method to list every chime note of the session as (start frame, sample index, gain), in time order.
+
+        The notes are picked by the same pattern generator as the live chime, so a seed plays the same pattern."""
+
+        degrees = self.theory.lookup(state.scale, state.mode, state.root).degrees
+        times, notes, velocities = ChimePattern(wind, seed).take(duration, degrees)
+
+        gains = numpy.asarray(state.volumes, dtype=numpy.float32)[notes] / 10 * velocities
+        keep = gains > 0
+
+        frames = numpy.rint(times[keep] * self.sample_rate).astype(numpy.int64)
+        notes = state.root + notes[keep] + 12 * state.octave
+
+        return list(zip(frames.tolist(), notes.tolist(), gains[keep].tolist()))
+
+    def scale_events(self, state, tempo=60):
+        """A method to list the notes of the current scale/mode in ascending order, one beat apart, the same as
+        the Play Scale button. Returns (start frame, sample index, gain) for each note."""
+
+        degrees = self.theory.lookup(state.scale, state.mode, state.root).degrees
+        beat = 60 / tempo
+
+        events = []
+        for i, degree in enumerate(degrees):
+            note = state.root + degree + 12 * state.octave
+            events.append((int(round(i * beat * self.sample_rate)), note, state.volumes[degree] / 10))
+        return events
+
+    def drones(self, state):
+        """A method to return the drone loops and their gains as a list of (buffer, gain)."""
+
+        fifth = self.theory.lookup(state.scale, state.mode, state.root).fifth
+
+        drones = []
+        for degree, volume in ((0, state.drone_volumes[0]), (fifth, state.drone_volumes[1])):
+            if volume > 0:
+                note = state.root + degree
+                frequency = DRONE_FREQUENCIES[note] * 2 ** (self.pitch_shifter.cents(note) / 1200)
+                buf = self.drone_synth.buffer(frequency).astype(numpy.float32)
+                drones.append((buf, volume / 10))
+        return drones
+
+    def render_blocks(self, state, duration, seed, wind='rounds'):
+        """A method to mix the session one block at a time. Yields float32 arrays of shape (frames, channels)."""
+
+        self.pitch_shifter.set_tuning(state.tuning, state.root, state.detune)
+        total_frames = int(round(duration * self.sample_rate))
+        return self.mix_blocks(self.chime_events(state, duration, seed, wind), self.drones(state), total_frames)
+
+    def mix_blocks(self, events, drones, total_frames):
+        """A method to mix a list of (start frame, sample index, gain) events and a list of drones one block at a
+        time. Yields float32 arrays of shape (frames, channels)."""
+
+        engine = MixerEngine(self.voices, self.sample_rate, self.channels, self.block_frames)
+        next_event = 0
+
+        for block_start in range(0, total_frames, self.block_frames):
+            block_end = min(block_start + self.block_frames, total_frames)
+
+            # Notes that start in this block start on their exact frame
+            while next_event < len(events) and events[next_event][0] < block_end:
+                start, index, gain = events[next_event]
+                engine.trigger(self.pitch_shifter.samples(index), gain, delay=start - block_start)
+                next_event += 1
+
+            # Drones loop for the whole session
+            yield self.add_drones(engine.render(block_end - block_start), drones, block_start)
+
+    def add_drones(self, block, drones, start):
+        """A method to mix looping drones into a block that starts at the given frame of the session."""
+
+        if drones:
+            frames = numpy.arange(start, start + len(block))
+            for buf, gain in drones:
+                block += buf[frames % len(buf)] * gain
+        return block
+
+    def replay_blocks(self, events, tail=2.0):
+        """A method to mix a session recorded to an event log (see event_log.py), from its LogEvents, one block
+        at a time. Every note starts on its exact frame, and the drones follow the settings as they changed.
+        A log that was not closed (it has no end) has tail seconds added for its last notes to ring out.
+        Yields float32 arrays of shape (frames, channels)."""
+
+        engine = MixerEngine(self.voices, self.sample_rate, self.channels, self.block_frames)
+        state = ChimeState()
+        drones = []
+        frame = 0
+
+        # Sample index -> (voice, start count) of each key held down, for keys that were let go
+        held = {}
+
+        end = None
+        for group in group_events(events):
+            start = int(round(group[0].time * self.sample_rate))
+            while frame < start:
+                frames = min(self.block_frames, start - frame)
+                yield self.add_drones(engine.render(frames), drones, frame)
+                frame += frames
+
+            changed = False
+            for event in group:
+                if event.kind == 'note':
+                    voice = engine.trigger(self.pitch_shifter.samples(event.value), event.level)
+                    if event.arg == 'key':
+                        held[event.value] = (voice, int(engine.started[voice]))
+                elif event.kind == 'release':
+                    if event.value in held:
+                        engine.release(*held.pop(event.value))
+                elif event.kind == 'end':
+                    end = start
+                else:
+                    changed = apply_event(state, event) or changed
+
+            if changed:
+                self.pitch_shifter.set_tuning(state.tuning, state.root, state.detune)
+                drones = self.drones(state)
+
+        if end is None:
+            end = frame + int(round(tail * self.sample_rate))
+        while frame < end:
+            frames = min(self.block_frames, end - frame)
+            yield self.add_drones(engine.render(frames), drones, frame)
+            frame += frames
+
+    def render(self, path, state, duration, seed, wind='rounds'):
+        """A method to render the session to a 16-bit WAV file. Returns the number of seconds it took."""
+
+        return self.write(path, self.render_blocks(state, duration, seed, wind))
+
+    def render_scale(self, path, state, tempo=60, tail=2.0):
+        """A method to render the current scale/mode, played in ascending order, to a 16-bit WAV file.
+        tail is how long, in seconds, the last note rings after its beat. Returns the number of seconds it took."""
+
+        self.pitch_shifter.set_tuning(state.tuning, state.root, state.detune)
+        events = self.scale_events(state, tempo)
+        total_frames = events[-1][0] + int(round((60 / tempo + tail) * self.sample_rate))
+        return self.write(path, self.mix_blocks(events, [], total_frames))
+
+    def write(self, path, blocks):
+        """A method to write blocks of audio to a 16-bit WAV file, through the reverb if there is one. Returns
+        the number of seconds it took."""
+
+        start_time = time.perf_counter()
+
+        # Convolved in partitions of the live mixer's block size, so the reverb sounds the same as it does live
+        if self.reverb_room is not None:
+            self.reverb = ConvolutionReverb.for_room(self.reverb_room, 1024, self.sample_rate, self.channels,
+                                                     self.reverb_mix)
+
+        with wave.open(path, 'wb') as wav:
+            wav.setnchannels(self.channels)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+
+            for block in blocks:
+                if self.reverb is not None:
+                    self.reverb.process(block)
+
+                # Sum and clip, the same as the mixer does when several sounds play at once
+                numpy.clip(block, -32768, 32767, out=block)
+                wav.writeframes(block.astype('<i2').tobytes())
+
+        return time.perf_counter() - start_time
+
+
+def print_reverb(reverb):
+    """A function to print what the reverb cost, against the time each partition takes to play."""
+
+    stats = reverb.stats()
+    print(f'Reverb: {stats["length"]:.2f} s in {stats["partitions"]} partitions, '
+          f'{stats["block_time_mean"] * 1000:.3f} ms per block (peak {stats["block_time_peak"] * 1000:.3f} ms), '
+          f'{stats["load"]:.1%} of real time on one core')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render a chime session to a WAV file, without a sound device.')
+    parser.add_argument('--scale', default='major', help='scale key or name (default: major)')
+    parser.add_argument('--scale-file', default='music_scales.json',
+                        help='json file of scales (default: music_scales.json)')
+    parser.add_argument('--mode', type=int, default=1, help='mode of the scale (default: 1)')
+    parser.add_argument('--root', default='C', help='root note name or dial position 0-11 (default: C)')
+    parser.add_argument('--volumes', default=','.join(['5'] * 13), help='13 note volumes, 0-10 (default: all 5)')
+    parser.add_argument('--drones', default='0,0', help='2 drone volumes, 0-10 (default: 0,0)')
+    parser.add_argument('--octave', type=int, default=0, help='octaves to move the notes up or down (default: 0)')
+    parser.add_argument('--tuning', default='equal', choices=list(TEMPERAMENTS), help='temperament (default: equal)')
+    parser.add_argument('--detune', type=float, default=0.0, help='cents to move every note by (default: 0)')
+    parser.add_argument('--duration', type=float, default=60.0, help='length of the session in seconds')
+    parser.add_argument('--wind', default='rounds', choices=list(WIND_MODELS), help='wind model (default: rounds)')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the chime pattern (default: random)')
+    parser.add_argument('--reverb', choices=list(ROOMS), help='add the reverb of a room (default: none)')
+    parser.add_argument('--reverb-mix', type=float, default=0.3, help='level of the reverb, 0-1 (default: 0.3)')
+    parser.add_argument('-o', '--output', default='Ukulele_Chimes.wav', help='WAV file to write')
+    args = parser.parse_args(argv)
+
+    try:
+        theory = TheoryTable.load(args.scale_file, 'roots.json', 'music_theory_cache.json')
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+
+    try:
+        scale = theory.find_scale(args.scale)
+        if not 1 <= args.mode <= theory.mode_count(scale):
+            raise ValueError(f'{theory.registry[scale].name} has modes 1-{theory.mode_count(scale)}')
+        state = ChimeState(root=find_root(args.root),
+                           scale=scale,
+                           mode=args.mode,
+                           volumes=parse_levels(args.volumes, 13),
+                           drone_volumes=parse_levels(args.drones, 2),
+                           octave=args.octave,
+                           tuning=args.tuning,
+                           detune=args.detune)
+    except ValueError as error:
+        parser.error(str(error))
+    if not 0 <= args.reverb_mix <= 1:
+        parser.error('--reverb-mix must be from 0 to 1')
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+
+    renderer = SessionRenderer(SampleBank('AudioFiles', 24), theory, reverb=args.reverb, reverb_mix=args.reverb_mix)
+    elapsed = renderer.render(args.output, state, args.duration, seed, args.wind)
+
+    label = theory.lookup(state.scale, state.mode, state.root).label
+    print(f'{label}, seed {seed}')
+    print(f'Rendered {args.duration:.1f} s to {args.output} in {elapsed:.2f} s '
+          f'({args.duration / max(elapsed, 1e-9):.0f}x real time)')
+    if renderer.reverb is not None:
+        print_reverb(renderer.reverb)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#! python3
+# Ukulele_Chimes_Replay.py - Plays back an event log recorded by the program or the daemon, either live through
+# the sound device, or mixed to a WAV file much faster than real time.
+
+"""
+
+    Usage:
+        python Ukulele_Chimes_Replay.py session.uclog                       Summarize the log
+        python Ukulele_Chimes_Replay.py session.uclog -o session.wav        Mix the log to a WAV file
+        python Ukulele_Chimes_Replay.py session.uclog --live --speed 2      Play the log at twice the speed
+
+    Logs are recorded with UKULELE_CHIMES_RECORD=session.uclog for the window, or --record session.uclog for
+    the daemon (see event_log.py). Every note plays exactly as it was recorded (the chime is not generated
+    again), and the drones, tuning, and volumes follow the settings as they changed.
+
+"""
+
+import os
+import sys
+import time
+import argparse
+import datetime
+
+# Keep pygame's greeting out of the command line output
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from sample_bank import SampleBank
+from music_theory import TheoryTable
+from chime_session import ChimeSession
+from event_log import LogPlayer, read_events, summarize
+from reverb import ROOMS
+from Ukulele_Chimes_Render import SessionRenderer, print_reverb
+
+
+def print_summary(path, info):
+    """A function to print what a log holds."""
+
+    started = datetime.datetime.fromtimestamp(info['started']).strftime('%Y-%m-%d %H:%M:%S')
+    print(f'{path}: started {started}, {info["seconds"]:.1f} seconds, {info["events"]} events, '
+          f'{os.path.getsize(path)} bytes' + ('' if info['complete'] else ' (not closed)'))
+    print('Notes: ' + (', '.join(f'{count} {source}' for source, count in sorted(info['notes'].items())) or 'none'))
+    print('Events: ' + ', '.join(f'{count} {kind}' for kind, count in sorted(info['kinds'].items())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play back an event log, live or to a WAV file.')
+    parser.add_argument('log', help='event log recorded by the program or the daemon')
+    parser.add_argument('-o', '--output', help='mix the log to this WAV file')
+    parser.add_argument('--live', action='store_true', help='play the log through the sound device')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed for --live (default: 1)')
+    parser.add_argument('--reverb', choices=list(ROOMS), help='add the reverb of a room (default: none)')
+    parser.add_argument('--reverb-mix', type=float, default=0.3, help='level of the reverb, 0-1 (default: 0.3)')
+    args = parser.parse_args(argv)
+
+    try:
+        info = summarize(args.log)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    if args.speed <= 0:
+        parser.error('--speed must be greater than 0')
+    if not 0 <= args.reverb_mix <= 1:
+        parser.error('--reverb-mix must be from 0 to 1')
+
+    print_summary(args.log, info)
+
+    theory = TheoryTable.load('music_scales.json', 'roots.json', 'music_theory_cache.json')
+
+    if args.output:
+        renderer = SessionRenderer(SampleBank('AudioFiles', 24), theory, reverb=args.reverb,
+                                   reverb_mix=args.reverb_mix)
+        elapsed = renderer.write(args.output, renderer.replay_blocks(read_events(args.log)))
+        print(f'Mixed {info["seconds"]:.1f} seconds to {args.output} in {elapsed:.2f} s '
+              f'({info["seconds"] / max(elapsed, 1e-9):.0f}x real time)')
+        if renderer.reverb is not None:
+            print_reverb(renderer.reverb)
+
+    if args.live:
+        pygame.mixer.init()
+        pygame.mixer.set_num_channels(16)
+
+        session = ChimeSession(SampleBank('AudioFiles', 24).load(), theory, reverb=args.reverb,
+                               reverb_mix=args.reverb_mix)
+        player = LogPlayer(args.log, session, args.speed).start()
+        print(f'Playing at {args.speed:g}x, press Ctrl+C to stop')
+
+        try:
+            while player.is_playing():
+                time.sleep(0.1)
+            # Let the last notes ring out
+            time.sleep(2)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            player.stop()
+            session.close()
+            pygame.mixer.quit()
+
+        print(f'Played {player.played} events')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+#! python3
+# Ukulele_Chimes_Soak.py - Runs a long session on a simulated clock, many times faster than real time, and checks
+# that the threads, sounds, and memory it uses stay flat.
+
+"""
+
+    Usage:
+        python Ukulele_Chimes_Soak.py                               Simulate an 8 hour session
+        python Ukulele_Chimes_Soak.py --hours 1 --wind gusty        Simulate an hour of gusty wind
+
+    The session runs in long-session mode (see resource_guard.py), with the chime on the whole time. Every few
+    minutes the root, scale, mode, octave, tuning, and drones change at random, so every cache is filled and
+    emptied many times over. Nothing is played out loud: the mixer mixes every block and throws it away.
+
+    Resource use is sampled every simulated ten minutes. On the simulated clock nothing runs on its own, so the
+    session has no threads and no Sounds: those limits are checked by a real-time slice afterwards, a few seconds
+    of the same session with its scheduler, workers, and stream running, alongside idle threads of the kind the
+    rest of a process starts (i.e. one per daemon client), which must not make the session refuse any notes.
+
+    Last, the same session is run for a few seconds with the limit on its threads, and then on its Sounds, set
+    below what it needs, to check that every note is refused while it is over a limit.
+
+    The soak passes if no limit was ever passed, no note was refused in the real-time slice, every note was refused
+    over a limit, and the memory used by the process at the end is within the tolerance of what it was after the
+    first hour. The exit code is 1 if it fails.
+
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+# Run without a sound device. Set before pygame is imported.
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from sample_bank import SampleBank
+from music_theory import TheoryTable
+from chime_state import ChimeState
+from chime_session import ChimeSession
+from chime_patterns import WIND_MODELS
+from pitch_shifter import TEMPERAMENTS
+from event_scheduler import ManualClock
+from mixer_engine import EngineStream
+
+
+# Simulated seconds between samples of the resource use
+SAMPLE_INTERVAL = 600
+
+# Limits below what a playing session needs (its scheduler, a worker, and its stream; the stream's ring of
+# Sounds), for the slices run over a limit
+OVER_LIMITS = {'threads': 2, 'sounds': EngineStream.RING_SIZE - 1}
+
+
+def change_settings(session, rng):
+    """A function to move the session to a random root, scale, mode, octave, tuning, and drone volumes."""
+
+    theory = session.theory
+    state = session.state
+
+    scale = rng.choice(theory.registry.keys())
+    state.set('scale', scale)
+    state.set('mode', rng.randint(1, theory.mode_count(scale)))
+    state.set('root', rng.randrange(12))
+    state.set('octave', rng.choice([-1, 0, 0, 1]))
+    state.set('tuning', rng.choice(list(TEMPERAMENTS)))
+    state.set('detune', rng.choice([0.0, 0.0, rng.uniform(-30, 30)]))
+    for i in range(0, 2):
+        state.set_drone_volume(i, rng.choice([0, 0, 3, 6]))
+
+    session.apply()
+
+
+def sample(session, hour):
+    """A function to record the resource use, and what has been played and shed so far."""
+
+    usage = session.guard.usage()
+    scheduler = session.scheduler.stats()
+    return {'hour': hour,
+            'memory_bytes': usage['memory_bytes'],
+            'rss_bytes': usage['rss_bytes'],
+            'queued': usage['queued'],
+            'voices': session.mixer_engine.active_voices(),
+            'notes': session.mixer_engine.trigger_count,
+            'shed': scheduler['shed'] + session.guard.shed_notes}
+
+
+def print_sample(row):
+    """A function to print one row of the table."""
+
+    print(f'{row["hour"]:>6.2f}  {row["memory_bytes"] / 2 ** 20:>9.1f}  '
+          f'{row["rss_bytes"] / 2 ** 20:>7.1f}  {row["queued"]:>6}  {row["voices"]:>6}  {row["notes"]:>8}  '
+          f'{row["shed"]:>6}')
+
+
+def realtime_slice(sample_bank, theory, limits, seconds, other_threads, wind, seed, changes=True):
+    """A function to run a long session in real time for a number of seconds, changing the settings every two
+    seconds (unless changes is False), with other_threads idle threads alongside it. Returns the peaks of the
+    session's threads and Sounds, the peak of the process's threads, the notes played, and the notes refused."""
+
+    idle = threading.Event()
+    others = [threading.Thread(target=idle.wait, name=f'idle_{i}', daemon=True) for i in range(0, other_threads)]
+    for thread in others:
+        thread.start()
+
+    session = ChimeSession(sample_bank, theory, ChimeState(), wind=wind, seed=seed, long_session=True,
+                           limits=limits)
+    rng = random.Random(seed)
+    session.apply()
+    session.start_chime()
+
+    result = {'threads': 0, 'sounds': 0, 'process_threads': 0}
+    end = time.monotonic() + seconds
+    next_change = time.monotonic() + 2.0
+    while time.monotonic() < end:
+        if changes and time.monotonic() >= next_change:
+            change_settings(session, rng)
+            next_change += 2.0
+
+        usage = session.guard.usage()
+        for name in result:
+            result[name] = max(result[name], usage[name])
+        time.sleep(0.1)
+
+    result['notes'] = session.mixer_engine.trigger_count
+    result['refused'] = session.guard.shed_notes
+    session.close()
+    idle.set()
+
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate a long session and check that its resource use stays flat.')
+    parser.add_argument('--hours', type=float, default=8.0, help='simulated length of the session (default: 8)')
+    parser.add_argument('--step', type=float, default=1.0, help='simulated seconds per step (default: 1)')
+    parser.add_argument('--change-every', type=float, default=300.0,
+                        help='simulated seconds between changes of the settings (default: 300)')
+    parser.add_argument('--wind', default='rounds', choices=list(WIND_MODELS), help='wind model (default: rounds)')
+    parser.add_argument('--seed', type=int, default=1, help='seed for the chime and the changes (default: 1)')
+    parser.add_argument('--max-threads', type=int, default=8,
+                        help="limit on the session's threads, over which notes are refused (default: 8)")
+    parser.add_argument('--max-sounds', type=int, default=16,
+                        help="limit on the session's pygame Sounds, over which notes are refused (default: 16)")
+    parser.add_argument('--realtime', type=float, default=10.0,
+                        help='seconds of the real-time slice that checks the threads and Sounds (default: 10)')
+    parser.add_argument('--other-threads', type=int, default=8,
+                        help='idle threads started alongside the real-time slice (default: 8)')
+    parser.add_argument('--max-memory', type=float, default=32.0,
+                        help='limit on audio kept in memory, in MB (default: 32)')
+    parser.add_argument('--tolerance', type=float, default=16.0,
+                        help='allowed growth of the process memory after the first hour, in MB (default: 16)')
+    parser.add_argument('-o', '--output', help='also write the samples to this json file')
+    args = parser.parse_args(argv)
+
+    theory = TheoryTable.load('music_scales.json', 'roots.json', 'music_theory_cache.json')
+
+    pygame.mixer.init()
+    pygame.mixer.set_num_channels(16)
+
+    limits = {'max_threads': args.max_threads,
+              'max_sounds': args.max_sounds,
+              'max_memory': int(args.max_memory * 2 ** 20)}
+
+    sample_bank = SampleBank('AudioFiles', 24).load()
+    clock = ManualClock()
+    session = ChimeSession(sample_bank, theory, ChimeState(), wind=args.wind,
+                           seed=args.seed, long_session=True, limits=limits, clock=clock, realtime=False)
+    guard = session.guard
+
+    rng = random.Random(args.seed)
+    session.apply()
+    session.start_chime()
+
+    total = args.hours * 3600
+    next_change = args.change_every
+    next_sample = SAMPLE_INTERVAL
+    samples = [sample(session, 0.0)]
+
+    print(f'Simulating {args.hours:g} hours ({args.wind} wind), limits: {args.max_threads} threads, '
+          f'{args.max_sounds} sounds, {args.max_memory:g} MB')
+    print(' hours   audio MB  rss MB  queued  voices     notes    shed')
+    print_sample(samples[0])
+
+    start = time.perf_counter()
+    while clock() < total:
+        session.advance(min(args.step, total - clock()))
+
+        if clock() >= next_change:
+            change_settings(session, rng)
+            next_change += args.change_every
+
+        if clock() >= next_sample:
+            samples.append(sample(session, clock() / 3600))
+            next_sample += SAMPLE_INTERVAL
+            if len(samples) % 6 == 1:
+                print_sample(samples[-1])
+
+    elapsed = time.perf_counter() - start
+    session.close()
+
+    # Memory after the first hour, once every cache has had the chance to fill, against the end
+    warm = [row for row in samples if row['hour'] >= 1.0] or samples
+    growth = (samples[-1]['rss_bytes'] - warm[0]['rss_bytes']) / 2 ** 20
+
+    print(f'Running {args.realtime:g} s in real time, alongside {args.other_threads} idle threads')
+    live = realtime_slice(sample_bank, theory, limits, args.realtime, args.other_threads, args.wind, args.seed)
+
+    # The drones are off and the settings don't change, so every note is a chime note that must be refused
+    over = {}
+    for name, limit in OVER_LIMITS.items():
+        print(f'Running 2 s in real time with the limit on {name} set to {limit}')
+        over[name] = realtime_slice(sample_bank, theory, dict(limits, **{'max_' + name: limit}), 2.0, 0, args.wind,
+                                    args.seed, changes=False)
+
+    failures = []
+    peaks = guard.peaks
+    if live['threads'] > args.max_threads:
+        failures.append(f'{live["threads"]} session threads (limit {args.max_threads})')
+    if live['sounds'] > args.max_sounds:
+        failures.append(f'{live["sounds"]} sounds (limit {args.max_sounds})')
+    if live['notes'] == 0:
+        failures.append('no notes played in real time')
+    if live['refused'] > 0:
+        failures.append(f'{live["refused"]} notes refused in real time')
+    for name, result in over.items():
+        if result['notes'] > 0 or result['refused'] == 0:
+            failures.append(f'{result["notes"]} notes played over a limit of {OVER_LIMITS[name]} {name}')
+    if peaks['memory_bytes'] > guard.max_memory:
+        failures.append(f'{peaks["memory_bytes"] / 2 ** 20:.1f} MB of audio (limit {args.max_memory:g} MB)')
+    if growth > args.tolerance:
+        failures.append(f'process memory grew {growth:.1f} MB after the first hour (tolerance {args.tolerance:g} MB)')
+
+    print(f'Simulated {args.hours:g} hours in {elapsed:.1f} s ({total / elapsed:.0f}x real time)')
+    print(f'Peaks: {peaks["memory_bytes"] / 2 ** 20:.1f} MB of audio, {peaks["queued"]} queued events. Process memory '
+          f'grew {growth:+.1f} MB after the first hour.')
+    print(f'Real time: {live["threads"]} session threads ({live["process_threads"]} in the process), '
+          f'{live["sounds"]} sounds, {live["notes"]} notes played, {live["refused"]} refused')
+    for name, result in over.items():
+        print(f'Over the limit on {name} ({result[name]}, limit {OVER_LIMITS[name]}): {result["notes"]} notes played, '
+              f'{result["refused"]} refused')
+    print(f'Shed: {session.scheduler.shed} late events, {guard.shed_notes} notes, {guard.trimmed_notes} derived notes '
+          f'and {guard.trimmed_drones} drone loops dropped from memory')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'elapsed': elapsed, 'peaks': peaks, 'realtime': live, 'over_limits': over,
+                       'samples': samples}, f, indent=2)
+
+    if failures:
+        print('FAILED: ' + ', '.join(failures))
+        return 1
+    print('PASSED: resource use stayed within the limits')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+#! python3
+# chime_patterns.py - Picks when the notes of the chime are played, so that the live chime and the offline
+# renderer produce the same pattern. Patterns are generated from a seed, many notes at a time, by one of
+# several wind models.
+
+import numpy
+
+
+class RoundsModel:
+    """Overall class for the original chime: in each round every degree plays once, at a random delay of 0-5
+    seconds (in steps of 1/5), and the next round starts when the last note of this round plays."""
+
+    def __init__(self, rounds=64):
+        """A method to set up the model. rounds is the number of rounds generated at a time."""
+
+        self.rounds = rounds
+
+    def chunk(self, rng, start, degrees):
+        """A method to generate the next rounds. Returns the times, degrees, and velocities of the notes, and
+        the time the last round ends."""
+
+        degrees = numpy.asarray(degrees)
+        delays = rng.integers(0, 26, size=(self.rounds, len(degrees))) / 5
+
+        lengths = numpy.maximum(delays.max(axis=1, initial=0), 1 / 5)
+        round_starts = start + numpy.concatenate(([0.0], numpy.cumsum(lengths)[:-1]))
+
+        times = (round_starts[:, numpy.newaxis] + delays).ravel()
+        notes = numpy.broadcast_to(degrees, delays.shape).ravel()
+        velocities = numpy.ones(len(times), dtype=numpy.float32)
+
+        return times, notes, velocities, start + lengths.sum()
+
+
+class UniformModel:
+    """Overall class for a steady breeze: notes at an even rate, each at a random point in its own time slot."""
+
+    def __init__(self, rate=1.5, velocity=(0.6, 1.0), notes=256):
+        """A method to set up the model. rate is the number of notes per second, velocity is the range each
+        note's loudness is picked from, and notes is the number generated at a time."""
+
+        self.rate = rate
+        self.velocity = velocity
+        self.notes = notes
+
+    def chunk(self, rng, start, degrees):
+        """A method to generate the next notes. Returns their times, degrees, and velocities, and the time the
+        chunk ends."""
+
+        period = 1 / self.rate
+        times = start + (numpy.arange(self.notes) + rng.random(self.notes)) * period
+        notes = rng.choice(numpy.asarray(degrees), self.notes)
+        velocities = rng.uniform(*self.velocity, self.notes).astype(numpy.float32)
+
+        return times, notes, velocities, start + self.notes * period
+
+
+class PoissonModel:
+    """Overall class for a random breeze: notes at an average rate, each independent of the last (a Poisson
+    process), so they sometimes bunch together and sometimes leave long gaps."""
+
+    def __init__(self, rate=1.5, velocity=(0.5, 1.0), seconds=60.0):
+        """A method to set up the model. rate is the average number of notes per second, velocity is the range
+        each note's loudness is picked from, and seconds is the length generated at a time."""
+
+        self.rate = rate
+        self.velocity = velocity
+        self.seconds = seconds
+
+    def chunk(self, rng, start, degrees):
+        """A method to generate the next notes. Returns their times, degrees, and velocities, and the time the
+        chunk ends."""
+
+        count = rng.poisson(self.rate * self.seconds)
+
+        # Given how many notes fall in the chunk, their times are uniform within it
+        times = start + numpy.sort(rng.random(count)) * self.seconds
+        notes = rng.choice(numpy.asarray(degrees), count)
+        velocities = rng.uniform(*self.velocity, count).astype(numpy.float32)
+
+        return times, notes, velocities, start + self.seconds
+
+
+class GustyModel:
+    """Overall class for gusty wind: a light breeze that now and then picks up into a gust. The wind strength
+    drifts smoothly between random levels, and both how often and how hard the chimes are struck follow it."""
+
+    def __init__(self, calm_rate=0.3, gust_rate=5.0, gust_length=4.0, gustiness=3.0, knots=32):
+        """A method to set up the model.
+
+        calm_rate and gust_rate are the notes per second in still air and at the peak of a gust. The wind
+        strength changes every gust_length seconds, and raising gustiness makes strong gusts rarer.
+        knots is the number of wind strength changes generated at a time."""
+
+        self.calm_rate = calm_rate
+        self.gust_rate = gust_rate
+        self.gust_length = gust_length
+        self.gustiness = gustiness
+        self.knots = knots
+
+        # The wind strength (0-1) at the end of the last chunk, so the next one carries on from it
+        self.level = None
+
+    def chunk(self, rng, start, degrees):
+        """A method to generate the next notes. Returns their times, degrees, and velocities, and the time the
+        chunk ends."""
+
+        if self.level is None:
+            self.level = rng.random() ** self.gustiness
+        levels = numpy.concatenate(([self.level], rng.random(self.knots) ** self.gustiness))
+        self.level = levels[-1]
+
+        seconds = self.knots * self.gust_length
+
+        # Candidate notes at the peak rate, thinned to the wind strength at each one's time
+        count = rng.poisson(self.gust_rate * seconds)
+        offsets = numpy.sort(rng.random(count)) * seconds
+
+        knot = numpy.minimum((offsets // self.gust_length).astype(numpy.int64), self.knots - 1)
+        fraction = offsets / self.gust_length - knot
+        ease = (1 - numpy.cos(numpy.pi * fraction)) / 2
+        strength = levels[knot] + (levels[knot + 1] - levels[knot]) * ease
+
+        rate = self.calm_rate + (self.gust_rate - self.calm_rate) * strength
+        keep = rng.random(count) < rate / self.gust_rate
+
+        times = start + offsets[keep]
+        notes = rng.choice(numpy.asarray(degrees), len(times))
+        velocities = (0.4 + 0.6 * strength[keep] * rng.uniform(0.8, 1.0, len(times))).astype(numpy.float32)
+
+        return times, notes, velocities, start + seconds
+
+
+# The wind models, by name
+WIND_MODELS = {
+    'rounds': RoundsModel,
+    'uniform': UniformModel,
+    'poisson': PoissonModel,
+    'gusty': GustyModel,
+}
+
+
+class ChimePattern:
+    """Overall class to generate the chime, from a seed, as blocks of (time, degree, velocity) events.
+
+    Times are in seconds from the start of the pattern. Velocities (0-1) scale the volume of each note."""
+
+    def __init__(self, model='rounds', seed=None, **options):
+        """A method to set up the pattern. model is a key of WIND_MODELS, and options are passed to it."""
+
+        if model not in WIND_MODELS:
+            raise ValueError(f'Unknown wind model: {model} (expected one of {", ".join(WIND_MODELS)})')
+
+        self.model_name = model
+        self.model = WIND_MODELS[model](**options)
+        self.seed = seed
+        self.rng = numpy.random.default_rng(seed)
+
+        # Everything before this time has been generated. Notes generated but not yet taken wait in pending.
+        self.time = 0.0
+        self.taken = 0.0
+        self.degrees = None
+        self.pending = (numpy.zeros(0), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.float32))
+
+    def take(self, until, degrees):
+        """A method to return every note from where the last call left off until the given time, as arrays of
+        times, degrees, and velocities, in time order. New notes are picked from degrees."""
+
+        # Notes waiting from another scale are dropped, and the pattern carries on from the last note taken
+        if tuple(degrees) != self.degrees:
+            if self.degrees is not None:
+                self.time = self.taken
+                self.pending = tuple(part[:0] for part in self.pending)
+            self.degrees = tuple(degrees)
+
+        parts = [self.pending]
+        while self.time < until:
+            times, notes, velocities, self.time = self.model.chunk(self.rng, self.time, degrees)
+            parts.append((times, notes, velocities))
+
+        times = numpy.concatenate([part[0] for part in parts])
+        notes = numpy.concatenate([part[1] for part in parts]).astype(numpy.int64)
+        velocities = numpy.concatenate([part[2] for part in parts]).astype(numpy.float32)
+
+        order = numpy.argsort(times, kind='stable')
+        times, notes, velocities = times[order], notes[order], velocities[order]
+
+        cut = numpy.searchsorted(times, until)
+        self.pending = (times[cut:], notes[cut:], velocities[cut:])
+        self.taken = until
+
+        return times[:cut], notes[:cut], velocities[:cut]
@@ -0,0 +1,540 @@
+#! python3
+# chime_session.py - The audio side of Ukulele Chimes (the chime, the scale, the drones, and the mixer),
+# without any of the GUI, so it can be driven by the window or run on its own.
+
+import time
+import threading
+import pygame
+from drone_synth import DroneSynth, DRONE_FREQUENCIES
+from chime_state import ChimeState
+from chime_patterns import ChimePattern, WIND_MODELS
+from pitch_shifter import PitchShifter
+from event_scheduler import EventScheduler
+from scale_sequencer import ScaleSequencer
+from mixer_engine import MixerEngine, EngineStream
+from resource_guard import ResourceGuard
+from event_log import EventLogWriter
+from reverb import ConvolutionReverb
+
+
+class ChimeSession:
+    """Overall class to play the chime, the scale, and the drones for one set of settings."""
+
+    # Seconds of the chime queued on the scheduler at a time
+    CHIME_LOOKAHEAD = 2.0
+
+    def __init__(self, sample_bank, theory, state=None, voices=16, tempo=60, metrics=None, wind='rounds',
+                 seed=None, long_session=False, limits=None, clock=time.monotonic, realtime=True, zone=None,
+                 scheduler=None, drone_synth=None, channels=None, routed=False, record=None, drone_fade=0.5,
+                 drone_smoothing=0.1, on_drones_ready=None, reverb=None, reverb_mix=0.3, on_playback=None):
+        """A method to set up the scheduler, the mixer, and the drones. pygame.mixer must already be initialized.
+
+        metrics, if given, is a PlaybackMetrics that records the timing of the notes, and the live thread
+        and voice counts, as they play. wind is the chime's wind model (a key of chime_patterns.WIND_MODELS),
+        and seed, if given, makes the chime play the same pattern every time it is started.
+
+        long_session keeps the session within fixed limits on threads, Sounds, and memory (see ResourceGuard),
+        for chimes left on for hours. limits, if given, is a dict of ResourceGuard options (i.e. max_memory).
+        With realtime=False nothing runs on its own: clock should be an event_scheduler.ManualClock, and the
+        session is moved forward with advance() (i.e. to simulate hours of playing in seconds).
+
+        The rest are for running several sessions (zones) in one process (see chime_zones.py). zone names the
+        session, and prefixes the tags of its events. scheduler and drone_synth, if given, are shared with the
+        other zones, and are not stopped by close(). channels overrides the number of channels the session
+        mixes. With routed=True the session's mixer is played by a ZoneRouter instead of its own stream.
+
+        The drones are looping voices on the mixer. When the root, scale, mode, or tuning moves a drone, the
+        old one crossfades into the new one over drone_fade seconds, and the drone volumes glide to a new level
+        over drone_smoothing seconds. The loops of all 24 drone notes are built on the scheduler's workers as
+        soon as the tuning is known, and on_drones_ready, if given, is called (from a worker) when they are.
+
+        record, if given, is the path of an event log (see event_log.py) to record every note and every change
+        of the settings to, until the session is closed. reverb, if given, is one of reverb.ROOMS, added to the
+        notes and the drones at a level of reverb_mix.
+
+        on_playback, if given, is called as on_playback(kind, value) whenever what is playing changes, from
+        whichever thread changed it (a caller on the GUI thread, or a scheduler worker):
+            'chime'         the chime started (True) or stopped (False)
+            'scale'         the scale started (True), or finished or was stopped (False)
+            'scale_step'    the scale degree (0-12) the scale just played
+            'drones'        the frequencies of the drones now playing (empty when they stop)"""
+
+        self.sample_bank = sample_bank
+        self.theory = theory
+        self.state = state if state is not None else ChimeState()
+        self.metrics = metrics
+
+        self.zone = zone
+        self.routed = routed
+
+        frequency, size, mixer_channels = pygame.mixer.get_init()
+        if channels is None:
+            channels = mixer_channels
+
+        # Every note is mixed by the engine, from a fixed pool of voices, into one stream on a reserved channel.
+        # When all of the voices are busy, the oldest note is faded out to make room.
+        self.mixer_engine = MixerEngine(voices=voices, sample_rate=frequency, channels=channels, steal='oldest',
+                                        metrics=metrics)
+        self.engine_stream = EngineStream(self.mixer_engine, channel_id=0)
+        self.reverb_room = None
+        self.set_reverb(reverb, reverb_mix)
+
+        # Chime notes are queued on one scheduler thread, and played by a small, fixed pool of workers
+        self.owns_scheduler = scheduler is None
+        if scheduler is None:
+            scheduler = EventScheduler(workers=2, clock=clock, metrics=metrics)
+        self.scheduler = scheduler
+
+        self.realtime = realtime
+        if realtime:
+            if not routed:
+                self.engine_stream.start()
+            if self.owns_scheduler:
+                self.scheduler.start()
+
+        # The scale is played as quarter notes at this tempo (beats per minute)
+        self.scale_sequencer = ScaleSequencer(self.scheduler, tempo=tempo, tag=self.tag('scale'))
+
+        # Notes outside the recorded range, or in another tuning, are resampled from the nearest recording
+        self.pitch_shifter = PitchShifter(sample_bank, cache_bytes=64 * 2 ** 20)
+
+        # The synthesizer caches one loop per drone frequency. Drones are (voice, start count) pairs.
+        if drone_synth is None:
+            drone_synth = DroneSynth(frequency, channels, cache_size=24)
+        self.drone_synth = drone_synth
+        self.drone_first = None
+        self.drone_second = None
+        self.drone_frequencies = (None, None)
+        self.drone_fade = drone_fade
+        self.drone_smoothing = drone_smoothing
+
+        # The frequencies of the 24 drone notes that were last built ahead of time, and whether they are ready
+        self.on_drones_ready = on_drones_ready
+        self.drones_ready = threading.Event()
+        self.drone_prebuild = 0
+        self.drone_prebuild_frequencies = None
+        self.drone_prebuild_start = 0.0
+        self.drone_prebuild_time = None
+
+        self.on_playback = on_playback
+
+        self.chime_on = False
+        self.scale_on = False
+        self.last_chime_time = None
+
+        # The chime's pattern, and where it is up to: times in the pattern are seconds from chime_start
+        self.wind = wind
+        self.wind_options = {}
+        self.seed = seed
+        self.chime_pattern = None
+        self.chime_start = 0.0
+        self.chime_until = 0.0
+
+        self.guard = ResourceGuard(self, **(limits or {})).start() if long_session else None
+
+        # The log starts with the settings as they are now, and follows every change made to them
+        self.recorder = None
+        if record is not None:
+            self.recorder = EventLogWriter(record, clock=self.scheduler.clock)
+            self.recorder.snapshot(self.state)
+            self.state.listener = self.recorder.setting
+
+    def set_reverb(self, room, mix=0.3):
+        """A method to run the mix through the reverb of one of reverb.ROOMS, or play it dry if room is None.
+        Raises ValueError if there is no such room."""
+
+        reverb = None
+        if room is not None:
+            engine = self.mixer_engine
+            reverb = ConvolutionReverb.for_room(room, engine.block_frames, engine.sample_rate, engine.channels, mix,
+                                                self.metrics)
+
+        with self.mixer_engine.lock:
+            self.mixer_engine.reverb = reverb
+        self.reverb_room = room
+
+    def notify(self, kind, value):
+        """A method to report a change of what is playing to on_playback, if there is one."""
+
+        if self.on_playback is not None:
+            self.on_playback(kind, value)
+
+    def tag(self, name):
+        """A method to return the scheduler tag for one kind of event (i.e. 'chime'), prefixed with the zone, so
+        zones sharing a scheduler only ever cancel their own events."""
+
+        return name if self.zone is None else f'{self.zone}.{name}'
+
+    def entry(self):
+        """A method to look up the current scale/mode/root in the music theory table."""
+
+        return self.theory.lookup(self.state.scale, self.state.mode, self.state.root)
+
+    def apply(self):
+        """A method to bring the audio up to date with the settings that changed since the last call."""
+
+        for name in self.state.take_dirty():
+            self.apply_change(name)
+
+    def apply_change(self, name):
+        """A method to update the audio for one dirty value of the state. Values that only affect the display
+        are ignored, and notes always read their volume from the state when they are played."""
+
+        if name == 'pitch':
+            self.update_tuning()
+        elif name == 'drones':
+            self.update_drones()
+        elif name == 'drone_volumes':
+            self.update_drone_volumes()
+
+    def update_tuning(self):
+        """A method to apply the tuning of the state to the notes. Notes already derived in other tunings stay
+        cached, so switching back is free."""
+
+        self.pitch_shifter.set_tuning(self.state.tuning, self.state.root, self.state.detune)
+
+        # Derive the notes of the scale ahead of time, instead of when each is first played
+        if self.state.octave != 0 or self.state.tuning != 'equal' or self.state.detune != 0:
+            self.scheduler.cancel(self.tag('prepare'))
+            self.scheduler.schedule(0, self.prepare_notes, tag=self.tag('prepare'))
+
+        self.prebuild_drones()
+
+    def prebuild_drones(self):
+        """A method to build the loops of all 24 drone notes in the current tuning on the scheduler's workers,
+        starting from the current root, so changing the root, scale, or mode never waits for a drone.
+        Nothing is built again if the tuning leaves the drone frequencies where they were."""
+
+        frequencies = [self.drone_frequency(note) for note in range(0, len(DRONE_FREQUENCIES))]
+        if frequencies == self.drone_prebuild_frequencies:
+            return
+
+        self.drone_prebuild += 1
+        self.drone_prebuild_frequencies = frequencies
+        self.drone_prebuild_start = self.scheduler.clock()
+        self.drones_ready.clear()
+
+        # One event per drone, so chime notes can play in between
+        self.scheduler.cancel(self.tag('drones'))
+        count = len(frequencies)
+        for i in range(0, count):
+            note = (self.state.root + i) % count
+            self.scheduler.schedule(0, self.prebuild_drone, [self.drone_prebuild, frequencies[note], i == count - 1],
+                                    tag=self.tag('drones'))
+
+    def prebuild_drone(self, prebuild, frequency, last):
+        """A method to build the loop for one drone frequency. Called by the scheduler."""
+
+        if prebuild != self.drone_prebuild:
+            return
+
+        self.drone_synth.buffer(frequency)
+
+        if last:
+            self.drone_prebuild_time = self.scheduler.clock() - self.drone_prebuild_start
+            self.drones_ready.set()
+            if self.on_drones_ready is not None:
+                self.on_drones_ready(self.drone_prebuild_time)
+
+    def prepare_notes(self):
+        """A method to derive every note of the current scale in the current tuning. Called by the scheduler."""
+
+        for degree in self.entry().degrees:
+            self.pitch_shifter.samples(self.note_index(degree))
+
+    def note_index(self, degree):
+        """A method to return the sample index of a scale degree (0-12) in the current root and octave."""
+
+        return self.state.root + degree + 12 * self.state.octave
+
+    def play_note(self, note, volume, source='other'):
+        """A method to play a note, given as a sample index (which may be outside the 24 recordings) or audio
+        file path. source is where the note came from (see event_log.SOURCES). Returns the voice used, or None
+        if the note was shed."""
+
+        return self.play_samples(self.pitch_shifter.samples(note), volume, self.sample_bank.index(note), source)
+
+    def play_samples(self, samples, volume, note=None, source='other'):
+        """A method to play PCM data that is already loaded (i.e. from the key table). note is the sample index
+        the data was made from, for the event log. Returns the voice used, or None if the note was shed."""
+
+        if self.guard is not None and not self.guard.admit():
+            return None
+
+        voice = self.mixer_engine.trigger(samples, volume)
+
+        if self.recorder is not None and note is not None:
+            self.recorder.note(note, volume, source)
+
+        if self.metrics is not None:
+            self.metrics.gauge('threads', threading.active_count())
+            self.metrics.gauge('voices', self.mixer_engine.active_voices())
+
+        return voice
+
+    def play_degree(self, degree):
+        """A method to play one scale degree (0-12) at the volume of its slider."""
+
+        self.play_note(self.note_index(degree), self.state.volumes[degree] / 10)
+
+    def start_chime(self):
+        """A method to start the chime."""
+
+        if not self.chime_on:
+            self.chime_on = True
+            self.chime_pattern = ChimePattern(self.wind, self.seed, **self.wind_options)
+            self.chime_start = self.scheduler.clock()
+            self.chime_until = 0.0
+            self.schedule_chime_block()
+
+            if self.recorder is not None:
+                self.recorder.chime(True, self.wind)
+            self.notify('chime', True)
+
+    def stop_chime(self):
+        """A method to stop the chime. Notes that have not played yet are dropped."""
+
+        was_on = self.chime_on
+        if was_on and self.recorder is not None:
+            self.recorder.chime(False, self.wind)
+
+        self.chime_on = False
+        self.scheduler.cancel(self.tag('chime'))
+
+        if was_on:
+            self.notify('chime', False)
+
+    def stop(self):
+        """A method to stop the chime and the scale, and fade out every note still ringing, at once. Notes
+        already handed to the scheduler's workers are dropped too. The drones keep playing."""
+
+        self.stop_chime()
+        self.stop_scale()
+        self.mixer_engine.release_notes()
+
+    def set_wind(self, wind, seed=None, **options):
+        """A method to change the chime's wind model. A chime that is playing restarts with the new model."""
+
+        if wind not in WIND_MODELS:
+            raise ValueError(f'Unknown wind model: {wind} (expected one of {", ".join(WIND_MODELS)})')
+
+        self.wind = wind
+        self.wind_options = options
+        self.seed = seed
+
+        if self.chime_on:
+            self.stop_chime()
+            self.start_chime()
+
+    def schedule_chime_block(self):
+        """A method to queue the next few seconds of the chime, from notes of the current scale. The next block
+        is queued halfway through this one, so there are always notes waiting on the scheduler."""
+
+        if not self.chime_on:
+            return
+
+        # In a long session, notes that can no longer play on time are dropped
+        expires = self.guard.max_lateness if self.guard is not None else None
+
+        until = self.chime_until + self.CHIME_LOOKAHEAD
+        times, degrees, velocities = self.chime_pattern.take(until, self.entry().degrees)
+        for when, degree, velocity in zip(times.tolist(), degrees.tolist(), velocities.tolist()):
+            self.scheduler.schedule_at(self.chime_start + when, self.play_chime, [degree, velocity],
+                                       tag=self.tag('chime'), expires=expires)
+
+        self.chime_until = until
+        self.scheduler.schedule_at(self.chime_start + until - self.CHIME_LOOKAHEAD / 2, self.schedule_chime_block,
+                                   tag=self.tag('chime'))
+
+        # The chime may have been stopped while this block was being queued
+        if not self.chime_on:
+            self.scheduler.cancel(self.tag('chime'))
+
+    def play_chime(self, degree, velocity=1.0):
+        """A method to play one note of the chime (a la wind chimes), velocity (0-1) times as loud as its
+        slider. Called by the scheduler."""
+
+        if self.metrics is not None:
+            # The time since the previous chime note, to show when notes bunch together
+            now = time.perf_counter()
+            if self.last_chime_time is not None:
+                self.metrics.record('chime.gap', now - self.last_chime_time)
+            self.last_chime_time = now
+
+        self.play_note(self.note_index(degree), self.state.volumes[degree] / 10 * velocity, 'chime')
+
+    def play_scale(self):
+        """A method to play the current scale/mode in ascending order."""
+
+        start_time = time.perf_counter()
+
+        degrees = self.entry().degrees
+        steps = []
+        for i, degree in enumerate(degrees):
+            steps.append((degree, self.note_index(degree), self.state.volumes[degree] / 10, i == len(degrees) - 1))
+
+        # The notes are timed by the scheduler, so the caller never waits while the scale plays
+        self.scale_sequencer.play(steps, self.play_scale_step)
+        self.scale_on = True
+        self.notify('scale', True)
+
+        if self.metrics is not None:
+            self.metrics.record('play_scale', time.perf_counter() - start_time)
+
+    def set_tempo(self, tempo):
+        """A method to change the tempo of the scale (beats per minute), from the next time it is played.
+        Raises ValueError if the tempo is not above 0."""
+
+        self.scale_sequencer.set_tempo(tempo)
+
+    def play_scale_step(self, degree, note, volume, last):
+        """A method to play one note of the scale. Called by the scheduler."""
+
+        self.play_note(note, volume, 'scale')
+        self.notify('scale_step', degree)
+        if last:
+            self.scale_on = False
+            self.notify('scale', False)
+
+    def stop_scale(self):
+        """A method to stop the scale. Notes that have not played yet are dropped."""
+
+        self.scale_sequencer.stop()
+        if self.scale_on:
+            self.scale_on = False
+            self.notify('scale', False)
+
+    def update_drones(self):
+        """A method to play the drones for the root and the fifth of the current scale/mode/root. A drone that
+        moves crossfades into its new note, and a drone that stays on the same note keeps playing.
+
+        While both drone volumes are 0, nothing is built or played until one of them is raised."""
+
+        if not any(self.state.drone_volumes):
+            if self.drone_first is not None:
+                self.stop_drones()
+                self.notify('drones', ())
+            self.drone_first = None
+            self.drone_second = None
+            self.drone_frequencies = (None, None)
+            return
+
+        fifth = self.entry().fifth
+        frequencies = (self.drone_frequency(self.state.root), self.drone_frequency(self.state.root + fifth))
+
+        drones = []
+        for drone, old_frequency, frequency, level in zip((self.drone_first, self.drone_second),
+                                                          self.drone_frequencies, frequencies,
+                                                          self.state.drone_volumes):
+            if drone is not None and frequency == old_frequency and self.mixer_engine.started[drone[0]] == drone[1]:
+                drones.append(drone)
+                continue
+
+            # Loops are synthesized once per frequency and cached (most of them ahead of time)
+            drones.append(self.start_drone(frequency, level / 10))
+            if drone is not None:
+                self.mixer_engine.release(drone[0], drone[1], fade=self.drone_fade)
+
+        self.drone_first, self.drone_second = drones
+        if frequencies != self.drone_frequencies:
+            self.drone_frequencies = frequencies
+            self.notify('drones', frequencies)
+
+    def start_drone(self, frequency, volume):
+        """A method to start a drone as a looping voice on the mixer, fading in over the crossfade time.
+        Returns (voice, start count)."""
+
+        voice = self.mixer_engine.trigger(self.drone_synth.buffer(frequency), 0.0, loop=True)
+        self.mixer_engine.set_gain(voice, volume, ramp=self.drone_fade)
+        return voice, int(self.mixer_engine.started[voice])
+
+    def stop_drones(self):
+        """A method to fade out both drones over the crossfade time."""
+
+        for voice, started in (self.drone_first, self.drone_second):
+            self.mixer_engine.release(voice, started, fade=self.drone_fade)
+
+    def drone_frequency(self, note):
+        """A method to return the frequency of the drone for a note (0-23), in the current tuning."""
+
+        return DRONE_FREQUENCIES[note] * 2 ** (self.pitch_shifter.cents(note) / 1200)
+
+    def update_drone_volumes(self):
+        """A method to set the drone volumes from the state."""
+
+        if self.drone_first is None and any(self.state.drone_volumes):
+            # The drones were silent, so they have not been built yet
+            self.update_drones()
+        elif self.drone_first is not None:
+            for (voice, started), level in zip((self.drone_first, self.drone_second), self.state.drone_volumes):
+                self.mixer_engine.set_gain(voice, level / 10, ramp=self.drone_smoothing, started=started)
+
+    def advance(self, seconds):
+        """A method to move a session made with realtime=False forward on its ManualClock. Each event is run
+        when the clock reaches its deadline, and the mixer mixes the audio in between (which is thrown away)."""
+
+        clock = self.scheduler.clock
+        end = clock() + seconds
+        sample_rate = self.mixer_engine.sample_rate
+
+        while True:
+            deadline = self.scheduler.next_deadline()
+            target = end if deadline is None else min(max(deadline, clock()), end)
+
+            frames = int(round(target * sample_rate)) - int(round(clock() * sample_rate))
+            if frames > 0:
+                self.mixer_engine.render(frames)
+            clock.time = target
+            self.scheduler.run_due()
+
+            if target >= end:
+                return
+
+    def status(self):
+        """A method to summarize the settings and what is playing."""
+
+        entry = self.entry()
+        return {'zone': self.zone,
+                'root': self.state.root,
+                'scale': self.state.scale,
+                'mode': self.state.mode,
+                'octave': self.state.octave,
+                'tuning': self.state.tuning,
+                'detune': self.state.detune,
+                'label': entry.label,
+                'degrees': list(entry.degrees),
+                'volumes': list(self.state.volumes),
+                'drone_volumes': list(self.state.drone_volumes),
+                'drone_frequencies': [round(frequency, 2) for frequency in self.drone_frequencies if frequency],
+                'drones_ready': self.drones_ready.is_set(),
+                'drone_prebuild_time': self.drone_prebuild_time,
+                'chime': self.chime_on,
+                'wind': self.wind,
+                'scale_playing': self.scale_sequencer.is_playing(),
+                'scale_timing': self.scale_sequencer.stats(),
+                'scheduler': self.scheduler.stats(),
+                'mixer': self.mixer_engine.stats(),
+                'reverb': (dict(self.mixer_engine.reverb.stats(), room=self.reverb_room)
+                           if self.mixer_engine.reverb is not None else None),
+                'pitch': self.pitch_shifter.stats(),
+                'underruns': self.engine_stream.underruns,
+                'guard': self.guard.stats() if self.guard is not None else None,
+                'log': self.recorder.stats() if self.recorder is not None else None}
+
+    def close(self):
+        """A method to stop everything."""
+
+        if self.guard is not None:
+            self.guard.stop()
+        self.stop_chime()
+        self.stop_scale()
+        self.scheduler.cancel(self.tag('prepare'))
+        self.scheduler.cancel(self.tag('drones'))
+        if self.owns_scheduler:
+            self.scheduler.stop()
+        self.engine_stream.stop()
+        if self.drone_first is not None:
+            self.stop_drones()
+        if self.recorder is not None:
+            self.state.listener = None
+            self.recorder.close()
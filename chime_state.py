@@ -0,0 +1,114 @@
+#! python3
+# chime_state.py - Holds the current settings (root, scale, mode, volumes, and tuning) and keeps track of
+# which values derived from them are out of date.
+
+
+class ChimeState:
+    """Overall class to hold the user's settings and mark what needs to be recomputed when one changes."""
+
+    # The derived values that depend on each setting
+    DEPENDENCIES = {
+        'root': ('display_notes', 'pitch', 'keys', 'labels', 'drones'),
+        'scale': ('mode_range', 'degrees', 'intervals', 'display_notes', 'keys', 'labels', 'drones'),
+        'mode': ('degrees', 'intervals', 'display_notes', 'keys', 'labels', 'drones'),
+        'volumes': ('keys',),
+        'drone_volumes': ('drone_volumes',),
+        'octave': ('pitch', 'keys'),
+        'tuning': ('pitch', 'keys', 'drones'),
+        'detune': ('pitch', 'keys', 'drones'),
+    }
+
+    # The order in which derived values are recomputed, since later ones are built from earlier ones
+    ORDER = ('mode_range', 'degrees', 'intervals', 'display_notes', 'pitch', 'keys', 'labels', 'drones',
+             'drone_volumes')
+
+    def __init__(self, root=5, scale='major', mode=1, volumes=None, drone_volumes=None, octave=0, tuning='equal',
+                 detune=0.0):
+        """A method to set the initial settings. Every derived value starts out dirty.
+
+        octave moves the notes (not the drones) up or down by whole octaves, tuning is a temperament from
+        pitch_shifter.TEMPERAMENTS, and detune moves every note and drone by a number of cents."""
+
+        self.root = root
+        self.scale = scale
+        self.mode = mode
+
+        self.octave = octave
+        self.tuning = tuning
+        self.detune = detune
+
+        # Slider positions, 0-10
+        self.volumes = list(volumes) if volumes is not None else [5] * 13
+        self.drone_volumes = list(drone_volumes) if drone_volumes is not None else [0, 0]
+
+        self.dirty = set(self.ORDER)
+
+        # Called as listener(name, index, value) whenever a setting changes (i.e. by an event_log.EventLogWriter).
+        # index is the slider of a volume, and None for the other settings.
+        self.listener = None
+
+        # Number of times each derived value has been recomputed
+        self.recompute_counts = {name: 0 for name in self.ORDER}
+
+    def set(self, name, value):
+        """A method to change a setting. Returns True if the value actually changed."""
+
+        if getattr(self, name) == value:
+            return False
+
+        setattr(self, name, value)
+        self.dirty.update(self.DEPENDENCIES[name])
+        if self.listener is not None:
+            self.listener(name, None, value)
+        return True
+
+    def set_volume(self, index, value):
+        """A method to change the volume of one note (0-12)."""
+
+        if self.volumes[index] == value:
+            return False
+
+        self.volumes[index] = value
+        self.dirty.update(self.DEPENDENCIES['volumes'])
+        if self.listener is not None:
+            self.listener('volumes', index, value)
+        return True
+
+    def set_drone_volume(self, index, value):
+        """A method to change the volume of one drone (0 = root, 1 = fifth)."""
+
+        if self.drone_volumes[index] == value:
+            return False
+
+        self.drone_volumes[index] = value
+        self.dirty.update(self.DEPENDENCIES['drone_volumes'])
+        if self.listener is not None:
+            self.listener('drone_volumes', index, value)
+        return True
+
+    def is_dirty(self):
+        """A method to check whether anything needs to be recomputed."""
+
+        return bool(self.dirty)
+
+    def take_dirty(self):
+        """A method to return the dirty values in recompute order, and mark them as clean."""
+
+        pending = [name for name in self.ORDER if name in self.dirty]
+        self.dirty.clear()
+        for name in pending:
+            self.recompute_counts[name] += 1
+        return pending
+
+
+def parse_levels(text, count):
+    """A function to read a list of slider positions (0-10), separated by commas. Raises ValueError if the
+    list is the wrong length or a position is out of range."""
+
+    try:
+        levels = [int(value) for value in str(text).split(',')]
+    except ValueError:
+        levels = []
+    if len(levels) != count or not all(0 <= level <= 10 for level in levels):
+        raise ValueError(f'Expected {count} values from 0 to 10, separated by commas: {text}')
+    return levels
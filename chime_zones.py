@@ -0,0 +1,212 @@
+#! python3
+# chime_zones.py - Runs several chimes (zones, i.e. one per room) in one process, each with its own settings,
+# sharing one sample bank, one music theory table, one scheduler, and one output, with each zone routed to its
+# own channels of the output.
+
+import threading
+import numpy
+import pygame
+from drone_synth import DroneSynth
+from chime_state import ChimeState
+from chime_session import ChimeSession
+from event_scheduler import EventScheduler
+from mixer_engine import EngineStream
+
+
+class ZoneRouter:
+    """Overall class to mix the MixerEngines of several zones into the channels of one output. It is played by an
+    EngineStream the same way as a single MixerEngine."""
+
+    def __init__(self, channels=2, sample_rate=44100, block_frames=1024):
+        """A method to set up the router for an output with the given number of channels."""
+
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames
+
+        # (engine, output channels) for each zone
+        self.routes = []
+
+        self.mix = numpy.zeros((block_frames, channels), dtype=numpy.float32)
+        self.lock = threading.Lock()
+
+    def check_outputs(self, outputs):
+        """A method to check a list of output channels. Raises ValueError if one is not on the output."""
+
+        outputs = tuple(int(channel) for channel in outputs)
+        if not outputs or not all(0 <= channel < self.channels for channel in outputs):
+            raise ValueError(f'Outputs must be channels 0-{self.channels - 1} of the output: {list(outputs)}')
+        return outputs
+
+    def add(self, engine, outputs):
+        """A method to route a zone's engine to the given output channels (i.e. (2, 3) for the second stereo
+        pair). A stereo engine routed to one channel is mixed down to mono, and a stereo engine routed to more
+        than two channels has its pair repeated across them."""
+
+        outputs = self.check_outputs(outputs)
+        if engine.block_frames != self.block_frames:
+            raise ValueError('Every zone must mix the same number of frames per block as the router')
+
+        with self.lock:
+            self.routes.append((engine, outputs))
+
+    def remove(self, engine):
+        """A method to stop routing a zone's engine."""
+
+        with self.lock:
+            self.routes = [route for route in self.routes if route[0] is not engine]
+
+    def set_outputs(self, engine, outputs):
+        """A method to move a zone's engine to other output channels."""
+
+        outputs = self.check_outputs(outputs)
+        with self.lock:
+            self.routes = [(route_engine, outputs if route_engine is engine else route_outputs)
+                           for route_engine, route_outputs in self.routes]
+
+    def active_voices(self):
+        """A method to return the number of voices playing across every zone."""
+
+        with self.lock:
+            return sum(engine.active_voices() for engine, outputs in self.routes)
+
+    def is_silent(self):
+        """A method to return whether every zone is silent."""
+
+        with self.lock:
+            return all(engine.is_silent() for engine, outputs in self.routes)
+
+    def render(self, frames=None):
+        """A method to mix the next block of every zone onto its channels. Returns a float32 array of shape
+        (frames, channels), which is reused by the next call."""
+
+        if frames is None:
+            frames = self.block_frames
+        if frames > len(self.mix):
+            self.mix = numpy.zeros((frames, self.channels), dtype=numpy.float32)
+
+        out = self.mix[:frames]
+        out[:] = 0
+
+        with self.lock:
+            routes = list(self.routes)
+
+        for engine, outputs in routes:
+            # Zones with nothing playing are skipped, so a silent zone costs next to nothing
+            if engine.is_silent():
+                continue
+
+            block = engine.render(frames)
+            if len(outputs) == 1:
+                out[:, outputs[0]] += block.mean(axis=1)
+            else:
+                for i, channel in enumerate(outputs):
+                    out[:, channel] += block[:, i % block.shape[1]]
+
+        return out
+
+    def render_int16(self, frames=None):
+        """A method to mix the next block and convert it to 16-bit samples, clipping anything too loud."""
+
+        out = self.render(frames)
+        return numpy.clip(out, -32768, 32767).astype(numpy.int16)
+
+
+class ZoneEngine:
+    """Overall class to run several zones, each a ChimeSession with its own settings, chime pattern, and drones.
+
+    Every zone plays through the one output pygame.mixer was initialized with. A stereo output is shared by
+    every zone, and an output with more channels (i.e. pygame.mixer.init(channels=4)) can give each zone its own
+    stereo pair."""
+
+    def __init__(self, sample_bank, theory, voices=16, workers=2, long_session=False):
+        """A method to set up the shared scheduler, drone synthesizer, router, and stream. pygame.mixer must
+        already be initialized."""
+
+        self.sample_bank = sample_bank
+        self.theory = theory
+        self.voices = voices
+        self.long_session = long_session
+
+        frequency, size, channels = pygame.mixer.get_init()
+        self.channels = channels
+
+        self.scheduler = EventScheduler(workers=workers).start()
+
+        # Zones mix in stereo, and share one cache of drone loops
+        self.drone_synth = DroneSynth(frequency, 2, cache_size=24)
+
+        self.router = ZoneRouter(channels, frequency)
+        self.stream = EngineStream(self.router, channel_id=0).start()
+
+        # Zone name -> ChimeSession, in the order they were added
+        self.zones = {}
+        self.outputs = {}
+
+    def add_zone(self, name, state=None, outputs=(0, 1), wind='rounds', seed=None, record=None, reverb=None,
+                 reverb_mix=0.3):
+        """A method to add a zone, playing to the given output channels. record, if given, is the path of an
+        event log to record the zone to (see event_log.py), and reverb, if given, is the zone's room (see
+        reverb.py). Returns its ChimeSession."""
+
+        if name in self.zones:
+            raise ValueError(f'There is already a zone named {name}')
+        if not name or '.' in name or ' ' in name:
+            raise ValueError(f'Zone names cannot be empty or contain dots or spaces: {name!r}')
+        outputs = self.router.check_outputs(outputs)
+
+        session = ChimeSession(self.sample_bank, self.theory, state if state is not None else ChimeState(),
+                               voices=self.voices, wind=wind, seed=seed, long_session=self.long_session,
+                               zone=name, scheduler=self.scheduler, drone_synth=self.drone_synth, channels=2,
+                               routed=True, record=record, reverb=reverb, reverb_mix=reverb_mix)
+        session.apply()
+
+        self.router.add(session.mixer_engine, outputs)
+        self.zones[name] = session
+        self.outputs[name] = outputs
+        return session
+
+    def remove_zone(self, name):
+        """A method to stop a zone and remove it."""
+
+        session = self.zone(name)
+        session.close()
+        self.router.remove(session.mixer_engine)
+        del self.zones[name]
+        del self.outputs[name]
+
+    def route(self, name, outputs):
+        """A method to move a zone to other output channels."""
+
+        session = self.zone(name)
+        self.router.set_outputs(session.mixer_engine, outputs)
+        self.outputs[name] = self.router.check_outputs(outputs)
+
+    def zone(self, name):
+        """A method to return the session of a zone. Raises ValueError if there is no such zone."""
+
+        if name not in self.zones:
+            raise ValueError(f'Unknown zone: {name} (expected one of {", ".join(self.zones) or "no zones"})')
+        return self.zones[name]
+
+    def status(self):
+        """A method to summarize every zone, and the shared scheduler, drones, and sample bank."""
+
+        return {'channels': self.channels,
+                'zones': {name: {'label': session.entry().label,
+                                 'outputs': list(self.outputs[name]),
+                                 'chime': session.chime_on,
+                                 'voices': session.mixer_engine.active_voices()}
+                          for name, session in self.zones.items()},
+                'scheduler': self.scheduler.stats(),
+                'drones': self.drone_synth.stats(),
+                'samples': self.sample_bank.stats(),
+                'underruns': self.stream.underruns}
+
+    def close(self):
+        """A method to stop every zone, the stream, and the scheduler."""
+
+        for session in self.zones.values():
+            session.close()
+        self.stream.stop()
+        self.scheduler.stop()
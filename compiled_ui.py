@@ -0,0 +1,86 @@
+#! python3
+# compiled_ui.py - Loads a Qt Designer layout from Python code generated once with uic.compileUi, instead of
+# parsing the .ui XML every time the program starts.
+
+import os
+import io
+import hashlib
+import py_compile
+import importlib.util
+from PyQt5.QtCore import PYQT_VERSION_STR
+
+
+def compiled_path(ui_path, ui_bytes, cache_dir):
+    """A function to name the generated file after the layout and a fingerprint of its contents."""
+
+    digest = hashlib.sha256()
+    digest.update(ui_bytes)
+    digest.update(PYQT_VERSION_STR.encode('ascii'))
+    name = os.path.splitext(os.path.basename(ui_path))[0]
+    return os.path.join(cache_dir, f'{name}_{digest.hexdigest()[:16]}.py')
+
+
+def compile_ui(ui_bytes):
+    """A function to generate the Python code for a layout."""
+
+    # uic is slow to import, and is only needed when the layout changes
+    from PyQt5 import uic
+
+    source = io.StringIO()
+    uic.compileUi(io.StringIO(ui_bytes.decode('utf-8')), source)
+    return source.getvalue()
+
+
+def load_ui(ui_path, widget, cache_dir='ui_cache'):
+    """A function to build a layout onto a widget, the same as uic.loadUi(ui_path, widget).
+
+    The code generated for the layout is saved in cache_dir, and generated again only when the layout (or the
+    version of PyQt5) changes. Returns True if the saved code was used."""
+
+    with open(ui_path, 'rb') as f:
+        ui_bytes = f.read()
+
+    path = compiled_path(ui_path, ui_bytes, cache_dir)
+    from_cache = os.path.exists(path)
+
+    if not from_cache:
+        source = compile_ui(ui_bytes)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(source)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            # Nowhere to save the code, so run it from memory
+            namespace = {}
+            exec(compile(source, ui_path, 'exec'), namespace)
+            _setup(namespace, widget)
+            return False
+
+    # Save the bytecode too, even if Python has been told not to (i.e. PYTHONDONTWRITEBYTECODE), since compiling
+    # the generated code takes longer than running it
+    if not os.path.exists(importlib.util.cache_from_source(path)):
+        try:
+            py_compile.compile(path, doraise=True)
+        except (OSError, py_compile.PyCompileError):
+            pass
+
+    # Importing the file lets Python cache its bytecode as well
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _setup(vars(module), widget)
+
+    return from_cache
+
+
+def _setup(namespace, widget):
+    """A function to run the generated form's setupUi on the widget, and copy its child widgets onto the widget
+    as attributes, the same as uic.loadUi does."""
+
+    form_class = next(value for name, value in namespace.items() if name.startswith('Ui_') and isinstance(value, type))
+    form = form_class()
+    form.setupUi(widget)
+
+    for name, value in vars(form).items():
+        setattr(widget, name, value)
@@ -0,0 +1,141 @@
+#! python3
+# drone_synth.py - Builds the looping sine waves used for the drone notes.
+
+import math
+import threading
+from collections import OrderedDict
+import numpy
+import pygame
+
+
+# The frequency of each drone note, one for each of the 24 audio files (starting at G, 196 Hz)
+DRONE_FREQUENCIES = []
+d = 196
+for i in range(0, 24):
+    DRONE_FREQUENCIES.append(d)
+    d *= 1.059463
+
+
+class DroneSynth:
+    """Overall class to synthesize drone buffers and keep the most recently used ones in memory."""
+
+    def __init__(self, sample_rate=44100, channels=2, bits=16, duration=1.0, cache_size=24):
+        """A method to set up the synthesizer."""
+
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.bits = bits
+        self.max_sample = 2 ** (bits - 1) - 1
+
+        # Target length of one loop, in seconds. The actual length is adjusted to fit whole cycles.
+        self.duration = duration
+
+        # One entry per frequency, the least recently used entry is dropped first.
+        # Each entry holds the buffer and, once it has been played, its pygame Sound.
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    def loop_length(self, frequency):
+        """A method to find the loop length (in frames) closest to holding a whole number of cycles."""
+
+        target = int(round(self.duration * self.sample_rate))
+        n_frames = numpy.arange(target // 2, target + target // 2 + 1)
+
+        # How far each candidate length is from ending on a whole cycle
+        cycles = n_frames * frequency / self.sample_rate
+        error = numpy.abs(cycles - numpy.round(cycles))
+
+        # Prefer the candidate nearest the target length when several are equally close
+        best = numpy.lexsort((numpy.abs(n_frames - target), numpy.round(error, 9)))[0]
+
+        n_samples = int(n_frames[best])
+        n_cycles = max(1, int(round(cycles[best])))
+
+        return n_samples, n_cycles
+
+    def build(self, frequency):
+        """A method to synthesize one loop of a sine wave at the given frequency."""
+
+        n_samples, n_cycles = self.loop_length(frequency)
+
+        # The phase is computed from the whole cycle count, so the last frame runs straight into the first.
+        # This tunes the drone by a small fraction of a cent at most.
+        phase = numpy.arange(n_samples) * (2 * math.pi * n_cycles / n_samples)
+        wave = numpy.rint(self.max_sample * numpy.sin(phase)).astype(numpy.int16)
+
+        buf = numpy.repeat(wave[:, numpy.newaxis], self.channels, axis=1)
+        buf.flags.writeable = False
+
+        return buf
+
+    def _entry(self, frequency):
+        """A method to return the cache entry for a frequency, building it if needed."""
+
+        key = round(float(frequency), 6)
+
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        buf = self.build(key)
+
+        with self.lock:
+            entry = self.cache.setdefault(key, {'buffer': buf, 'sound': None})
+            self.cache.move_to_end(key)
+            self.misses += 1
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return entry
+
+    def buffer(self, frequency):
+        """A method to return the int16 buffer of shape (frames, channels) for a frequency."""
+
+        return self._entry(frequency)['buffer']
+
+    def sound(self, frequency):
+        """A method to return a pygame Sound that loops the drone for a frequency."""
+
+        entry = self._entry(frequency)
+        if entry['sound'] is None:
+            entry['sound'] = pygame.mixer.Sound(buffer=entry['buffer'])
+        return entry['sound']
+
+    def trim(self, count):
+        """A method to drop the least recently used loops until at most count are cached. Loops that are
+        playing keep going, since the caller still holds their Sounds. Returns the number dropped."""
+
+        dropped = 0
+        with self.lock:
+            while len(self.cache) > max(0, count):
+                self.cache.popitem(last=False)
+                dropped += 1
+        return dropped
+
+    def sound_count(self):
+        """A method to return the number of cached loops that have a pygame Sound."""
+
+        with self.lock:
+            return sum(entry['sound'] is not None for entry in self.cache.values())
+
+    def stats(self):
+        """A method to summarize the cache."""
+
+        with self.lock:
+            memory = 0
+            for entry in self.cache.values():
+                memory += entry['buffer'].nbytes
+                if entry['sound'] is not None:
+                    memory += entry['buffer'].nbytes
+            return {'cached': len(self.cache),
+                    'cache_size': self.cache_size,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'memory_bytes': memory}
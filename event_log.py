@@ -0,0 +1,425 @@
+#! python3
+# event_log.py - Records what a session played (every note, and every change of the settings) to a compact,
+# append-only binary log, and plays a log back, either live through a ChimeSession or offline into a mix.
+
+"""
+
+    A log is a 20 byte header followed by 16 byte records, each
+        time (float64)      seconds since the log was started
+        kind (uint8)        what happened (see KINDS)
+        arg (uint8)         the source of a note (see SOURCES), or the slider of a volume
+        value (int16)       the note, or the new value of a setting
+        level (float32)     the gain of a note, or the detune in cents
+
+    Text (the scale, tuning, and wind names) is written once, as a name record followed by the UTF-8 text padded
+    to whole records, and referred to by number after that. The log starts with a snapshot of every setting, so
+    it can be played back from nothing, and ends with an end record when the session is closed. A log cut short
+    (i.e. by a crash) can still be read up to its last whole record.
+
+"""
+
+import time
+import struct
+import threading
+from collections import namedtuple
+
+
+MAGIC = b'UKCHLOG\x00'
+VERSION = 1
+
+HEADER = struct.Struct('<8sHHd')
+RECORD = struct.Struct('<dBBhf')
+
+# Record kinds. Kinds a reader doesn't know (i.e. from a newer version) are skipped.
+KINDS = {
+    'name': 0,
+    'note': 1,
+    'release': 2,
+    'root': 3,
+    'scale': 4,
+    'mode': 5,
+    'octave': 6,
+    'tuning': 7,
+    'detune': 8,
+    'volume': 9,
+    'drone': 10,
+    'chime': 11,
+    'end': 12,
+}
+KIND_NAMES = {code: kind for kind, code in KINDS.items()}
+
+# Where a note came from
+SOURCES = ('other', 'key', 'chime', 'scale')
+
+# The settings of a ChimeState, by kind
+SETTINGS = ('root', 'scale', 'mode', 'octave', 'tuning', 'detune', 'volume', 'drone')
+
+# Kinds whose value is text, stored as the number of a name record
+NAMED = ('scale', 'tuning', 'chime')
+
+# The kinds of the settings ChimeState names after its lists
+STATE_KINDS = {'volumes': 'volume', 'drone_volumes': 'drone'}
+
+# Settings changed less than this many seconds apart (i.e. the scale, then the mode going back to 1) are
+# played back together, so the session never looks up a scale with a mode it doesn't have
+SETTLE = 0.01
+
+LogEvent = namedtuple('LogEvent', 'time kind arg value level')
+
+
+class EventLogWriter:
+    """Overall class to append the events of a session to a log file. Records are written through a buffer, so
+    a session only ever holds the last few seconds of its log in memory."""
+
+    def __init__(self, path, clock=time.monotonic, buffer_size=64 * 2 ** 10, flush_interval=5.0):
+        """A method to create the log file and write its header. Times are measured on clock, from now.
+
+        The buffer is written to disk when it fills, and at least every flush_interval seconds while events
+        are being recorded, so a crash loses no more than that."""
+
+        self.path = path
+        self.clock = clock
+        self.flush_interval = flush_interval
+
+        self.file = open(path, 'wb', buffering=buffer_size)
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, time.time()))
+
+        self.start = clock()
+        self.last_flush = self.start
+
+        # Text -> its number in the log
+        self.names = {}
+
+        # Events come from the GUI thread and the scheduler's workers
+        self.lock = threading.Lock()
+
+        # Counters
+        self.count = 0
+        self.bytes_written = HEADER.size
+
+    def _name(self, text):
+        """A method to return the number of a piece of text, writing it to the log the first time it is used."""
+
+        number = self.names.get(text)
+        if number is None:
+            number = len(self.names)
+            self.names[text] = number
+
+            data = str(text).encode('utf-8')[:255]
+            padding = -len(data) % RECORD.size
+            self.file.write(RECORD.pack(0.0, KINDS['name'], len(data), number, 0.0) + data + b'\x00' * padding)
+            self.bytes_written += RECORD.size + len(data) + padding
+        return number
+
+    def _write(self, kind, arg=0, value=0, level=0.0, when=None):
+        """A method to append one record. The lock must be held."""
+
+        now = self.clock()
+        if when is None:
+            when = now - self.start
+
+        self.file.write(RECORD.pack(when, KINDS[kind], arg, value, level))
+        self.count += 1
+        self.bytes_written += RECORD.size
+
+        if now - self.last_flush >= self.flush_interval:
+            self.file.flush()
+            self.last_flush = now
+
+    def note(self, note, gain, source='other'):
+        """A method to record a note being played, as a sample index, its gain, and where it came from."""
+
+        with self.lock:
+            if self.file is not None:
+                self._write('note', SOURCES.index(source), note, gain)
+
+    def release(self, note):
+        """A method to record a held note (i.e. a key that was let go) being faded out."""
+
+        with self.lock:
+            if self.file is not None:
+                self._write('release', SOURCES.index('key'), note)
+
+    def chime(self, on, wind=''):
+        """A method to record the chime being started (with its wind model) or stopped."""
+
+        with self.lock:
+            if self.file is not None:
+                self._write('chime', int(bool(on)), self._name(wind))
+
+    def setting(self, name, index, value, when=None):
+        """A method to record a change of a setting. Takes the same arguments as a ChimeState listener, so it
+        can be set as one: name is the setting (i.e. 'root' or 'volumes'), and index the slider of a volume."""
+
+        kind = STATE_KINDS.get(name, name)
+        with self.lock:
+            if self.file is None:
+                return
+            if kind == 'detune':
+                self._write(kind, 0, 0, value, when)
+            elif kind in NAMED:
+                self._write(kind, 0, self._name(value), 0.0, when)
+            else:
+                self._write(kind, index or 0, int(value), 0.0, when)
+
+    def snapshot(self, state):
+        """A method to record every setting of a ChimeState, at the time the log started."""
+
+        for name in ('root', 'scale', 'mode', 'octave', 'tuning', 'detune'):
+            self.setting(name, None, getattr(state, name), when=0.0)
+        for i, level in enumerate(state.volumes):
+            self.setting('volumes', i, level, when=0.0)
+        for i, level in enumerate(state.drone_volumes):
+            self.setting('drone_volumes', i, level, when=0.0)
+
+    def flush(self):
+        """A method to write everything buffered to disk."""
+
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+                self.last_flush = self.clock()
+
+    def close(self):
+        """A method to write the end of the log and close the file."""
+
+        with self.lock:
+            if self.file is not None:
+                self._write('end')
+                self.file.close()
+                self.file = None
+
+    def stats(self):
+        """A method to summarize the log so far."""
+
+        return {'path': self.path,
+                'events': self.count,
+                'bytes': self.bytes_written,
+                'seconds': round(self.clock() - self.start, 3)}
+
+
+def read_header(f):
+    """A function to read the header of a log from an open file. Returns the version and the wall clock time
+    the log was started. Raises ValueError if the file is not a log this version can read."""
+
+    data = f.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise ValueError('Not an event log: the file is too short')
+
+    magic, version, record_size, started = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError('Not an event log')
+    if version > VERSION or record_size != RECORD.size:
+        raise ValueError(f'Unsupported event log version: {version}')
+    return {'version': version, 'started': started}
+
+
+def read_events(path, chunk_records=4096):
+    """A function to read a log, a chunk at a time, as LogEvents in the order they were recorded.
+
+    Notes have the source as arg, the sample index as value, and the gain as level. Settings have the new value
+    as value (the text, for the scale and tuning), except the detune, which is the level. Volumes and drones
+    have the slider as arg. The chime has 1 or 0 as arg, and the wind model as value."""
+
+    with open(path, 'rb') as f:
+        read_header(f)
+
+        names = {}
+        # [number, length, text so far] while the text of a name record is being read
+        text = None
+
+        while True:
+            data = f.read(RECORD.size * chunk_records)
+            if not data:
+                break
+
+            # A log cut short ends at its last whole record
+            data = data[:len(data) - len(data) % RECORD.size]
+
+            for offset in range(0, len(data), RECORD.size):
+                if text is not None:
+                    text[2] += data[offset:offset + RECORD.size]
+                    if len(text[2]) >= text[1]:
+                        names[text[0]] = bytes(text[2][:text[1]]).decode('utf-8', 'replace')
+                        text = None
+                    continue
+
+                when, code, arg, value, level = RECORD.unpack_from(data, offset)
+                kind = KIND_NAMES.get(code)
+
+                if kind == 'name':
+                    names[value] = ''
+                    if arg > 0:
+                        text = [value, arg, bytearray()]
+                    continue
+                if kind is None:
+                    continue
+
+                if kind in NAMED:
+                    value = names.get(value, '')
+                elif kind in ('note', 'release'):
+                    arg = SOURCES[arg] if arg < len(SOURCES) else 'other'
+                elif kind == 'detune':
+                    # Stored as a float32, so 12.3 cents comes back as 12.300000190734863
+                    level = round(level, 4)
+
+                yield LogEvent(when, kind, arg, value, level)
+
+
+def group_events(events, settle=SETTLE):
+    """A function to group LogEvents that should be played back together. Every note is a group of its own, and
+    settings changed within settle seconds of each other are one group. Yields lists of LogEvents."""
+
+    group = []
+    for event in events:
+        if group and (event.kind in ('note', 'release') or group[0].kind in ('note', 'release')
+                      or event.time - group[-1].time >= settle):
+            yield group
+            group = []
+        group.append(event)
+    if group:
+        yield group
+
+
+def apply_event(state, event):
+    """A function to apply a setting from a LogEvent to a ChimeState. Returns True if it changed anything
+    (notes, the chime, and the end of the log never do)."""
+
+    if event.kind == 'volume':
+        return state.set_volume(event.arg, event.value)
+    if event.kind == 'drone':
+        return state.set_drone_volume(event.arg, event.value)
+    if event.kind == 'detune':
+        return state.set('detune', event.level)
+    if event.kind in SETTINGS:
+        return state.set(event.kind, event.value)
+    return False
+
+
+def summarize(path):
+    """A function to count the events of a log by kind (and the notes by source), and measure its length."""
+
+    with open(path, 'rb') as f:
+        header = read_header(f)
+
+    kinds = {}
+    sources = {}
+    seconds = 0.0
+    ended = False
+    for event in read_events(path):
+        kinds[event.kind] = kinds.get(event.kind, 0) + 1
+        if event.kind == 'note':
+            sources[event.arg] = sources.get(event.arg, 0) + 1
+        seconds = max(seconds, event.time)
+        ended = ended or event.kind == 'end'
+
+    return {'started': header['started'],
+            'seconds': seconds,
+            'events': sum(kinds.values()),
+            'kinds': kinds,
+            'notes': sources,
+            'complete': ended}
+
+
+class LogPlayer:
+    """Overall class to play a log back live, through a ChimeSession, as it is read from disk. Events are queued
+    on the session's scheduler a few seconds ahead, the same as the chime."""
+
+    # Seconds of the log queued on the scheduler at a time
+    LOOKAHEAD = 2.0
+
+    def __init__(self, path, session, speed=1.0):
+        """A method to set up the player. speed plays the log faster (i.e. 2) or slower (i.e. 0.5) than it was
+        recorded. The session should not be recording, or it will record the log again."""
+
+        if speed <= 0:
+            raise ValueError('The speed must be greater than 0')
+
+        self.path = path
+        self.session = session
+        self.speed = speed
+        self.tag = session.tag('replay')
+
+        self.groups = None
+        self.waiting = None
+        self.start_time = 0.0
+        self.until = 0.0
+        self.finished = False
+
+        # Sample index -> (voice, start count) of each key held down, for keys that were let go
+        self.held = {}
+
+        # Counters
+        self.played = 0
+
+    def start(self):
+        """A method to start playing from the beginning of the log."""
+
+        self.stop()
+        self.groups = group_events(read_events(self.path))
+        self.waiting = None
+        self.held = {}
+        self.start_time = self.session.scheduler.clock()
+        self.until = 0.0
+        self.finished = False
+        self.schedule_block()
+        return self
+
+    def stop(self):
+        """A method to stop playing. Events that have not played yet are dropped."""
+
+        self.finished = True
+        self.session.scheduler.cancel(self.tag)
+
+    def is_playing(self):
+        """A method to check whether any of the log is still to play."""
+
+        return not self.finished or self.session.scheduler.pending(self.tag) > 0
+
+    def schedule_block(self):
+        """A method to queue the next few seconds of the log. The next block is queued halfway through this
+        one. Called by the scheduler."""
+
+        if self.finished:
+            return
+
+        scheduler = self.session.scheduler
+        until = self.until + self.LOOKAHEAD * self.speed
+
+        while True:
+            group = self.waiting if self.waiting is not None else next(self.groups, None)
+            self.waiting = None
+            if group is None:
+                self.finished = True
+                return
+            if group[0].time >= until:
+                self.waiting = group
+                break
+            scheduler.schedule_at(self.start_time + group[0].time / self.speed, self.play, [group], tag=self.tag)
+
+        self.until = until
+        scheduler.schedule_at(self.start_time + until / self.speed - self.LOOKAHEAD / 2, self.schedule_block,
+                              tag=self.tag)
+
+    def play(self, group):
+        """A method to play one group of events. Called by the scheduler."""
+
+        session = self.session
+        changed = False
+
+        for event in group:
+            if event.kind == 'note':
+                voice = session.play_note(event.value, event.level)
+                if event.arg == 'key' and voice is not None:
+                    self.held[event.value] = (voice, int(session.mixer_engine.started[voice]))
+            elif event.kind == 'release':
+                held = self.held.pop(event.value, None)
+                if held is not None:
+                    session.mixer_engine.release(*held)
+            else:
+                # The chime's notes are in the log, so starting and stopping it changes nothing here
+                changed = apply_event(session.state, event) or changed
+
+        if changed:
+            session.apply()
+        self.played += len(group)
@@ -0,0 +1,252 @@
+#! python3
+# event_scheduler.py - Runs timed events (i.e. chime notes) from a single thread, in deadline order,
+# instead of starting a sleeping thread for every note.
+
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ManualClock:
+    """Overall class for a clock that only moves when it is told to, so a session can be run faster than real
+    time (i.e. with EventScheduler.run_due instead of the scheduling thread)."""
+
+    def __init__(self, start=0.0):
+        """A method to set the clock's starting time, in seconds."""
+
+        self.time = start
+
+    def __call__(self):
+        """A method to return the current time, so the clock can be used in place of time.monotonic."""
+
+        return self.time
+
+    def advance(self, seconds):
+        """A method to move the clock forward."""
+
+        self.time += seconds
+        return self.time
+
+
+class EventScheduler:
+    """Overall class to hold upcoming events in a priority queue and fire each one at its deadline."""
+
+    def __init__(self, workers=2, clock=time.monotonic, metrics=None, max_queued=None):
+        """A method to set up the queue, the scheduling thread, and the pool of workers that run the events.
+
+        metrics, if given, is a PlaybackMetrics that records the lateness of every event by its tag.
+        max_queued, if given, is the most events that may wait in the queue. Events that are allowed to expire
+        are dropped (shed) instead of being queued past it; other events are always queued."""
+
+        self.clock = clock
+        self.metrics = metrics
+        self.max_queued = max_queued
+
+        # Heap of [deadline, sequence, tag, fcn, args, expires]. The sequence keeps events with equal deadlines
+        # in order.
+        self.queue = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+
+        # Tag -> the sequence number at its last cancel. Events from before it that were already handed to a
+        # worker are dropped too, so a cancel takes effect at once.
+        self.cancel_marks = {}
+
+        # Events are run by a fixed number of workers, so a slow event never delays the next deadline
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='event_worker',
+                                           initializer=self._add_worker)
+        self.worker_threads = []
+
+        self.running = False
+        self.thread = None
+
+        # Counters
+        self.scheduled = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.shed = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.lateness_total = 0.0
+        self.lateness_max = 0.0
+
+    def start(self):
+        """A method to start the scheduling thread."""
+
+        with self.condition:
+            if self.running:
+                return self
+            self.running = True
+
+        self.thread = threading.Thread(target=self._run, name='event_scheduler', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """A method to stop the scheduling thread and drop every queued event."""
+
+        with self.condition:
+            self.running = False
+            self.cancelled += len(self.queue)
+            self.queue.clear()
+            self.condition.notify()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.executor.shutdown(wait=False)
+
+    def threads(self):
+        """A method to return the scheduler's own threads that are alive: the scheduling thread and the workers
+        started so far."""
+
+        threads = [self.thread] if self.thread is not None else []
+        return [thread for thread in threads + self.worker_threads if thread.is_alive()]
+
+    def _add_worker(self):
+        """A method to note each worker thread as the pool starts it."""
+
+        self.worker_threads.append(threading.current_thread())
+
+    def schedule(self, delay, fcn, args=(), tag=None, expires=None):
+        """A method to run fcn(*args) after the given number of seconds."""
+
+        return self.schedule_at(self.clock() + delay, fcn, args, tag, expires)
+
+    def schedule_at(self, deadline, fcn, args=(), tag=None, expires=None):
+        """A method to run fcn(*args) at the given time on the scheduler's clock.
+
+        expires, if given, is how many seconds late the event may run. Any later, and it is dropped (i.e. a
+        chime note that can no longer play on time). Returns None if the event was dropped straight away."""
+
+        with self.condition:
+            if expires is not None and self.max_queued is not None and len(self.queue) >= self.max_queued:
+                self.shed += 1
+                return None
+
+            event = [deadline, next(self.sequence), tag, fcn, tuple(args), expires]
+            heapq.heappush(self.queue, event)
+            self.scheduled += 1
+
+            # Only wake the scheduling thread if the new event is now the next one due
+            if self.queue[0] is event:
+                self.condition.notify()
+
+        return event[1]
+
+    def cancel(self, tag):
+        """A method to drop every queued event with the given tag. Returns the number of events dropped."""
+
+        with self.condition:
+            self.cancel_marks[tag] = next(self.sequence)
+            kept = [event for event in self.queue if event[2] != tag]
+            dropped = len(self.queue) - len(kept)
+            if dropped:
+                heapq.heapify(kept)
+                self.queue = kept
+                self.cancelled += dropped
+                self.condition.notify()
+
+        return dropped
+
+    def pending(self, tag=None):
+        """A method to return the number of queued events, optionally only those with the given tag."""
+
+        with self.condition:
+            if tag is None:
+                return len(self.queue)
+            return sum(1 for event in self.queue if event[2] == tag)
+
+    def next_deadline(self):
+        """A method to return the deadline of the next queued event, or None if the queue is empty."""
+
+        with self.condition:
+            return self.queue[0][0] if self.queue else None
+
+    def stats(self):
+        """A method to summarize the scheduler's counters. Lateness is in seconds."""
+
+        with self.condition:
+            return {'queued': len(self.queue),
+                    'in_flight': self.in_flight,
+                    'scheduled': self.scheduled,
+                    'fired': self.fired,
+                    'cancelled': self.cancelled,
+                    'shed': self.shed,
+                    'errors': self.errors,
+                    'workers': self.workers,
+                    'lateness_mean': self.lateness_total / self.fired if self.fired else 0.0,
+                    'lateness_max': self.lateness_max}
+
+    def _run(self):
+        """A method to sleep until the next deadline, then hand the event to a worker."""
+
+        with self.condition:
+            while self.running:
+                if not self.queue:
+                    self.condition.wait()
+                    continue
+
+                wait_time = self.queue[0][0] - self.clock()
+                if wait_time > 0:
+                    self.condition.wait(wait_time)
+                    continue
+
+                deadline, sequence, tag, fcn, args, expires = heapq.heappop(self.queue)
+                self.in_flight += 1
+                self.executor.submit(self._fire, deadline, tag, fcn, args, expires, sequence)
+
+    def run_due(self):
+        """A method to run every event that is due, in deadline order, on the calling thread instead of the
+        workers. Used in place of start() with a ManualClock. Returns the number of events run."""
+
+        count = 0
+        while True:
+            with self.condition:
+                if not self.queue or self.queue[0][0] > self.clock():
+                    return count
+                deadline, sequence, tag, fcn, args, expires = heapq.heappop(self.queue)
+                self.in_flight += 1
+
+            self._fire(deadline, tag, fcn, args, expires, sequence)
+            count += 1
+
+    def _fire(self, deadline, tag, fcn, args, expires=None, sequence=None):
+        """A method to run one event on a worker, and record how late it was."""
+
+        # Cancelled while it waited for a worker
+        with self.condition:
+            if sequence is not None and sequence < self.cancel_marks.get(tag, -1):
+                self.in_flight -= 1
+                self.cancelled += 1
+                return
+
+        lateness = max(0.0, self.clock() - deadline)
+
+        # Events that waited too long for a worker are dropped, so a backlog clears instead of playing late
+        if expires is not None and lateness > expires:
+            with self.condition:
+                self.in_flight -= 1
+                self.shed += 1
+            return
+
+        if self.metrics is not None:
+            self.metrics.record(f'lateness.{tag}', lateness)
+
+        with self.condition:
+            self.fired += 1
+            self.lateness_total += lateness
+            self.lateness_max = max(self.lateness_max, lateness)
+
+        try:
+            fcn(*args)
+        except Exception:
+            with self.condition:
+                self.errors += 1
+            raise
+        finally:
+            with self.condition:
+                self.in_flight -= 1
@@ -0,0 +1,228 @@
+#! python3
+# key_bindings.py - Maps the keyboard to the notes of the current scale through a table that is rebuilt only when
+# the scale, mode, root, tuning, or volumes change, so a key press goes straight to a note that is ready to play.
+
+"""
+
+    The bindings can be changed with a json file (key_bindings.json, next to the program), e.g.
+
+        {
+            "keys": {"Q": "note 1", "W": "note 2", "Backspace": null},
+            "repeat": "retrigger",
+            "release": "damp"
+        }
+
+    Keys are named the same as Qt's key codes without the "Key_" (i.e. 1, A, Minus, Backspace, F12). A key may be
+    bound to "note <n>" (the nth note of the current mode, starting at 1), "stop", or "metrics", or to null to
+    unbind it. Keys left out of the file keep their default binding.
+
+    repeat  - ignore: holding a key plays its note once (default). retrigger: the note plays again with every repeat.
+    release - ring: notes ring out after the key is let go (default). damp: letting go of a key fades its note out.
+
+"""
+
+import os
+import json
+import threading
+from PyQt5.QtCore import Qt
+
+
+# Keys 1-8 play the notes of most scales, and 9, 0, -, =, and BACKSPACE the rest
+DEFAULT_BINDINGS = {
+    '1': 'note 1',
+    '2': 'note 2',
+    '3': 'note 3',
+    '4': 'note 4',
+    '5': 'note 5',
+    '6': 'note 6',
+    '7': 'note 7',
+    '8': 'note 8',
+    '9': 'note 9',
+    '0': 'note 10',
+    'Minus': 'note 11',
+    'Equal': 'note 12',
+    'Backspace': 'note 13',
+    'Delete': 'stop',
+    'F12': 'metrics',
+}
+
+REPEAT_MODES = ('ignore', 'retrigger')
+RELEASE_MODES = ('ring', 'damp')
+
+# Actions other than playing a note, handled by whatever registers them with KeyDispatcher.on
+COMMANDS = ('stop', 'metrics')
+
+
+def key_code(name):
+    """A function to return the Qt key code for a key name (i.e. 1, Minus, F12)."""
+
+    code = getattr(Qt, 'Key_' + str(name), None)
+    if code is None:
+        raise ValueError(f'Unknown key: {name}')
+    return int(code)
+
+
+def parse_action(text):
+    """A function to read an action (i.e. "note 3" or "stop"). Notes are returned as ('note', index), where index
+    starts at 0, and commands as (name,)."""
+
+    words = str(text).split()
+    if len(words) == 2 and words[0] == 'note' and words[1].isdigit() and 1 <= int(words[1]) <= 13:
+        return ('note', int(words[1]) - 1)
+    if len(words) == 1 and words[0] in COMMANDS:
+        return (words[0],)
+    raise ValueError(f'Unknown key action: {text} (expected "note 1" - "note 13", {", ".join(COMMANDS)})')
+
+
+def load_bindings(path='key_bindings.json'):
+    """A function to read the key bindings and the repeat and release modes. Returns (bindings, repeat, release),
+    where bindings maps Qt key codes to actions. The defaults are used where the file does not exist or leaves a
+    setting out. Raises ValueError if the file has an unknown key, action, or mode."""
+
+    names = dict(DEFAULT_BINDINGS)
+    repeat = 'ignore'
+    release = 'ring'
+
+    if path is not None and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        names.update(config.get('keys', {}))
+        repeat = config.get('repeat', repeat)
+        release = config.get('release', release)
+
+    if repeat not in REPEAT_MODES:
+        raise ValueError(f'Unknown repeat mode: {repeat} (expected one of {", ".join(REPEAT_MODES)})')
+    if release not in RELEASE_MODES:
+        raise ValueError(f'Unknown release mode: {release} (expected one of {", ".join(RELEASE_MODES)})')
+
+    bindings = {}
+    for name, action in names.items():
+        if action is not None:
+            bindings[key_code(name)] = parse_action(action)
+
+    return bindings, repeat, release
+
+
+class KeyDispatcher:
+    """Overall class to play notes from the keyboard through a ChimeSession, from a table of (samples, gain) for
+    each bound key."""
+
+    def __init__(self, session, bindings=None, repeat='ignore', release='ring'):
+        """A method to set up the dispatcher. bindings maps Qt key codes to actions (see load_bindings), and
+        defaults to DEFAULT_BINDINGS. The table is empty until rebuild() is called."""
+
+        if bindings is None:
+            bindings = {key_code(name): parse_action(action) for name, action in DEFAULT_BINDINGS.items()}
+        if repeat not in REPEAT_MODES:
+            raise ValueError(f'Unknown repeat mode: {repeat} (expected one of {", ".join(REPEAT_MODES)})')
+        if release not in RELEASE_MODES:
+            raise ValueError(f'Unknown release mode: {release} (expected one of {", ".join(RELEASE_MODES)})')
+
+        self.session = session
+        self.bindings = bindings
+        self.repeat = repeat
+        self.release_mode = release
+
+        # Qt key code -> [note, gain, samples]. The samples are filled in on the scheduler, so the table can be
+        # rebuilt on the GUI thread without waiting for a note to load or be derived.
+        self.table = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+        # Qt key code -> (voice, the voice's start count, note) of each note held down, for the damp release mode
+        self.held = {}
+
+        self.commands = {}
+
+        # Counters
+        self.builds = 0
+        self.presses = 0
+
+    def on(self, command, fcn):
+        """A method to call fcn() when a key bound to a command (i.e. "stop") is pressed."""
+
+        self.commands[command] = fcn
+
+    def rebuild(self):
+        """A method to rebuild the table for the current scale, mode, root, octave, tuning, and volumes."""
+
+        session = self.session
+        degrees = session.entry().degrees
+
+        table = {}
+        for key, action in self.bindings.items():
+            if action[0] == 'note' and action[1] < len(degrees):
+                degree = degrees[action[1]]
+                table[key] = [session.note_index(degree), session.state.volumes[degree] / 10, None]
+
+        with self.lock:
+            self.table = table
+            self.generation += 1
+            generation = self.generation
+        self.builds += 1
+
+        session.scheduler.cancel(session.tag('keys'))
+        session.scheduler.schedule(0, self.prepare, [generation], tag=session.tag('keys'))
+
+    def prepare(self, generation):
+        """A method to load or derive the samples of every note in the table. Called by the scheduler."""
+
+        with self.lock:
+            if generation != self.generation:
+                return
+            entries = list(self.table.values())
+
+        for entry in entries:
+            if entry[2] is None:
+                entry[2] = self.session.pitch_shifter.samples(entry[0])
+
+    def press(self, key, auto_repeat=False):
+        """A method to respond to a key being pressed. Returns the key's action, or None if it is not bound."""
+
+        entry = self.table.get(key)
+        if entry is not None:
+            if auto_repeat and self.repeat == 'ignore':
+                return self.bindings[key]
+
+            note, gain, samples = entry
+            if samples is None:
+                # Pressed before the table was prepared
+                samples = self.session.pitch_shifter.samples(note)
+
+            voice = self.session.play_samples(samples, gain, note, 'key')
+            if self.release_mode == 'damp':
+                # A repeat takes over from the note it repeats
+                self.release(key)
+                if voice is not None:
+                    self.held[key] = (voice, int(self.session.mixer_engine.started[voice]), note)
+            self.presses += 1
+            return self.bindings[key]
+
+        action = self.bindings.get(key)
+        if action is not None and action[0] != 'note' and not auto_repeat:
+            fcn = self.commands.get(action[0])
+            if fcn is not None:
+                fcn()
+        return action
+
+    def release(self, key, auto_repeat=False):
+        """A method to respond to a key being let go. In the damp release mode, the key's note fades out, unless
+        its voice has already been taken by another note."""
+
+        if auto_repeat:
+            return
+        held = self.held.pop(key, None)
+        if held is not None:
+            self.session.mixer_engine.release(held[0], held[1])
+            if self.session.recorder is not None:
+                self.session.recorder.release(held[2])
+
+    def stats(self):
+        """A method to summarize the table and the modes."""
+
+        return {'bound': len(self.table),
+                'prepared': sum(entry[2] is not None for entry in self.table.values()),
+                'repeat': self.repeat,
+                'release': self.release_mode,
+                'builds': self.builds,
+                'presses': self.presses}
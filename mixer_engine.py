@@ -0,0 +1,413 @@
+#! python3
+# mixer_engine.py - Mixes the notes into a single stream from a fixed pool of voices, instead of leaving
+# pygame to find a free channel for every note.
+
+import time
+import threading
+import numpy
+import pygame
+
+
+class MixerEngine:
+    """Overall class to mix notes with numpy, from a fixed pool of preallocated voices."""
+
+    def __init__(self, voices=16, sample_rate=44100, channels=2, block_frames=1024, release=0.05, steal='oldest',
+                 metrics=None):
+        """A method to preallocate the voices and the mix buffer.
+
+        release is the length, in seconds, of the fade used when a voice is released or stolen.
+        steal is either 'oldest' or 'quietest', and picks the voice that is reused when every voice is busy.
+        metrics, if given, is a PlaybackMetrics that records how long each note waits to be mixed."""
+
+        if steal not in ('oldest', 'quietest'):
+            raise ValueError(f'Unknown voice stealing policy: {steal}')
+
+        self.voices = voices
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_frames = block_frames
+        self.release_frames = max(1, int(release * sample_rate))
+        self.steal = steal
+
+        # Per-voice state. A voice with a negative position starts that many frames into the next block.
+        self.samples = [None] * voices
+        self.active = numpy.zeros(voices, dtype=bool)
+        self.position = numpy.zeros(voices, dtype=numpy.int64)
+        self.gain = numpy.zeros(voices, dtype=numpy.float32)
+        self.envelope = numpy.ones(voices, dtype=numpy.float32)
+        self.releasing = numpy.zeros(voices, dtype=bool)
+
+        # A voice whose gain is gliding to a new level moves gain_step closer to target_gain every frame, and
+        # each voice fades out by its own release_step per frame once it is released
+        self.target_gain = numpy.zeros(voices, dtype=numpy.float32)
+        self.gain_step = numpy.zeros(voices, dtype=numpy.float32)
+        self.release_step = numpy.full(voices, 1.0 / self.release_frames, dtype=numpy.float32)
+        self.looping = numpy.zeros(voices, dtype=bool)
+        self.started = numpy.zeros(voices, dtype=numpy.int64)
+        self.trigger_time = [0.0] * voices
+        self.trigger_count = 0
+
+        self.metrics = metrics
+
+        # A ConvolutionReverb (see reverb.py) run over every mixed block, or None for the dry sound
+        self.reverb = None
+
+        # Preallocated buffers: the mix, the release ramp, and the fading tail of voices that were stolen
+        self.mix = numpy.zeros((block_frames, channels), dtype=numpy.float32)
+        self.ramp = numpy.arange(block_frames, dtype=numpy.float32)
+        self.tail = numpy.zeros((self.release_frames, channels), dtype=numpy.float32)
+
+        # Counters
+        self.stolen = 0
+        self.blocks = 0
+        self.frames_rendered = 0
+        self.render_time = 0.0
+        self.peak_voices = 0
+
+        self.lock = threading.Lock()
+
+    def trigger(self, samples, gain=1.0, delay=0, loop=False):
+        """A method to start playing samples (shape (frames, channels)) on a voice. Returns the voice used.
+
+        delay is a number of frames into the next block, for notes that need to start on an exact frame.
+        With loop=True the samples repeat until the voice is released (i.e. a drone), and the voice is not
+        stolen for another note until then."""
+
+        with self.lock:
+            # The first free voice (argmin finds the first False), unless every voice is busy
+            voice = int(self.active.argmin())
+            if self.active[voice]:
+                voice = self._steal()
+
+            self.samples[voice] = samples
+            self.active[voice] = True
+            self.looping[voice] = loop
+            self.position[voice] = 0 if loop else -int(delay)
+            self.gain[voice] = gain
+            self.target_gain[voice] = gain
+            self.gain_step[voice] = 0.0
+            self.envelope[voice] = 1.0
+            self.releasing[voice] = False
+            self.release_step[voice] = 1.0 / self.release_frames
+            self.trigger_count += 1
+            self.started[voice] = self.trigger_count
+            if self.metrics is not None:
+                self.trigger_time[voice] = time.perf_counter()
+
+            self.peak_voices = max(self.peak_voices, int(numpy.count_nonzero(self.active)))
+
+        return voice
+
+    def release(self, voice, started=None, fade=None):
+        """A method to fade a voice out over the release time, or over fade seconds if given (i.e. to crossfade
+        one drone into the next).
+
+        started, if given, is the voice's entry in self.started when its note was triggered, so a voice that
+        has since been taken by another note is left alone."""
+
+        with self.lock:
+            if self.active[voice] and (started is None or self.started[voice] == started):
+                self.releasing[voice] = True
+                if fade is not None:
+                    self.release_step[voice] = 1.0 / max(1, int(fade * self.sample_rate))
+
+    def release_notes(self):
+        """A method to fade out every note over the release time. Looping voices (the drones) keep playing."""
+
+        with self.lock:
+            self.releasing[self.active & ~self.looping] = True
+
+    def set_gain(self, voice, gain, ramp=0.0, started=None):
+        """A method to change the gain of a voice that is playing. With ramp (in seconds), the gain glides to
+        the new level instead of jumping, so a volume slider being dragged doesn't click. started is the same
+        as for release()."""
+
+        with self.lock:
+            if started is not None and self.started[voice] != started:
+                return
+            frames = int(ramp * self.sample_rate)
+            self.target_gain[voice] = gain
+            if frames > 0 and gain != self.gain[voice]:
+                self.gain_step[voice] = (gain - self.gain[voice]) / frames
+            else:
+                self.gain[voice] = gain
+                self.gain_step[voice] = 0.0
+
+    def stop_all(self):
+        """A method to silence every voice at once."""
+
+        with self.lock:
+            self.active[:] = False
+            self.looping[:] = False
+            self.tail[:] = 0
+            for voice in range(0, self.voices):
+                self.samples[voice] = None
+
+    def active_voices(self):
+        """A method to return the number of voices playing."""
+
+        return int(numpy.count_nonzero(self.active))
+
+    def is_silent(self):
+        """A method to return whether there is nothing left to hear: no voices, no fading tail, and no reverb
+        dying away."""
+
+        return (self.active_voices() == 0 and not self.tail.any()
+                and (self.reverb is None or not self.reverb.ringing()))
+
+    def _steal(self):
+        """A method to free a voice when every voice is busy. The stolen voice fades out on the tail buffer,
+        so it does not click.
+
+        Voices that are already fading out (i.e. old drones crossfading into new ones) are stolen first, then
+        notes. A looping voice that is still playing (a live drone) is only stolen if every voice is one."""
+
+        # 0 = releasing, 1 = a note, 2 = a live drone; only the voices of the lowest rank are candidates
+        rank = numpy.where(self.releasing, 0, numpy.where(self.looping, 2, 1))
+        candidates = rank == rank.min()
+
+        if self.steal == 'quietest':
+            voice = int(numpy.argmin(numpy.where(candidates, self.gain * self.envelope, numpy.inf)))
+        else:
+            voice = int(numpy.argmin(numpy.where(candidates, self.started, self.trigger_count + 1)))
+
+        samples = self.samples[voice]
+        position = int(self.position[voice])
+        fade = samples[position:position + self.release_frames] if position >= 0 else samples[:0]
+        if len(fade):
+            level = self.gain[voice] * self.envelope[voice]
+            ramp = 1 - numpy.arange(len(fade), dtype=numpy.float32) / self.release_frames
+            self.tail[:len(fade)] += fade * (level * ramp)[:, numpy.newaxis]
+
+        self.stolen += 1
+        self.active[voice] = False
+        self.samples[voice] = None
+
+        return voice
+
+    def render(self, frames=None):
+        """A method to mix the next block. Returns a float32 array of shape (frames, channels).
+
+        The array is reused by the next call, so copy it if it needs to be kept."""
+
+        if frames is None:
+            frames = self.block_frames
+        if frames > len(self.mix):
+            self.mix = numpy.zeros((frames, self.channels), dtype=numpy.float32)
+            self.ramp = numpy.arange(frames, dtype=numpy.float32)
+
+        start_time = time.perf_counter()
+
+        with self.lock:
+            out = self.mix[:frames]
+            out[:] = 0
+
+            # The fading tail of any stolen voices
+            n = min(frames, self.release_frames)
+            out[:n] += self.tail[:n]
+            if n < self.release_frames:
+                self.tail[:-n] = self.tail[n:]
+                self.tail[-n:] = 0
+            else:
+                self.tail[:] = 0
+
+            for voice in numpy.flatnonzero(self.active):
+                samples = self.samples[voice]
+                position = int(self.position[voice])
+
+                if self.looping[voice]:
+                    self._render_loop(out, voice, frames)
+                    continue
+
+                out_start = max(0, -position)
+                source_start = max(0, position)
+                count = min(frames - out_start, len(samples) - source_start)
+
+                if self.metrics is not None and position <= 0 < position + frames:
+                    # The first block this note is heard in
+                    self.metrics.record('note.trigger_to_mix', start_time - self.trigger_time[voice])
+
+                if count > 0:
+                    self._mix(out, out_start, samples[source_start:source_start + count], voice)
+
+                self.position[voice] = position + frames
+
+                if self.position[voice] >= len(samples) or (self.releasing[voice] and self.envelope[voice] <= 0):
+                    self.active[voice] = False
+                    self.samples[voice] = None
+
+            if self.reverb is not None:
+                self.reverb.process(out)
+
+            self.blocks += 1
+            self.frames_rendered += frames
+            block_time = time.perf_counter() - start_time
+            self.render_time += block_time
+
+        if self.metrics is not None:
+            self.metrics.record('mix.block', block_time)
+
+        return out
+
+    def _mix(self, out, out_start, segment, voice):
+        """A method to add a segment of a voice's samples to the mix at out_start, at the voice's gain, gliding
+        and fading out as needed. Called by render() with the lock held."""
+
+        count = len(segment)
+        level = self.gain[voice]
+
+        if self.gain_step[voice] != 0:
+            # Glide towards the target, and stop there
+            target = self.target_gain[voice]
+            level = level + (self.ramp[:count] + 1) * self.gain_step[voice]
+            if self.gain_step[voice] > 0:
+                numpy.minimum(level, target, out=level)
+            else:
+                numpy.maximum(level, target, out=level)
+            self.gain[voice] = level[-1]
+            if level[-1] == target:
+                self.gain_step[voice] = 0.0
+
+        if self.releasing[voice]:
+            envelope = self.envelope[voice] - self.ramp[:count] * self.release_step[voice]
+            numpy.maximum(envelope, 0, out=envelope)
+            self.envelope[voice] = envelope[-1]
+            level = level * envelope
+
+        if numpy.ndim(level):
+            out[out_start:out_start + count] += segment * level[:, numpy.newaxis]
+        else:
+            out[out_start:out_start + count] += segment * level
+
+    def _render_loop(self, out, voice, frames):
+        """A method to mix one block of a looping voice, wrapping around to the start of its samples as many
+        times as the block needs. Called by render() with the lock held."""
+
+        samples = self.samples[voice]
+        length = len(samples)
+        position = int(self.position[voice]) % length
+
+        out_start = 0
+        while out_start < frames:
+            count = min(frames - out_start, length - position)
+            self._mix(out, out_start, samples[position:position + count], voice)
+            out_start += count
+            position = (position + count) % length
+
+        self.position[voice] = position
+
+        if self.releasing[voice] and self.envelope[voice] <= 0:
+            self.active[voice] = False
+            self.looping[voice] = False
+            self.samples[voice] = None
+
+    def render_int16(self, frames=None):
+        """A method to mix the next block and convert it to 16-bit samples, clipping anything too loud."""
+
+        out = self.render(frames)
+        return numpy.clip(out, -32768, 32767).astype(numpy.int16)
+
+    def stats(self):
+        """A method to summarize the engine. The load is the time spent mixing divided by the audio length."""
+
+        with self.lock:
+            audio_time = self.frames_rendered / self.sample_rate
+            return {'voices': self.voices,
+                    'active': int(self.active.sum()),
+                    'peak_voices': self.peak_voices,
+                    'triggered': self.trigger_count,
+                    'stolen': self.stolen,
+                    'blocks': self.blocks,
+                    'block_time_mean': self.render_time / self.blocks if self.blocks else 0.0,
+                    'load': self.render_time / audio_time if audio_time else 0.0}
+
+
+class EngineStream:
+    """Overall class to play the output of a MixerEngine through a single pygame channel."""
+
+    # One block playing, one queued behind it, and one being mixed
+    RING_SIZE = 3
+
+    def __init__(self, engine, channel_id=0, poll=0.002):
+        """A method to set up the stream. The channel is reserved, so pygame never plays anything else on it."""
+
+        self.engine = engine
+        self.channel_id = channel_id
+        self.poll = poll
+
+        self.channel = None
+        self.running = False
+        self.thread = None
+
+        # The blocks are mixed into a fixed ring of Sounds, instead of a new Sound for every block
+        self.ring = []
+        self.ring_arrays = []
+        self.ring_index = 0
+
+        # Times the channel ran dry while the engine still had voices playing
+        self.underruns = 0
+
+    def start(self):
+        """A method to reserve the channel and start feeding it."""
+
+        pygame.mixer.set_reserved(self.channel_id + 1)
+        self.channel = pygame.mixer.Channel(self.channel_id)
+
+        block = numpy.zeros((self.engine.block_frames, self.engine.channels), dtype=numpy.int16)
+        self.ring = [pygame.mixer.Sound(buffer=block) for i in range(0, self.RING_SIZE)]
+        self.ring_arrays = [pygame.sndarray.samples(sound).reshape(block.shape) for sound in self.ring]
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='engine_stream', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """A method to stop feeding the channel."""
+
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.channel is not None:
+            self.channel.stop()
+
+    def _run(self):
+        """A method to keep one block playing and the next one queued behind it."""
+
+        was_busy = False
+
+        while self.running:
+            try:
+                was_busy = self._feed(was_busy)
+            except pygame.error:
+                # The mixer was shut down (i.e. the program is exiting)
+                self.running = False
+
+    def _feed(self, was_busy):
+        """A method to check the channel once, and queue the next block if it is needed.
+        Returns whether a block is playing."""
+
+        busy = self.channel.get_busy()
+
+        if not busy and self.engine.is_silent():
+            # Nothing to play, so wait for the next note
+            time.sleep(self.poll)
+            return False
+
+        if busy and self.channel.get_queue() is not None:
+            time.sleep(self.poll)
+            return was_busy
+
+        if was_busy and not busy:
+            self.underruns += 1
+
+        # The Sound two blocks back has finished, so its buffer can be written over
+        sound = self.ring[self.ring_index]
+        self.ring_arrays[self.ring_index][:] = self.engine.render_int16()
+        self.ring_index = (self.ring_index + 1) % self.RING_SIZE
+        if busy:
+            self.channel.queue(sound)
+        else:
+            self.channel.play(sound)
+        return True
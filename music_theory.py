@@ -0,0 +1,579 @@
+#! python3
+# music_theory.py - Works out the degrees, interval names (i.e. 1, 2, ♭3, etc.), and note names of every mode
+# of every scale in every root, and compiles them into a table that is cached on disk.
+
+"""
+
+    The table is built once from music_scales.json and roots.json, and saved to music_theory_cache.json.
+    The cache is rebuilt whenever either json file, or this file, changes.
+
+    Usage:
+        python music_theory.py              Build the table (if out of date) and print a summary
+        python music_theory.py --rebuild    Build the table, even if the cache is up to date
+        python music_theory.py --validate   Check every entry of the cached table against the golden table, worked
+                                            out by the original window (tests/make_music_theory_golden.py)
+
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import namedtuple
+from scale_registry import ScaleRegistry
+
+
+# Increase when the layout of the cached table changes
+TABLE_VERSION = 1
+
+# Names of the twelve roots, in the order used by the root dial
+ROOT_NAMES = ['G', 'G♯/A♭', 'A', 'A♯/B♭', 'B', 'C', 'C♯/D♭', 'D', 'D♯/E♭', 'E', 'F', 'F♯/G♭']
+
+TheoryEntry = namedtuple('TheoryEntry', ['degrees', 'intervals', 'display_notes', 'label', 'fifth'])
+
+
+def find_mode_degrees(scale, mode):
+    """A function to create a list of scale degrees based on the given mode of the given scale."""
+
+    mode_degrees = []
+    temp_mode_degrees = []
+    temp2_mode_degrees = []
+
+    scale_degrees = scale.degrees  # List of degrees
+    current_mode_degree = scale_degrees[mode - 1]  # Mode 1 = 0
+
+    if len(scale_degrees) == 13:
+        # Every mode of a chromatic scale is the same
+        mode_degrees = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
+    else:
+        for degree in scale_degrees:
+            if degree < current_mode_degree:
+                degree += 12
+                temp_mode_degrees.append(degree)
+            else:
+                temp_mode_degrees.append(degree)
+        temp_mode_degrees.append(current_mode_degree + 12)
+        for i in temp_mode_degrees:
+            if i not in temp2_mode_degrees:
+                temp2_mode_degrees.append(i)
+        for item in temp2_mode_degrees:
+            item -= current_mode_degree
+            mode_degrees.append(item)
+
+    mode_degrees.sort()
+
+    return mode_degrees
+
+
+def find_mode_intervals(scale, mode, degrees):
+    """A function to name the intervals (i.e. 1, 2, ♭3, etc.) for the given mode. There is one name for each
+    semitone from 0 to 12, left blank where the mode has no degree. Scales with a number of degrees that has no
+    rules of its own (i.e. from a scale file of the user's own) get the plain names, as in the chromatic scale.
+
+    The spellings of the scale's record, for the few modes that are spelled against the rules, take the place of
+    the rules for those semitones."""
+
+    intervals = []
+    count = len(scale.degrees)
+    spellings = dict(scale.spellings[mode - 1])
+
+    if len(degrees) == 13:
+        chromatic_scale = ['1', '♭2', '2', '♭3', '3', '4', '♭5',
+                           '5', '♭6', '6', '♭7', '7', '8']
+        for interval in chromatic_scale:
+            intervals.append(interval)
+
+    elif len(degrees) < 13:
+        if 0 in degrees:
+            intervals.append('1')
+
+        if 1 in degrees:
+            intervals.append(spellings.get(1, '♭2'))
+        else:
+            intervals.append('')
+
+        if 2 in degrees:
+            if 2 in spellings:
+                intervals.append(spellings[2])
+            elif 1 in degrees and count == 9:
+                intervals.append('2')
+            elif 1 in degrees:
+                intervals.append('𝄫3')
+            else:
+                intervals.append('2')
+        else:
+            intervals.append('')
+
+        if 3 in degrees:
+            if 3 in spellings:
+                intervals.append(spellings[3])
+            elif count > 7:
+                if 1 not in degrees and 2 not in degrees:
+                    intervals.append('♯2')
+                elif '𝄫3' in intervals:
+                    intervals.append('𝄫4')
+                else:
+                    intervals.append('♭3')
+            else:
+                intervals.append('♭3')
+        else:
+            intervals.append('')
+
+        if 4 in degrees:
+            if 4 in spellings:
+                intervals.append(spellings[4])
+            elif count == 8:
+                if '♭3' in intervals:
+                    intervals.append('♭4')
+                elif '𝄫3' in intervals:
+                    intervals.append('♭4')
+                else:
+                    intervals.append('3')
+            else:
+                intervals.append('3')
+        else:
+            intervals.append('')
+
+        if 5 in degrees:
+            if 5 in spellings:
+                intervals.append(spellings[5])
+            elif count == 8:
+                if '𝄫4' in intervals:
+                    intervals.append('𝄫5')
+                elif '♭4' in intervals:
+                    intervals.append('𝄫5')
+                elif '𝄫3' in intervals:
+                    intervals.append('4')
+                elif '♭3' in intervals:
+                    intervals.append('4')
+                elif '3' in intervals:
+                    intervals.append('4')
+                else:
+                    intervals.append('♯3')
+            else:
+                intervals.append('4')
+        else:
+            intervals.append('')
+
+        if 6 in degrees:
+            if 6 in spellings:
+                intervals.append(spellings[6])
+            elif count == 8:
+                if '4' in intervals:
+                    intervals.append('♭5')
+                elif '♭4' in intervals:
+                    intervals.append('♭5')
+                elif '𝄫4' in intervals:
+                    intervals.append('♭5')
+                else:
+                    intervals.append('♯4')
+            elif count == 9:
+                if '4' in intervals:
+                    intervals.append('♭5')
+                else:
+                    intervals.append('♯4')
+            else:
+                intervals.append('♭5')
+        else:
+            intervals.append('')
+
+        if 7 in degrees:
+            intervals.append(spellings.get(7, '5'))
+        else:
+            intervals.append('')
+
+        if 8 in degrees:
+            if 8 in spellings:
+                intervals.append(spellings[8])
+            elif count == 8:
+                if '5' in intervals:
+                    intervals.append('♭6')
+                elif '♭5' in intervals:
+                    intervals.append('♭6')
+                elif '𝄫5' in intervals:
+                    intervals.append('♭6')
+                else:
+                    intervals.append('♯5')
+            elif count == 9:
+                if '♯4' in intervals:
+                    intervals.append('♯5')
+                else:
+                    intervals.append('♭6')
+            else:
+                intervals.append('♭6')
+        else:
+            intervals.append('')
+
+        if 9 in degrees:
+            if 9 in spellings:
+                intervals.append(spellings[9])
+            elif count == 8:
+                if '♭6' in intervals:
+                    intervals.append('𝄫7')
+                elif '𝄫6' in intervals:
+                    intervals.append('𝄫7')
+                else:
+                    intervals.append('6')
+            elif count == 7:
+                if '♭6' in intervals:
+                    intervals.append('𝄫7')
+                else:
+                    intervals.append('6')
+            else:
+                intervals.append('6')
+        else:
+            intervals.append('')
+
+        if 10 in degrees:
+            if 10 in spellings:
+                intervals.append(spellings[10])
+            elif count == 8:
+                if '𝄫6' in intervals:
+                    intervals.append('♭7')
+                elif '♭6' in intervals:
+                    intervals.append('♭7')
+                elif '6' in intervals:
+                    intervals.append('♭7')
+                elif degrees[-2] == 10:
+                    intervals.append('♭7')
+                else:
+                    intervals.append('♯6')
+            else:
+                intervals.append('♭7')
+        else:
+            intervals.append('')
+
+        if 11 in degrees:
+            intervals.append(spellings.get(11, '7'))
+        else:
+            intervals.append('')
+
+        if 12 in degrees:
+            intervals.append('8')
+
+    return intervals
+
+
+def find_display_notes(scale, mode, root, degrees, intervals, roots):
+    """A function to determine the correct note names for the given scale/mode/root"""
+
+    display_notes = []
+
+    root_note = scale.root_names(mode)[root]  # 'C'
+
+    current_key = roots[root_note]
+
+    for key, value in current_key.items():
+        if key in intervals:
+            display_notes.append(value)
+
+    # Any marks the scale's record puts in place of a note name for this mode and root
+    for mark_mode, mark_root, index, mark in scale.marks:
+        if mark_mode == mode and mark_root == root:
+            display_notes[index] = mark
+
+    # One note name for every degree
+    while len(display_notes) < len(degrees):
+        display_notes.append('')
+
+    return display_notes
+
+
+def find_scale_label(scale, mode, display_notes):
+    """A function to write the label shown for the root, scale, and mode (i.e. 'C Major Scale, Mode 1 (Ionian)').
+    How the mode is shown is up to the scale's record: by its number, by its name, or not at all."""
+
+    mode_index = mode - 1
+    label_0a = display_notes[0]
+    label_0b = str(scale.name)
+    label_0c = " Scale"
+
+    if scale.mode_label == 'none':
+        label_0d = ''
+    elif scale.mode_label == 'name':
+        label_0d = ", " + scale.modes[mode_index]
+    else:
+        label_0d = ", Mode " + str(mode)
+
+    label_0 = label_0a + " " + label_0b + label_0c + label_0d
+
+    label_1 = scale.modes[mode_index]
+
+    if scale.name == scale.modes[mode_index] or "Mode" in label_1:
+        return label_0
+    else:
+        return label_0 + " (" + label_1 + ")"
+
+
+def find_fifth_degree(degrees, intervals):
+    """A function to find the degree (0-12) used for the second drone, which is the fifth in most scales"""
+
+    if "5" in intervals:
+        return 7
+    elif "♭5" in intervals:
+        return 6
+    elif "♯5" in intervals:
+        return 8
+    elif "𝄫5" in intervals:
+        return 5
+    elif "𝄪5" in intervals and len(degrees) != 6:
+        return 9
+    else:
+        return 5
+
+
+def compute_entry(scale, mode, root, roots):
+    """A function to work out everything about one scale/mode/root, from the scale's record (see
+    scale_registry.Scale)."""
+
+    degrees = find_mode_degrees(scale, mode)
+    intervals = find_mode_intervals(scale, mode, degrees)
+    display_notes = find_display_notes(scale, mode, root, degrees, intervals, roots)
+    label = find_scale_label(scale, mode, display_notes)
+    fifth = find_fifth_degree(degrees, intervals)
+
+    return TheoryEntry(tuple(degrees), tuple(intervals), tuple(display_notes), label, fifth)
+
+
+class TheoryTable:
+    """Overall class to hold the compiled table, and answer lookups by scale key, mode, and root."""
+
+    def __init__(self, all_scale_data, all_root_data, source_hash=None):
+        """A method to set up an empty table for the given scale and root data. Raises ValueError if the scale
+        data is not valid (see scale_registry.py)."""
+
+        self.all_scale_data = all_scale_data
+        self.all_root_data = all_root_data
+        self.registry = ScaleRegistry(all_scale_data, all_root_data["Roots"])
+        self.scales = all_scale_data["Scales"]
+        self.roots = all_root_data["Roots"]
+        self.source_hash = source_hash
+
+        # (scale key, mode, root) -> TheoryEntry
+        self.entries = {}
+
+        # A lazy table computes each entry the first time it is looked up
+        self.lazy = False
+
+        self.from_cache = False
+        self.load_time = 0.0
+
+    @classmethod
+    def load(cls, scales_path='music_scales.json', roots_path='roots.json', cache_path='music_theory_cache.json',
+             lazy=False):
+        """A method to load the table from the cache, or to compile it (and save the cache) if the cache is out
+        of date.
+
+        A lazy table skips both, and computes each entry the first time it is looked up instead, which is
+        quicker when only a few entries are needed (i.e. while the window is starting)."""
+
+        start = time.perf_counter()
+
+        with open(scales_path, 'rb') as f:
+            scale_bytes = f.read()
+        with open(roots_path, 'rb') as f:
+            root_bytes = f.read()
+
+        table = cls(json.loads(scale_bytes.decode('utf-8')),
+                    json.loads(root_bytes.decode('utf-8')),
+                    source_hash(scale_bytes, root_bytes))
+
+        if lazy:
+            table.lazy = True
+        elif cache_path is not None and table.read_cache(cache_path):
+            table.from_cache = True
+        else:
+            table.compile()
+            if cache_path is not None:
+                table.write_cache(cache_path)
+
+        table.load_time = time.perf_counter() - start
+
+        return table
+
+    def compile(self):
+        """A method to compute every entry of the table."""
+
+        self.entries = {}
+        for scale in self.registry:
+            for mode in range(1, scale.mode_count + 1):
+                for root in range(0, 12):
+                    self.entries[(scale.key, mode, root)] = compute_entry(scale, mode, root, self.roots)
+
+    def lookup(self, key, mode, root):
+        """A method to return the entry for a scale key (i.e. 'major'), mode (1 and up), and root (0-11)."""
+
+        entry = self.entries.get((key, mode, root))
+        if entry is None:
+            if not self.lazy or not 1 <= mode <= self.mode_count(key) or root not in range(0, 12):
+                raise KeyError((key, mode, root))
+            entry = self.entries[(key, mode, root)] = compute_entry(self.registry[key], mode, root, self.roots)
+        return entry
+
+    def find_scale(self, text):
+        """A method to find a scale key from either its key or its name (i.e. 'major_pentatonic' or
+        'Major Pentatonic'). Raises ValueError if there is no such scale."""
+
+        return self.registry.find(text).key
+
+    def mode_count(self, key):
+        """A method to return the number of modes of a scale."""
+
+        return self.registry[key].mode_count
+
+    def read_cache(self, path):
+        """A method to fill the table from the cache file. Returns False if the cache is missing or out of date."""
+
+        try:
+            with open(path, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if cache.get("version") != TABLE_VERSION or cache.get("source_hash") != self.source_hash:
+            return False
+
+        entries = {}
+        try:
+            for key, modes in cache["entries"].items():
+                for mode, rows in modes.items():
+                    for root, row in enumerate(rows):
+                        degrees, intervals, display_notes, label, fifth = row
+                        entries[(key, int(mode), root)] = TheoryEntry(tuple(degrees), tuple(intervals),
+                                                                      tuple(display_notes), label, fifth)
+        except (KeyError, TypeError, ValueError):
+            return False
+
+        # Every scale, mode, and root must be present
+        for scale in self.registry:
+            for mode in range(1, scale.mode_count + 1):
+                for root in range(0, 12):
+                    if (scale.key, mode, root) not in entries:
+                        return False
+
+        self.entries = entries
+        return True
+
+    def write_cache(self, path):
+        """A method to save the table to the cache file. A cache that can't be written is simply skipped."""
+
+        cache_entries = {}
+        for (key, mode, root), entry in self.entries.items():
+            rows = cache_entries.setdefault(key, {}).setdefault(str(mode), [None] * 12)
+            rows[root] = [list(entry.degrees), list(entry.intervals), list(entry.display_notes),
+                          entry.label, entry.fifth]
+
+        cache = {"version": TABLE_VERSION, "source_hash": self.source_hash, "entries": cache_entries}
+
+        temp_path = path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError:
+            return False
+        return True
+
+    def validate(self, golden=None):
+        """A method to compare every entry with the golden table (see load_golden), which was worked out by the
+        window's own methods before they were ported here. Scales that are not in the golden table (i.e. from a
+        scale file of the user's own), or every scale if there is no golden table, are compared with a fresh
+        computation instead. Returns a list of the keys that differ."""
+
+        mismatches = []
+        for scale in self.registry:
+            for mode in range(1, scale.mode_count + 1):
+                for root in range(0, 12):
+                    expected = None if golden is None else golden.get((scale.key, mode, root))
+                    if expected is None:
+                        expected = compute_entry(scale, mode, root, self.roots)
+                    if self.entries.get((scale.key, mode, root)) != expected:
+                        mismatches.append((scale.key, mode, root))
+        return mismatches
+
+
+def load_golden(path='music_theory_golden.json'):
+    """A function to load the golden table written by tests/make_music_theory_golden.py. Returns a dict of
+    (scale key, mode, root) -> TheoryEntry."""
+
+    with open(path, encoding='utf-8') as f:
+        golden = json.load(f)
+
+    entries = {}
+    for key, modes in golden["entries"].items():
+        for mode, rows in modes.items():
+            for root, row in enumerate(rows):
+                degrees, intervals, display_notes, label, fifth = row
+                entries[(key, int(mode), root)] = TheoryEntry(tuple(degrees), tuple(intervals),
+                                                              tuple(display_notes), label, fifth)
+    return entries
+
+
+def find_root(text):
+    """A function to find a root dial position (0-11) from a note name (i.e. C, F♯, Gb) or a number.
+    Raises ValueError if there is no such root."""
+
+    text = str(text).strip()
+    if text.isdigit() and 0 <= int(text) < 12:
+        return int(text)
+
+    name = text[:1].upper() + text[1:].replace('#', '♯').replace('b', '♭')
+    for i, root_name in enumerate(ROOT_NAMES):
+        if name in root_name.split('/'):
+            return i
+    raise ValueError(f'Unknown root: {text}')
+
+
+def source_hash(scale_bytes, root_bytes):
+    """A function to fingerprint everything the table is built from: both json files and this file."""
+
+    digest = hashlib.sha256()
+    digest.update(scale_bytes)
+    digest.update(root_bytes)
+    with open(os.path.abspath(__file__), 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build, cache, and validate the music theory table.')
+    parser.add_argument('--scales', default='music_scales.json', help='json file containing the music scales')
+    parser.add_argument('--roots', default='roots.json', help='json file containing the musical key roots')
+    parser.add_argument('--cache', default='music_theory_cache.json', help='where the compiled table is cached')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the table even if the cache is up to date')
+    parser.add_argument('--validate', action='store_true',
+                        help='check every entry against the golden table worked out by the original window')
+    parser.add_argument('--golden', default='music_theory_golden.json',
+                        help='golden table for --validate (default: music_theory_golden.json)')
+    args = parser.parse_args(argv)
+
+    if args.rebuild and os.path.exists(args.cache):
+        os.remove(args.cache)
+
+    try:
+        table = TheoryTable.load(args.scales, args.roots, args.cache)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    source = 'cache' if table.from_cache else 'compiled'
+    print(f'{len(table.entries)} entries ({source}) in {table.load_time * 1000:.1f} ms')
+
+    if args.validate:
+        try:
+            golden = load_golden(args.golden)
+        except (OSError, ValueError) as error:
+            print(f'Could not read the golden table: {error}', file=sys.stderr)
+            return 1
+        mismatches = table.validate(golden)
+        for key, mode, root in mismatches:
+            print(f'Mismatch: {key}, mode {mode}, root {root}')
+        print(f'{len(table.entries) - len(mismatches)} of {len(table.entries)} entries match')
+        return 1 if mismatches else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
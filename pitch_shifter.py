@@ -0,0 +1,217 @@
+#! python3
+# pitch_shifter.py - Derives notes that were never recorded (i.e. the octaves above and below the 24 audio files,
+# or the same notes in another temperament) by resampling the nearest recording.
+
+import math
+import time
+import threading
+from collections import OrderedDict
+import numpy
+
+
+def _meantone_ratios():
+    """A function to build quarter-comma meantone from a chain of fifths, each a quarter comma narrow (E♭ to G♯)."""
+
+    fifth = 1200 * math.log2(1.5) - 1200 * math.log2(81 / 80) / 4
+    ratios = [1.0] * 12
+    for j in range(-5, 7):
+        cents = (j * fifth) % 1200
+        ratios[(7 * j) % 12] = 2 ** (cents / 1200)
+    return ratios
+
+
+# The ratio of each of the 12 notes to the root, for each temperament. None is equal temperament.
+TEMPERAMENTS = {
+    'equal': None,
+    'just': [1, 16 / 15, 9 / 8, 6 / 5, 5 / 4, 4 / 3, 45 / 32, 3 / 2, 8 / 5, 5 / 3, 9 / 5, 15 / 8],
+    'pythagorean': [1, 256 / 243, 9 / 8, 32 / 27, 81 / 64, 4 / 3, 729 / 512, 3 / 2, 128 / 81, 27 / 16, 16 / 9,
+                    243 / 128],
+    'meantone': _meantone_ratios(),
+}
+
+
+# The anti-aliasing filter used when the pitch goes up: its transition band, as a fraction of the new Nyquist
+# frequency (below which the harmonics are kept), the level of anything left above the Nyquist frequency, and the
+# Kaiser window's beta for that level
+ANTIALIAS_TRANSITION = 0.1
+ANTIALIAS_STOPBAND = 10 ** (-80 / 20)
+ANTIALIAS_BETA = 0.1102 * (80 - 8.7)
+
+
+class PitchShifter:
+    """Overall class to resample recorded notes to new pitches, keeping the most recently used results in memory."""
+
+    def __init__(self, sample_bank, cache_bytes=64 * 2 ** 20):
+        """A method to set up the shifter. Derived notes are dropped, least recently used first, once they take up
+        more than cache_bytes."""
+
+        self.sample_bank = sample_bank
+        self.cache_bytes = cache_bytes
+
+        self.temperament = 'equal'
+        self.root = 0
+        self.detune = 0.0
+        self.offsets = [0.0] * 12
+
+        # (note, cents) -> int16 array of shape (frames, channels)
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resample_time = 0.0
+
+        self.lock = threading.Lock()
+
+    def set_tuning(self, temperament='equal', root=0, detune=0.0):
+        """A method to choose the temperament (a key of TEMPERAMENTS), the root it is built on (0-11, counted
+        the same as the root dial), and a detune of every note, in cents."""
+
+        if temperament not in TEMPERAMENTS:
+            raise ValueError(f'Unknown temperament: {temperament} (expected one of {", ".join(TEMPERAMENTS)})')
+
+        ratios = TEMPERAMENTS[temperament]
+        offsets = []
+        for degree in range(0, 12):
+            cents = 1200 * math.log2(ratios[degree]) - 100 * degree if ratios is not None else 0.0
+            offsets.append(cents + detune)
+
+        with self.lock:
+            self.temperament = temperament
+            self.root = root % 12
+            self.detune = detune
+            self.offsets = offsets
+
+    def cents(self, note):
+        """A method to return how far the current tuning moves a note from equal temperament, in cents."""
+
+        return self.offsets[(note - self.root) % 12]
+
+    def source(self, note):
+        """A method to return the recorded note closest in pitch to a note, which is the one it is derived from."""
+
+        return min(max(note, 0), self.sample_bank.count - 1)
+
+    def samples(self, note):
+        """A method to return the PCM data of any note, as an int16 array of shape (frames, channels).
+
+        note is counted in semitones the same as the audio files (0 is note_00), but may be below 0 or above
+        the last recording. Recorded notes in equal temperament are returned from the sample bank unchanged."""
+
+        note = self.sample_bank.index(note)
+        cents = round(self.cents(note), 3)
+        source = self.source(note)
+
+        if source == note and cents == 0:
+            return self.sample_bank.samples(note)
+
+        key = (note, cents)
+        with self.lock:
+            pcm = self.cache.get(key)
+            if pcm is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return pcm
+
+        ratio = 2 ** ((note - source) / 12 + cents / 1200)
+
+        start = time.perf_counter()
+        pcm = resample(self.sample_bank.samples(source), ratio)
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            self.misses += 1
+            self.resample_time += elapsed
+            if key not in self.cache:
+                self.cache[key] = pcm
+                self.cached_bytes += pcm.nbytes
+            while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+                old_key, old_pcm = self.cache.popitem(last=False)
+                self.cached_bytes -= old_pcm.nbytes
+                self.evictions += 1
+
+        return pcm
+
+    def trim(self, max_bytes):
+        """A method to drop the least recently used derived notes until they take up at most max_bytes.
+        Returns the number of notes dropped."""
+
+        dropped = 0
+        with self.lock:
+            while self.cache and self.cached_bytes > max_bytes:
+                old_key, old_pcm = self.cache.popitem(last=False)
+                self.cached_bytes -= old_pcm.nbytes
+                self.evictions += 1
+                dropped += 1
+        return dropped
+
+    def clear(self):
+        """A method to drop every derived note."""
+
+        with self.lock:
+            self.cache.clear()
+            self.cached_bytes = 0
+
+    def stats(self):
+        """A method to summarize the cache, and the average time taken to derive a note, in seconds."""
+
+        with self.lock:
+            return {'temperament': self.temperament,
+                    'detune': self.detune,
+                    'cached': len(self.cache),
+                    'cached_bytes': self.cached_bytes,
+                    'cache_bytes': self.cache_bytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'resample_time_mean': self.resample_time / self.misses if self.misses else 0.0}
+
+
+def lowpass(samples, cutoff, transition):
+    """A function to filter samples (shape (frames, channels)) with a Kaiser-windowed sinc, convolved by FFT.
+    cutoff is the middle of the transition band, and transition is its width, both in cycles per frame. The filter
+    is linear phase and centred, so nothing moves in time. Returns a new float32 array."""
+
+    # Kaiser's estimate of the length that reaches the stopband attenuation over the transition band
+    attenuation = 20 * math.log10(1 / ANTIALIAS_STOPBAND)
+    half = int(math.ceil((attenuation - 7.95) / (14.36 * transition) / 2))
+    n = numpy.arange(-half, half + 1)
+    kernel = 2 * cutoff * numpy.sinc(2 * cutoff * n) * numpy.kaiser(len(n), ANTIALIAS_BETA)
+    kernel /= kernel.sum()
+
+    frames = len(samples)
+    size = 1 << (frames + len(kernel) - 2).bit_length()
+    spectrum = numpy.fft.rfft(samples, size, axis=0) * numpy.fft.rfft(kernel, size)[:, numpy.newaxis]
+    return numpy.fft.irfft(spectrum, size, axis=0)[half:half + frames].astype(numpy.float32)
+
+
+def resample(samples, ratio):
+    """A function to play samples (shape (frames, channels)) back ratio times faster, which raises the pitch by
+    ratio (and shortens the note to match), using linear interpolation. Returns a new int16 array.
+
+    When the pitch goes up, everything above the new Nyquist frequency is filtered out of the source first
+    (see lowpass), so the highest harmonics don't fold back down as tones that are out of tune with the note."""
+
+    frames = len(samples)
+    out_frames = int((frames - 1) / ratio) + 1
+
+    if ratio > 1:
+        nyquist = 0.5 / ratio
+        source = lowpass(samples, nyquist * (1 - ANTIALIAS_TRANSITION / 2), nyquist * ANTIALIAS_TRANSITION)
+    else:
+        source = samples
+
+    position = numpy.arange(out_frames, dtype=numpy.float64) * ratio
+    index = position.astype(numpy.int64)
+    numpy.minimum(index, frames - 2, out=index)
+    fraction = (position - index).astype(numpy.float32)[:, numpy.newaxis]
+
+    first = source[index].astype(numpy.float32)
+    second = source[index + 1].astype(numpy.float32)
+    out = first + (second - first) * fraction
+
+    numpy.rint(out, out=out)
+    numpy.clip(out, -32768, 32767, out=out)
+    return out.astype(numpy.int16)
@@ -0,0 +1,129 @@
+#! python3
+# playback_metrics.py - Optional histograms of how late and how evenly notes play, cheap enough to leave on
+# during a live session.
+
+import json
+import time
+import bisect
+import threading
+
+
+# Bucket upper bounds for times, in seconds: 10 µs to 10 s in 1-2-5 steps
+TIME_BOUNDS = tuple(m * 10 ** e for e in range(-5, 1) for m in (1, 2, 5)) + (10.0,)
+
+# Bucket upper bounds for counts (i.e. threads, voices)
+COUNT_BOUNDS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64, 96, 128, 256)
+
+
+class Histogram:
+    """Overall class to count values in fixed buckets, keeping the total, minimum, and maximum exactly."""
+
+    def __init__(self, bounds=TIME_BOUNDS):
+        """A method to set up the buckets. Values above the last bound go in an overflow bucket."""
+
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def add(self, value):
+        """A method to count one value."""
+
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """A method to estimate a percentile (0-100) from the bucket it falls in."""
+
+        if not self.count:
+            return None
+
+        target = p / 100 * self.count
+        running = 0
+        for i, n in enumerate(self.counts):
+            running += n
+            if running >= target and n:
+                # The bucket's upper bound, but never more than the largest value seen
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        """A method to summarize the histogram as a dictionary."""
+
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else None,
+                'min': self.min,
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'p99': self.percentile(99),
+                'max': self.max,
+                'last': self.last,
+                'buckets': {str(bound): n for bound, n in zip(self.bounds + ('inf',), self.counts) if n}}
+
+
+class PlaybackMetrics:
+    """Overall class to hold the named histograms recorded during a session."""
+
+    def __init__(self):
+        """A method to set up an empty set of histograms."""
+
+        self.times = {}
+        self.counts = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds):
+        """A method to add a time, in seconds, to the named histogram."""
+
+        with self.lock:
+            histogram = self.times.get(name)
+            if histogram is None:
+                histogram = self.times[name] = Histogram(TIME_BOUNDS)
+            histogram.add(seconds)
+
+    def gauge(self, name, value):
+        """A method to add a sampled count (i.e. live threads) to the named histogram."""
+
+        with self.lock:
+            histogram = self.counts.get(name)
+            if histogram is None:
+                histogram = self.counts[name] = Histogram(COUNT_BOUNDS)
+            histogram.add(value)
+
+    def summary(self):
+        """A method to summarize every histogram. Times are in seconds."""
+
+        with self.lock:
+            return {'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                    'seconds': time.time() - self.started,
+                    'times': {name: histogram.summary() for name, histogram in sorted(self.times.items())},
+                    'counts': {name: histogram.summary() for name, histogram in sorted(self.counts.items())}}
+
+    def dump(self, path):
+        """A method to write the summary to a json file."""
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def report(self):
+        """A method to describe every histogram in a few lines of text, for the debug overlay."""
+
+        lines = []
+        with self.lock:
+            width = max([len(name) for name in list(self.times) + list(self.counts)] + [0])
+            for name, histogram in sorted(self.times.items()):
+                lines.append(f'{name:<{width}}  n={histogram.count:<6} p50={histogram.percentile(50) * 1000:>8.2f}ms '
+                             f'p99={histogram.percentile(99) * 1000:>8.2f}ms max={histogram.max * 1000:>8.2f}ms')
+            for name, histogram in sorted(self.counts.items()):
+                lines.append(f'{name:<{width}}  n={histogram.count:<6} now={histogram.last:<5} '
+                             f'p50={histogram.percentile(50):<5} max={histogram.max}')
+        return '\n'.join(lines)
@@ -0,0 +1,156 @@
+#! python3
+# resource_guard.py - Keeps a long-running session (i.e. a chime left on for hours) within fixed limits on
+# threads, pygame Sounds, and memory, by shedding work instead of growing.
+
+import os
+import threading
+
+
+def rss_bytes():
+    """A function to return the resident memory of this process in bytes, or None where it can't be read."""
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class ResourceGuard:
+    """Overall class to check a ChimeSession's resources at a fixed interval, and shed work that would take it
+    over a limit: late chime notes are dropped, new notes are refused while the session has too many threads or
+    pygame Sounds, and the least recently used derived notes and drone loops are dropped from memory.
+
+    Only the threads the session runs on are counted (its scheduler, the scheduler's workers, and its stream), so
+    threads started by the rest of the process (i.e. one per daemon client) never silence the chime."""
+
+    def __init__(self, session, max_threads=8, max_sounds=16, max_memory=96 * 2 ** 20, max_queued=256,
+                 max_lateness=0.25, interval=10.0):
+        """A method to set the limits.
+
+        max_threads is the most threads the session may run on, and max_sounds is the most pygame Sounds it may
+        hold (only the stream's ring, since the notes and the drones are mixed by the engine). Over either one,
+        new notes are refused. max_memory is in bytes, and counts the audio the session keeps in memory (the
+        sample bank, the derived notes, and the drone loops). max_queued is the most events that may wait on the
+        scheduler, max_lateness is how many seconds late a chime note may play before it is dropped, and
+        interval is the number of seconds between checks."""
+
+        self.session = session
+        self.max_threads = max_threads
+        self.max_sounds = max_sounds
+        self.max_memory = max_memory
+        self.max_queued = max_queued
+        self.max_lateness = max_lateness
+        self.interval = interval
+
+        # Set when a check finds too many threads or Sounds, and cleared by the next check that doesn't
+        self.overloaded = False
+
+        # Counters
+        self.checks = 0
+        self.shed_notes = 0
+        self.trimmed_notes = 0
+        self.trimmed_drones = 0
+        self.peaks = {'threads': 0, 'process_threads': 0, 'sounds': 0, 'memory_bytes': 0, 'rss_bytes': 0,
+                      'queued': 0}
+
+        self.running = False
+
+    def start(self):
+        """A method to apply the limits to the session's scheduler and caches, and start checking."""
+
+        session = self.session
+        session.scheduler.max_queued = self.max_queued
+
+        # Half of the memory is left for the derived notes, so changing tuning never has to wait for a check
+        session.pitch_shifter.cache_bytes = min(session.pitch_shifter.cache_bytes, self.max_memory // 2)
+
+        self.running = True
+        session.scheduler.schedule(self.interval, self.check, tag=session.tag('guard'))
+        return self
+
+    def stop(self):
+        """A method to stop checking."""
+
+        self.running = False
+        self.session.scheduler.cancel(self.session.tag('guard'))
+
+    def admit(self):
+        """A method to decide whether a new note may play. Notes are refused while the session has too many
+        threads or pygame Sounds."""
+
+        if self.overloaded or self.thread_count() > self.max_threads or self.sound_count() > self.max_sounds:
+            self.shed_notes += 1
+            return False
+        return True
+
+    def thread_count(self):
+        """A method to count the session's own threads that are alive."""
+
+        session = self.session
+        threads = session.scheduler.threads()
+        if session.engine_stream.thread is not None and session.engine_stream.thread.is_alive():
+            threads.append(session.engine_stream.thread)
+        return len(threads)
+
+    def sound_count(self):
+        """A method to count the pygame Sounds the session holds."""
+
+        return len(self.session.engine_stream.ring)
+
+    def usage(self):
+        """A method to measure the session's resources now."""
+
+        session = self.session
+        drone_stats = session.drone_synth.stats()
+        return {'threads': self.thread_count(),
+                'process_threads': threading.active_count(),
+                'sounds': self.sound_count(),
+                'memory_bytes': (session.sample_bank.memory_usage() + session.pitch_shifter.cached_bytes
+                                 + drone_stats['memory_bytes']),
+                'rss_bytes': rss_bytes() or 0,
+                'queued': session.scheduler.pending()}
+
+    def check(self):
+        """A method to measure the session's resources and shed whatever is over a limit. Called by the scheduler,
+        and queues the next check."""
+
+        if not self.running:
+            return
+
+        session = self.session
+        usage = self.usage()
+
+        self.overloaded = usage['threads'] > self.max_threads or usage['sounds'] > self.max_sounds
+
+        # Memory: derived notes first, since any of them can be derived again when it is next played
+        excess = usage['memory_bytes'] - self.max_memory
+        if excess > 0:
+            self.trimmed_notes += session.pitch_shifter.trim(max(0, session.pitch_shifter.cached_bytes - excess))
+            usage = self.usage()
+            if usage['memory_bytes'] > self.max_memory:
+                self.trimmed_drones += session.drone_synth.trim(0)
+
+        usage = self.usage()
+        for name, value in usage.items():
+            self.peaks[name] = max(self.peaks[name], value)
+        self.checks += 1
+
+        session.scheduler.schedule(self.interval, self.check, tag=session.tag('guard'))
+
+    def stats(self):
+        """A method to summarize the limits, the resources in use, their peaks, and the work that was shed."""
+
+        return {'limits': {'threads': self.max_threads,
+                           'sounds': self.max_sounds,
+                           'memory_bytes': self.max_memory,
+                           'queued': self.max_queued,
+                           'lateness': self.max_lateness},
+                'usage': self.usage(),
+                'peaks': dict(self.peaks),
+                'overloaded': self.overloaded,
+                'checks': self.checks,
+                'shed_notes': self.shed_notes,
+                'shed_events': self.session.scheduler.shed,
+                'trimmed_notes': self.trimmed_notes,
+                'trimmed_drones': self.trimmed_drones}
@@ -0,0 +1,210 @@
+#! python3
+# reverb.py - Adds the sound of a room to the mixed chime and drones, by convolving each block with a synthetic
+# impulse response, split into partitions and convolved with numpy's FFT (uniformly partitioned overlap-add).
+
+import time
+import numpy
+
+# Room name -> (reverb time in seconds (RT60), predelay in seconds, reverb time of the highs as a fraction of the
+# lows, number of early reflections)
+ROOMS = {'room': (0.6, 0.030, 0.5, 6),
+         'hall': (2.2, 0.040, 0.4, 10),
+         'cathedral': (4.5, 0.060, 0.3, 14)}
+
+# Frequency (Hz) above which a room's reverb dies away sooner
+DAMPING_FREQUENCY = 4000.0
+
+
+def make_impulse(room, sample_rate=44100, channels=2, seed=0):
+    """A function to synthesize the impulse response of one of the ROOMS: a few early reflections, then a tail of
+    noise that dies away by 60 dB over the room's reverb time, sooner for the highs. Each channel has its own noise,
+    so the reverb spreads across the stereo field. Returns a float32 array of shape (frames, channels), with each
+    channel scaled to an energy of 1."""
+
+    if room not in ROOMS:
+        raise ValueError(f'Unknown room: {room} (expected one of {", ".join(ROOMS)})')
+
+    rt60, predelay, damping, reflections = ROOMS[room]
+    rng = numpy.random.default_rng(seed)
+
+    predelay_frames = int(predelay * sample_rate)
+    frames = predelay_frames + int(rt60 * sample_rate)
+    times = numpy.arange(frames - predelay_frames) / sample_rate
+
+    # 60 dB of decay over the reverb time is a factor of 10 ** -3
+    lows = numpy.exp(-6.9078 * times / rt60)
+    highs = numpy.exp(-6.9078 * times / (rt60 * damping))
+    bright = numpy.fft.rfftfreq(len(times), 1 / sample_rate) >= DAMPING_FREQUENCY
+
+    impulse = numpy.zeros((frames, channels), dtype=numpy.float32)
+    for channel in range(0, channels):
+        noise = numpy.fft.rfft(rng.standard_normal(len(times)))
+        tail = (numpy.fft.irfft(numpy.where(bright, 0, noise), len(times)) * lows
+                + numpy.fft.irfft(numpy.where(bright, noise, 0), len(times)) * highs)
+
+        # Early reflections: distinct echoes off the nearest walls, in the first 80 ms
+        for i in range(0, reflections):
+            frame = int(rng.uniform(0, 0.08) * sample_rate)
+            tail[frame] += rng.choice((-1, 1)) * rng.uniform(2, 6) * numpy.exp(-6.9078 * frame / sample_rate / rt60)
+
+        impulse[predelay_frames:, channel] = tail / numpy.sqrt(numpy.sum(tail ** 2))
+
+    return impulse
+
+
+class ConvolutionReverb:
+    """Overall class to convolve a stream of blocks, of any length, with an impulse response.
+
+    The impulse response is split into partitions of partition_frames, and each partition's spectrum is multiplied
+    with the spectra of the input partitions that came before it, so the cost of a partition does not depend on how
+    long the reverb is, only on how many partitions it has. The reverb is a partition behind the input, which is
+    taken out of the impulse response's predelay."""
+
+    def __init__(self, impulse, partition_frames=1024, sample_rate=44100, mix=0.3, metrics=None):
+        """A method to split an impulse response of shape (frames, channels) into partitions, and take their
+        spectra. mix is the level of the reverb added to the dry sound. metrics, if given, is a PlaybackMetrics that
+        records the time taken by each partition. Raises ValueError if mix is not from 0 to 1."""
+
+        if not 0 <= mix <= 1:
+            raise ValueError(f'The reverb mix must be from 0 to 1: {mix}')
+
+        self.partition_frames = partition_frames
+        self.sample_rate = sample_rate
+        self.mix = mix
+        self.metrics = metrics
+
+        impulse = numpy.asarray(impulse, dtype=numpy.float32)
+        if impulse.ndim == 1:
+            impulse = impulse[:, numpy.newaxis]
+        self.channels = impulse.shape[1]
+
+        # The silence at the start of the impulse response makes up for the partition of latency
+        audible = numpy.flatnonzero(numpy.abs(impulse).max(axis=1))
+        impulse = impulse[min(partition_frames, audible[0] if len(audible) else 0):]
+        self.impulse_frames = len(impulse)
+
+        count = max(1, -(-len(impulse) // partition_frames))
+        padded = numpy.zeros((count * partition_frames, self.channels), dtype=numpy.float32)
+        padded[:len(impulse)] = impulse
+        spectra = numpy.fft.rfft(padded.reshape(count, partition_frames, self.channels), 2 * partition_frames, axis=1)
+
+        # The spectra are stored reversed and twice over, so the ones that line up with the input spectra (a ring,
+        # newest at slot) are always one slice: spectra[count - 1 - slot:][:count]
+        self.partitions = count
+        self.spectra = numpy.concatenate((spectra[::-1], spectra[::-1]))
+        self.history = numpy.zeros_like(spectra)
+        self.slot = 0
+
+        # The input partition being filled, the reverb being played out while it fills, and the overlap of the last
+        # partition's reverb into the next one
+        self.input = numpy.zeros((partition_frames, self.channels), dtype=numpy.float32)
+        self.output = numpy.zeros((partition_frames, self.channels), dtype=numpy.float32)
+        self.overlap = numpy.zeros((partition_frames, self.channels))
+        self.filled = 0
+
+        # Frames of input still to come before the reverb has died away, after the last block with any sound
+        self.ring_frames = 0
+
+        # Counters
+        self.blocks = 0
+        self.convolved = 0
+        self.process_time = 0.0
+        self.peak_time = 0.0
+        self.over_budget = 0
+
+    @classmethod
+    def for_room(cls, room, partition_frames=1024, sample_rate=44100, channels=2, mix=0.3, metrics=None):
+        """A method to make a reverb from one of the synthetic ROOMS."""
+
+        return cls(make_impulse(room, sample_rate, channels), partition_frames, sample_rate, mix, metrics)
+
+    def budget(self):
+        """A method to return the real-time budget of one partition: the time it takes to play."""
+
+        return self.partition_frames / self.sample_rate
+
+    def ringing(self):
+        """A method to return whether the reverb is still dying away, i.e. there is more to hear after the input
+        goes silent."""
+
+        return self.ring_frames > 0
+
+    def reset(self):
+        """A method to silence the reverb at once."""
+
+        self.history[:] = 0
+        self.input[:] = 0
+        self.output[:] = 0
+        self.overlap[:] = 0
+        self.filled = 0
+        self.ring_frames = 0
+
+    def process(self, block):
+        """A method to add the reverb of a float32 block of shape (frames, channels) to the block, in place.
+        Blocks of silence cost nothing once the reverb has died away. Returns the block."""
+
+        if block.any():
+            self.ring_frames = self.impulse_frames + 2 * self.partition_frames
+        elif self.ring_frames <= 0:
+            return block
+        self.ring_frames -= len(block)
+
+        start_time = time.perf_counter()
+
+        position = 0
+        while position < len(block):
+            count = min(len(block) - position, self.partition_frames - self.filled)
+            end = self.filled + count
+
+            self.input[self.filled:end] = block[position:position + count]
+            block[position:position + count] += self.output[self.filled:end] * self.mix
+
+            self.filled = end
+            position += count
+            if self.filled == self.partition_frames:
+                self._convolve()
+                self.filled = 0
+
+        block_time = time.perf_counter() - start_time
+        self.blocks += 1
+        self.process_time += block_time
+        self.peak_time = max(self.peak_time, block_time)
+        if block_time > self.budget() * len(block) / self.partition_frames:
+            self.over_budget += 1
+
+        if self.metrics is not None:
+            self.metrics.record('reverb.block', block_time)
+
+        return block
+
+    def _convolve(self):
+        """A method to convolve the input partition that was just filled, and queue its reverb to be played out
+        over the next partition."""
+
+        frames = self.partition_frames
+        self.history[self.slot] = numpy.fft.rfft(self.input, 2 * frames, axis=0)
+
+        start = self.partitions - 1 - self.slot
+        spectrum = numpy.einsum('kfc,kfc->fc', self.history, self.spectra[start:start + self.partitions])
+        reverb = numpy.fft.irfft(spectrum, 2 * frames, axis=0)
+
+        self.output[:] = reverb[:frames] + self.overlap
+        self.overlap[:] = reverb[frames:]
+
+        self.slot = (self.slot + 1) % self.partitions
+        self.convolved += 1
+
+    def stats(self):
+        """A method to summarize the reverb. The load is the time spent convolving divided by the audio length,
+        so it must stay under 1 to keep up with real time on one core."""
+
+        audio_time = self.convolved * self.budget()
+        return {'partitions': self.partitions,
+                'partition_frames': self.partition_frames,
+                'length': round(self.impulse_frames / self.sample_rate, 2),
+                'mix': self.mix,
+                'blocks': self.blocks,
+                'block_time_mean': self.process_time / self.blocks if self.blocks else 0.0,
+                'block_time_peak': self.peak_time,
+                'over_budget': self.over_budget,
+                'load': self.process_time / audio_time if audio_time else 0.0}
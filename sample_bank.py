@@ -0,0 +1,170 @@
+#! python3
+# sample_bank.py - An in-memory bank of the pre-recorded ukulele notes, so that playing a note
+# no longer means reading and parsing a WAV file.
+
+import os
+import time
+import wave
+import threading
+import numpy
+import pygame
+from sample_pack import SamplePack, pack_path_for
+
+
+class SampleBank:
+    """Overall class to hold the audio files in memory, shared by every note that is played."""
+
+    def __init__(self, directory='AudioFiles', count=24, use_pack=True):
+        """A method to set up the bank. Nothing is read from disk until a note is first needed.
+
+        If use_pack is True and an up to date pack of the audio files exists (i.e. AudioFiles.pack, built with
+        sample_pack.py), the notes are memory-mapped from it. Otherwise the audio files are read one by one."""
+
+        self.directory = directory
+        self.count = count
+
+        # Same path format as UkuleleChimes.notes, so either an index or a path may be used
+        self.paths = []
+        for i in range(0, count):
+            si = '%02d' % i
+            self.paths.append(f'{directory}/note_{si}.wav')
+        self.path_index = {path: i for i, path in enumerate(self.paths)}
+
+        self.sample_rate = None
+        self.pcm = [None] * count
+        self.sounds = [None] * count
+
+        # The pack is opened with the first note, and left as None if it can't be used
+        self.use_pack = use_pack
+        self.pack_path = pack_path_for(directory)
+        self.pack = None
+        self.pack_checked = not use_pack
+        self.pack_error = None
+
+        # Seconds spent reading and decoding the audio files
+        self.load_time = 0.0
+
+        self.lock = threading.Lock()
+
+    def index(self, note):
+        """A method to return the sample index of a note given as either an index or a file path."""
+
+        if isinstance(note, int):
+            return note
+        return self.path_index[note]
+
+    def load(self):
+        """A method to load every audio file at once (i.e. at startup)."""
+
+        for i in range(0, self.count):
+            self.samples(i)
+        return self
+
+    def samples(self, note):
+        """A method to return the PCM data of a note as an int16 numpy array of shape (frames, channels)."""
+
+        i = self.index(note)
+        pcm = self.pcm[i]
+        if pcm is None:
+            with self.lock:
+                pcm = self.pcm[i]
+                if pcm is None:
+                    if not self.pack_checked:
+                        self._open_pack()
+                    if self.pack is not None:
+                        pcm = self.pack.samples(i)
+                    else:
+                        pcm = self._read(i)
+                    self.pcm[i] = pcm
+        return pcm
+
+    def _open_pack(self):
+        """A method to open the pack, if there is one that matches the audio files."""
+
+        self.pack_checked = True
+        start = time.perf_counter()
+
+        try:
+            pack = SamplePack(self.pack_path)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            self.pack_error = str(error)
+            return
+
+        if pack.is_stale(self.paths):
+            self.pack_error = f'{self.pack_path} is out of date'
+            pack.close()
+            return
+
+        self.pack = pack
+        self.sample_rate = pack.sample_rate
+        self.load_time += time.perf_counter() - start
+
+    def sound(self, note):
+        """A method to return the pygame Sound for a note, creating it from memory the first time it is used."""
+
+        i = self.index(note)
+        sound = self.sounds[i]
+        if sound is None:
+            pcm = self.samples(i)
+            with self.lock:
+                sound = self.sounds[i]
+                if sound is None:
+                    start = time.perf_counter()
+                    if pygame.mixer.get_init() == (self.sample_rate, -16, pcm.shape[1]):
+                        sound = pygame.mixer.Sound(buffer=pcm)
+                    else:
+                        # The mixer runs at a different format, so let pygame convert the file
+                        sound = pygame.mixer.Sound(self.paths[i])
+                    self.load_time += time.perf_counter() - start
+                    self.sounds[i] = sound
+        return sound
+
+    def _read(self, i):
+        """A method to read a single audio file into memory."""
+
+        start = time.perf_counter()
+
+        with wave.open(self.paths[i], 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f'{self.paths[i]} is not a 16-bit audio file')
+            channels = wav.getnchannels()
+            rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+
+        if self.sample_rate is None:
+            self.sample_rate = rate
+        elif rate != self.sample_rate:
+            raise ValueError(f'{self.paths[i]} has a sample rate of {rate}, expected {self.sample_rate}')
+
+        pcm = numpy.frombuffer(frames, dtype='<i2').reshape(-1, channels)
+
+        self.load_time += time.perf_counter() - start
+
+        return pcm
+
+    def memory_usage(self):
+        """A method to return the number of bytes held by the bank."""
+
+        total = 0
+        for i in range(0, self.count):
+            if self.pcm[i] is not None and self.pack is None:
+                # Notes in the pack are mapped from the file, and shared with other processes, so they are not
+                # counted
+                total += self.pcm[i].nbytes
+            if self.sounds[i] is not None:
+                frequency, size, channels = pygame.mixer.get_init()
+                total += self.sounds[i].get_length() * frequency * channels * abs(size) // 8
+        return int(total)
+
+    def stats(self):
+        """A method to summarize how much of the bank is loaded, its size, and how long it took to load."""
+
+        return {'loaded': sum(pcm is not None for pcm in self.pcm),
+                'sounds': sum(sound is not None for sound in self.sounds),
+                'count': self.count,
+                'source': self.pack_path if self.pack is not None else self.directory,
+                'pack_error': self.pack_error,
+                'memory_bytes': self.memory_usage(),
+                'load_time': self.load_time}
@@ -0,0 +1,217 @@
+#! python3
+# sample_pack.py - Packs the audio files into a single file that is memory-mapped at runtime, so the notes are
+# read straight from the operating system's page cache (and shared by every process that opens the pack).
+
+"""
+
+    Usage:
+        python sample_pack.py                       Build AudioFiles.pack from AudioFiles/note_00.wav - note_23.wav
+        python sample_pack.py --check               Check that the pack matches the audio files
+
+    Layout (little-endian):
+        Header  - magic, version, count, sample rate, channels, sample width, alignment
+        Index   - for each note: data offset, frames, size and modification time of its audio file, file name
+        Data    - the 16-bit PCM of each note, each block starting on a multiple of the alignment
+
+"""
+
+import os
+import sys
+import time
+import wave
+import struct
+import argparse
+import numpy
+
+
+PACK_MAGIC = b'UKCHPACK'
+PACK_VERSION = 1
+
+HEADER = struct.Struct('<8sIIIHHI')
+ENTRY = struct.Struct('<QQQq48s')
+
+
+def pack_path_for(directory):
+    """A function to return where the pack for a folder of audio files is kept (i.e. AudioFiles.pack)."""
+
+    return os.path.normpath(directory) + '.pack'
+
+
+def align(offset, alignment):
+    """A function to round an offset up to the next multiple of the alignment."""
+
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def build_pack(paths, pack_path, alignment=4096):
+    """A function to pack a list of 16-bit audio files into one file. Every file must have the same sample rate
+    and number of channels. Returns the size of the pack in bytes."""
+
+    blocks = []
+    sample_rate = None
+    channels = None
+
+    for path in paths:
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f'{path} is not a 16-bit audio file')
+            if sample_rate is None:
+                sample_rate, channels = wav.getframerate(), wav.getnchannels()
+            elif (wav.getframerate(), wav.getnchannels()) != (sample_rate, channels):
+                raise ValueError(f'{path} does not have the same format as {paths[0]}')
+            frames = wav.getnframes()
+            data = wav.readframes(frames)
+
+        stat = os.stat(path)
+        blocks.append((path, frames, stat.st_size, stat.st_mtime_ns, data))
+
+    # The data starts after the header and the index
+    offset = align(HEADER.size + ENTRY.size * len(blocks), alignment)
+
+    index = []
+    for path, frames, size, mtime, data in blocks:
+        index.append(ENTRY.pack(offset, frames, size, mtime, os.path.basename(path).encode('utf-8')[:48]))
+        offset = align(offset + len(data), alignment)
+
+    temp_path = pack_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, len(blocks), sample_rate, channels, 2, alignment))
+        f.write(b''.join(index))
+        for (path, frames, size, mtime, data), entry in zip(blocks, index):
+            data_offset = ENTRY.unpack(entry)[0]
+            f.write(b'\0' * (data_offset - f.tell()))
+            f.write(data)
+        f.write(b'\0' * (align(f.tell(), alignment) - f.tell()))
+    os.replace(temp_path, pack_path)
+
+    return os.path.getsize(pack_path)
+
+
+class SamplePack:
+    """Overall class to memory-map a pack and return each note as a read-only view of it, without copying."""
+
+    def __init__(self, path):
+        """A method to open the pack and read its index. Raises ValueError if the file is not a valid pack."""
+
+        self.path = path
+
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f'{path} is not a sample pack')
+            magic, version, count, sample_rate, channels, width, alignment = HEADER.unpack(header)
+            if magic != PACK_MAGIC:
+                raise ValueError(f'{path} is not a sample pack')
+            if version != PACK_VERSION:
+                raise ValueError(f'{path} is version {version} of the sample pack format, expected {PACK_VERSION}')
+            if width != 2:
+                raise ValueError(f'{path} does not hold 16-bit samples')
+            index = f.read(ENTRY.size * count)
+
+        self.count = count
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.alignment = alignment
+
+        self.entries = []
+        for i in range(0, count):
+            offset, frames, size, mtime, name = ENTRY.unpack_from(index, i * ENTRY.size)
+            self.entries.append((offset, frames, size, mtime, name.rstrip(b'\0').decode('utf-8')))
+
+        # One mapping for the whole file. Pages are only read from disk when a note first touches them.
+        # The notes are handed out as plain arrays, so arithmetic on them does not produce memmap objects.
+        self.mapping = numpy.memmap(path, dtype='<i2', mode='r')
+        self.data = self.mapping.view(numpy.ndarray)
+
+        for offset, frames, size, mtime, name in self.entries:
+            if offset % 2 or (offset // 2) + frames * channels > len(self.data):
+                raise ValueError(f'{path} is truncated or damaged')
+
+    def names(self):
+        """A method to return the file name each note was packed from."""
+
+        return [entry[4] for entry in self.entries]
+
+    def samples(self, i):
+        """A method to return note i as a read-only int16 array of shape (frames, channels), backed by the file."""
+
+        offset, frames, size, mtime, name = self.entries[i]
+        start = offset // 2
+        return self.data[start:start + frames * self.channels].reshape(frames, self.channels)
+
+    def is_stale(self, paths):
+        """A method to check whether any of the audio files have changed since the pack was built.
+        Files that no longer exist are ignored, so the pack can be used on its own."""
+
+        for path, (offset, frames, size, mtime, name) in zip(paths, self.entries):
+            if os.path.basename(path) != name:
+                return True
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                return True
+        return len(paths) > self.count
+
+    def close(self):
+        """A method to release the mapping. Views returned by samples() must not be used afterwards."""
+
+        mapping = getattr(self.mapping, '_mmap', None)
+        self.data = None
+        self.mapping = None
+        if mapping is not None:
+            mapping.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack the audio files into a single memory-mapped file.')
+    parser.add_argument('--directory', default='AudioFiles', help='folder of audio files (default: AudioFiles)')
+    parser.add_argument('--count', type=int, default=24, help='number of notes (default: 24)')
+    parser.add_argument('-o', '--output', help='pack to write (default: <directory>.pack)')
+    parser.add_argument('--alignment', type=int, default=4096, help='alignment of each note, in bytes')
+    parser.add_argument('--check', action='store_true', help='check the pack against the audio files')
+    args = parser.parse_args(argv)
+
+    output = args.output or pack_path_for(args.directory)
+    paths = [os.path.join(args.directory, 'note_%02d.wav' % i) for i in range(0, args.count)]
+
+    if args.check:
+        pack = SamplePack(output)
+        if pack.is_stale(paths):
+            print(f'{output} is out of date, run this again without --check')
+            return 1
+        for i, path in enumerate(paths):
+            with wave.open(path, 'rb') as wav:
+                if wav.readframes(wav.getnframes()) != pack.samples(i).tobytes():
+                    print(f'{output} does not match {path}')
+                    return 1
+        print(f'{output} matches all {args.count} audio files')
+        return 0
+
+    start = time.perf_counter()
+    size = build_pack(paths, output, args.alignment)
+    build_time = time.perf_counter() - start
+
+    # Compare opening the pack (and touching every note) with reading the audio files one at a time
+    start = time.perf_counter()
+    pack = SamplePack(output)
+    for i in range(0, pack.count):
+        pack.samples(i).sum()
+    pack_time = time.perf_counter() - start
+    pack.close()
+
+    start = time.perf_counter()
+    for path in paths:
+        with wave.open(path, 'rb') as wav:
+            numpy.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2').sum()
+    wav_time = time.perf_counter() - start
+
+    print(f'Packed {args.count} notes into {output} ({size / 2 ** 20:.1f} MB) in {build_time:.2f} s')
+    print(f'Reading every note: {pack_time * 1000:.1f} ms from the pack, {wav_time * 1000:.1f} ms from the audio files')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
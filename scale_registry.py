@@ -0,0 +1,250 @@
+#! python3
+# scale_registry.py - Holds the scales from music_scales.json (or a scale file of the user's own) as immutable
+# records, checked when they are loaded, and indexed by key, display name, and number of modes.
+
+"""
+
+    A scale file is a json object with a "Scales" object, which maps each scale's key to
+        name        the display name, shown in the scale combo box (unique, ignoring case)
+        degrees     the semitones of the scale from 0 up to 12 (the octave), in ascending order
+        modes       the name of each mode, one for each degree below the octave
+        roots       the note names of the 12 roots for each mode, from "1" up, each one a root in roots.json
+        intervals   (optional) the name of the interval of each degree, i.e. "P1", "Maj2", ..., "P8"
+        mode_label  (optional) how the mode is shown in the scale label: "number" (", Mode 2", the default),
+                    "name" (its name from "modes", for scales whose modes take turns), or "none" (for scales
+                    whose modes are all the same)
+        spellings   (optional) for the modes that are spelled against the usual rules, the interval name of
+                    each semitone (1-11) that is spelled differently, i.e. {"3": {"8": "♯5"}}
+        marks       (optional) text shown in place of a note name (by its index, 0-12) for a mode and root
+                    (0-11), i.e. {"11": {"11": {"11": "♫"}}}
+
+"""
+
+import json
+from collections import namedtuple
+
+
+# How the mode of a scale is shown in the scale label (see "mode_label")
+MODE_LABELS = ('number', 'name', 'none')
+
+
+class Scale(namedtuple('Scale', ['key', 'name', 'degrees', 'modes', 'roots', 'intervals', 'mode_label', 'spellings',
+                                 'marks'])):
+    """Overall class for one scale. Every field is a string or a tuple, so a record can't be changed once it is
+    made. roots holds the 12 note names of each mode, starting with mode 1. spellings holds the (semitone,
+    interval name) pairs of each mode, and marks holds (mode, root, note index, text) for each mark."""
+
+    __slots__ = ()
+
+    @property
+    def mode_count(self):
+        """A method to return the number of modes of the scale."""
+
+        return len(self.modes)
+
+    def root_names(self, mode):
+        """A method to return the 12 note names of the roots of a mode (1 and up)."""
+
+        return self.roots[mode - 1]
+
+
+def check_scale(key, scale, root_names=None):
+    """A function to check one scale of a scale file. root_names, if given, holds the roots of roots.json that
+    the note names of the roots must be spelled as. Returns a list of the problems found."""
+
+    if not isinstance(scale, dict):
+        return [f'{key}: expected an object']
+
+    problems = []
+    if not isinstance(scale.get('name'), str) or not scale['name'].strip():
+        problems.append(f'{key}: "name" must be a non-empty string')
+
+    degrees = scale.get('degrees')
+    if (not isinstance(degrees, list) or len(degrees) < 2 or not all(type(degree) is int for degree in degrees)
+            or degrees[0] != 0 or degrees[-1] != 12 or degrees != sorted(set(degrees))):
+        problems.append(f'{key}: "degrees" must rise from 0 to 12, i.e. [0, 2, 4, 5, 7, 9, 11, 12]')
+        return problems
+
+    modes = scale.get('modes')
+    if not isinstance(modes, list) or len(modes) != len(degrees) - 1 or not all(isinstance(m, str) for m in modes):
+        problems.append(f'{key}: "modes" must name {len(degrees) - 1} modes, one for each degree below 12')
+        return problems
+
+    roots = scale.get('roots')
+    if not isinstance(roots, dict):
+        problems.append(f'{key}: "roots" must be an object')
+    else:
+        for mode in range(1, len(modes) + 1):
+            names = roots.get(str(mode))
+            if not isinstance(names, list) or len(names) != 12 or not all(isinstance(n, str) for n in names):
+                problems.append(f'{key}: "roots" must have 12 note names for mode {mode}')
+            elif root_names is not None:
+                for name in names:
+                    if name not in root_names:
+                        problems.append(f'{key}: "{name}" (mode {mode}) is not a root in roots.json')
+
+    intervals = scale.get('intervals')
+    if intervals is not None and (not isinstance(intervals, list) or len(intervals) != len(degrees)
+                                  or not all(isinstance(interval, str) for interval in intervals)):
+        problems.append(f'{key}: "intervals" must name {len(degrees)} intervals, one for each degree')
+
+    if scale.get('mode_label', 'number') not in MODE_LABELS:
+        problems.append(f'{key}: "mode_label" must be one of {", ".join(MODE_LABELS)}')
+
+    mode_keys = number_keys(1, len(modes))
+
+    spellings = scale.get('spellings', {})
+    if not isinstance(spellings, dict):
+        problems.append(f'{key}: "spellings" must be an object')
+    else:
+        for mode, names in spellings.items():
+            if (mode not in mode_keys or not isinstance(names, dict)
+                    or not all(semitone in number_keys(1, 11) and isinstance(name, str) and name
+                               for semitone, name in names.items())):
+                problems.append(f'{key}: "spellings" of mode {mode} must map semitones (1-11) to interval names')
+
+    marks = scale.get('marks', {})
+    if not isinstance(marks, dict):
+        problems.append(f'{key}: "marks" must be an object')
+    else:
+        for mode, by_root in marks.items():
+            if (mode not in mode_keys or not isinstance(by_root, dict)
+                    or not all(root in number_keys(0, 11) and isinstance(by_index, dict)
+                               and all(index in number_keys(0, 12) and isinstance(text, str)
+                                       for index, text in by_index.items())
+                               for root, by_index in by_root.items())):
+                problems.append(f'{key}: "marks" of mode {mode} must map roots (0-11) to note indexes (0-12) to text')
+
+    return problems
+
+
+def number_keys(first, last):
+    """A function to return the keys of a range of numbers in a scale file, i.e. "1" to "7"."""
+
+    return [str(number) for number in range(first, last + 1)]
+
+
+def check_scales(scale_data, root_names=None):
+    """A function to check every scale of a scale file, and that no two can be mistaken for each other.
+    root_names is the same as for check_scale. Returns a list of the problems found."""
+
+    scales = scale_data.get('Scales') if isinstance(scale_data, dict) else None
+    if not isinstance(scales, dict) or not scales:
+        return ['The file must have a "Scales" object with at least one scale']
+
+    problems = []
+    for key, scale in scales.items():
+        problems.extend(check_scale(key, scale, root_names))
+
+    # A name or key, ignoring case, must find exactly one scale
+    seen = {}
+    for key, scale in scales.items():
+        for text in {key.casefold(), str(scale.get('name', '')).casefold()} if isinstance(scale, dict) else ():
+            if text in seen and seen[text] != key:
+                problems.append(f'{key}: "{text}" is already the key or name of {seen[text]}')
+            seen.setdefault(text, key)
+
+    return problems
+
+
+def make_scale(key, scale):
+    """A function to make a Scale record from one scale of a scale file that has been checked."""
+
+    modes = tuple(scale['modes'])
+    roots = tuple(tuple(scale['roots'][str(mode)]) for mode in range(1, len(modes) + 1))
+    intervals = tuple(scale['intervals']) if 'intervals' in scale else None
+
+    spelled = scale.get('spellings', {})
+    spellings = tuple(tuple((int(semitone), name) for semitone, name in spelled.get(str(mode), {}).items())
+                      for mode in range(1, len(modes) + 1))
+    marks = tuple((int(mode), int(root), int(index), text)
+                  for mode, by_root in scale.get('marks', {}).items()
+                  for root, by_index in by_root.items()
+                  for index, text in by_index.items())
+
+    return Scale(key, scale['name'], tuple(scale['degrees']), modes, roots, intervals,
+                 scale.get('mode_label', 'number'), spellings, marks)
+
+
+class ScaleRegistry:
+    """Overall class to hold every scale, in the order of the scale file, and find one by its key, its display
+    name, or either one typed in any case, with a single dict lookup."""
+
+    def __init__(self, scale_data, root_names=None):
+        """A method to check the scales of a loaded scale file, and index them. root_names, if given, holds the
+        roots of roots.json (see check_scale). Raises ValueError, listing every problem, if the file is not valid."""
+
+        problems = check_scales(scale_data, root_names)
+        if problems:
+            raise ValueError('Invalid scale file:\n    ' + '\n    '.join(problems))
+
+        self.scales = tuple(make_scale(key, scale) for key, scale in scale_data['Scales'].items())
+
+        self.by_key = {scale.key: scale for scale in self.scales}
+        self.by_name = {scale.name: scale for scale in self.scales}
+
+        # Keys and names folded to lower case, for text typed by the user (i.e. "kumoi" or "major pentatonic")
+        self.by_text = {}
+        for scale in self.scales:
+            self.by_text[scale.key.casefold()] = scale
+            self.by_text[scale.name.casefold()] = scale
+
+        # Number of modes -> the scales with that many
+        self.by_mode_count = {}
+        for scale in self.scales:
+            self.by_mode_count[scale.mode_count] = self.by_mode_count.get(scale.mode_count, ()) + (scale,)
+
+    @classmethod
+    def load(cls, path='music_scales.json', roots_path='roots.json'):
+        """A method to load and check a scale file, against the roots of roots_path if it is not None."""
+
+        root_names = None
+        if roots_path is not None:
+            with open(roots_path, encoding='utf-8') as f:
+                root_names = json.load(f)["Roots"]
+
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), root_names)
+
+    def __len__(self):
+        return len(self.scales)
+
+    def __iter__(self):
+        return iter(self.scales)
+
+    def __contains__(self, key):
+        return key in self.by_key
+
+    def __getitem__(self, key):
+        """A method to return the scale with the given key. Raises KeyError if there is no such scale."""
+
+        return self.by_key[key]
+
+    def keys(self):
+        """A method to return the keys of every scale, in the order of the scale file."""
+
+        return tuple(self.by_key)
+
+    def names(self):
+        """A method to return the display names of every scale, in the order of the scale file."""
+
+        return tuple(self.by_name)
+
+    def from_name(self, name):
+        """A method to return the scale with the given display name (i.e. from the scale combo box), or None."""
+
+        return self.by_name.get(name)
+
+    def find(self, text):
+        """A method to find a scale from either its key or its name, in any case (i.e. 'major_pentatonic' or
+        'Major Pentatonic'). Raises ValueError if there is no such scale."""
+
+        scale = self.by_text.get(str(text).strip().casefold())
+        if scale is None:
+            raise ValueError(f'Unknown scale: {text}')
+        return scale
+
+    def with_mode_count(self, count):
+        """A method to return every scale with the given number of modes."""
+
+        return self.by_mode_count.get(count, ())
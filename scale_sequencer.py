@@ -0,0 +1,92 @@
+#! python3
+# scale_sequencer.py - Plays a sequence of notes (i.e. the current scale) at a steady tempo.
+# Every step is timed against the scheduler's clock, so the GUI thread never sleeps and the timing does not drift.
+
+import math
+
+
+class ScaleSequencer:
+    """Overall class to queue the steps of a sequence on the event scheduler and measure how evenly they play."""
+
+    def __init__(self, scheduler, tempo=60, tag='scale'):
+        """A method to set up the sequencer. The tempo is in beats (notes) per minute."""
+
+        self.scheduler = scheduler
+        self.tag = tag
+        self.set_tempo(tempo)
+
+        # Each call to play() starts a new run, so steps left over from an earlier run can be told apart
+        self.run = 0
+        self.step_count = 0
+        self.start = None
+        self.fire_times = []
+
+    def set_tempo(self, tempo):
+        """A method to change the tempo used by the next call to play()."""
+
+        if tempo <= 0:
+            raise ValueError('The tempo must be greater than 0')
+        self.tempo = tempo
+
+    def beat(self):
+        """A method to return the length of one step, in seconds."""
+
+        return 60 / self.tempo
+
+    def play(self, steps, fcn, lead=0.0):
+        """A method to call fcn(*args) for each args in steps, one beat apart. Any run in progress is stopped."""
+
+        self.stop()
+
+        self.run += 1
+        self.step_count = len(steps)
+        self.fire_times = []
+
+        beat = self.beat()
+        self.start = self.scheduler.clock() + lead
+
+        for i, args in enumerate(steps):
+            deadline = self.start + i * beat
+            self.scheduler.schedule_at(deadline, self._step, (self.run, deadline, fcn, args), tag=self.tag)
+
+    def stop(self):
+        """A method to drop every step that has not played yet."""
+
+        self.scheduler.cancel(self.tag)
+
+    def is_playing(self):
+        """A method to check whether any steps are still waiting to play."""
+
+        return self.scheduler.pending(self.tag) > 0
+
+    def _step(self, run, deadline, fcn, args):
+        """A method to play a single step, and record when it actually played."""
+
+        if run != self.run:
+            return
+
+        self.fire_times.append((deadline, self.scheduler.clock()))
+        fcn(*args)
+
+    def stats(self):
+        """A method to report the timing of the latest run. All times are in seconds.
+
+        Lateness is how long after its deadline each step played. Jitter is the standard deviation of the
+        time between steps, compared to the beat."""
+
+        fire_times = list(self.fire_times)
+        lateness = [actual - deadline for deadline, actual in fire_times]
+
+        beat = self.beat()
+        gaps = [fire_times[i][1] - fire_times[i - 1][1] - beat for i in range(1, len(fire_times))]
+        if gaps:
+            jitter = math.sqrt(sum(gap * gap for gap in gaps) / len(gaps))
+        else:
+            jitter = 0.0
+
+        return {'tempo': self.tempo,
+                'steps': self.step_count,
+                'played': len(fire_times),
+                'lateness_mean': sum(lateness) / len(lateness) if lateness else 0.0,
+                'lateness_max': max(lateness) if lateness else 0.0,
+                'jitter': jitter}
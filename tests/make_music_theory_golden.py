@@ -0,0 +1,110 @@
+#! python3
+# make_music_theory_golden.py - Writes music_theory_golden.json: every scale/mode/root worked out by the window's
+# own methods as they were before they were ported to music_theory.py, so the port can be checked against them.
+
+"""
+
+    Usage:
+        python tests/make_music_theory_golden.py                 Use the window from the commit recorded in the
+                                                                 golden file (its "rev"), to write it again
+        python tests/make_music_theory_golden.py --rev <commit>  Use the window from another commit
+
+    The window class is loaded from git (it is only defined, never shown), and its mode_finder,
+    mode_interval_finder, scale_note_finder, update_current_scale_label, and update_current_drones methods are
+    run on a fresh stand-in for the window for every entry, with the scale and root files from the same commit.
+
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from types import SimpleNamespace
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_PATH = os.path.join(ROOT, 'music_theory_golden.json')
+
+
+class Label:
+    """Overall class to stand in for a QLabel, holding its text."""
+
+    def __init__(self, text=''):
+        self.value = text
+
+    def text(self):
+        return self.value
+
+    def setText(self, text):
+        self.value = text
+
+
+def git_show(rev, path):
+    """A function to read a file as it was at a commit."""
+
+    return subprocess.run(['git', 'show', f'{rev}:{path}'], cwd=ROOT, check=True, capture_output=True).stdout
+
+
+def old_entry(window_class, scale, mode, root, roots):
+    """A function to work out one scale/mode/root with the old window's methods. Returns [degrees, intervals,
+    display notes, label, fifth degree]."""
+
+    window = SimpleNamespace(current_scale=scale, current_mode=mode, root=root, roots=roots, mode_degrees=[],
+                             mode_intervals=[], current_display_notes=[], current_scale_label=Label(),
+                             drone_label_00=Label(), drone_label_01=Label())
+
+    # The drone methods read the note labels and note set, so each one names its own degree
+    for i in range(0, 13):
+        setattr(window, 'note_%02d_label' % i, Label(str(i)))
+    window.current_note_set = [{'drone': i} for i in range(0, 13)]
+
+    window_class.mode_finder(window)
+    window_class.mode_interval_finder(window)
+    window_class.scale_note_finder(window)
+    window_class.update_current_scale_label(window)
+    window_class.update_current_drones(window)
+
+    return [window.mode_degrees, window.mode_intervals, window.current_display_notes, window.label,
+            window.drone_5th]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write the golden music theory table from the old window.')
+    parser.add_argument('--rev', default=None,
+                        help='commit to take the window from (default: the "rev" recorded in the golden file)')
+    parser.add_argument('-o', '--output', default=GOLDEN_PATH)
+    args = parser.parse_args(argv)
+
+    # The golden file records the commit it was made from, which stays the same however the history is cloned
+    rev = args.rev
+    if rev is None:
+        with open(GOLDEN_PATH, encoding='utf-8') as f:
+            rev = json.load(f)['rev']
+
+    namespace = {'__name__': 'old_ukulele_chimes'}
+    exec(compile(git_show(rev, 'Ukulele_Chimes.py'), 'Ukulele_Chimes.py', 'exec'), namespace)
+    window_class = namespace['UkuleleChimes']
+
+    scales = json.loads(git_show(rev, 'music_scales.json'))['Scales']
+    roots = json.loads(git_show(rev, 'roots.json'))['Roots']
+
+    entries = {}
+    for key, scale in scales.items():
+        for mode in range(1, len(scale['modes']) + 1):
+            entries.setdefault(key, {})[str(mode)] = [old_entry(window_class, scale, mode, root, roots)
+                                                     for root in range(0, 12)]
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'rev': rev, 'entries': entries}, f, ensure_ascii=False, separators=(',', ':'))
+        f.write('\n')
+
+    count = sum(len(rows) for modes in entries.values() for rows in modes.values())
+    print(f'{count} entries from {rev[:12]} written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
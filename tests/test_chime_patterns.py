@@ -0,0 +1,86 @@
+#! python3
+# test_chime_patterns.py - Checks that a seeded chime plays the same pattern every time, however it is taken (in
+# one go, or a block at a time as the live chime does), for every wind model.
+
+import os
+import sys
+import unittest
+import numpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chime_patterns import ChimePattern, WIND_MODELS
+
+DEGREES = (0, 2, 4, 5, 7, 9, 11, 12)
+
+
+def take_in_blocks(pattern, until, block, degrees=DEGREES):
+    """A function to take a pattern a block of seconds at a time. Returns the times, degrees, and velocities
+    joined together."""
+
+    parts = [pattern.take(end, degrees) for end in numpy.arange(block, until + block / 2, block)]
+    return tuple(numpy.concatenate([part[i] for part in parts]) for i in range(0, 3))
+
+
+class ChimePatternTest(unittest.TestCase):
+    """Overall class to generate the chime from seeds, with each wind model."""
+
+    def assertSamePattern(self, first, second, msg=None):
+        for a, b in zip(first, second):
+            numpy.testing.assert_array_equal(a, b, err_msg=str(msg))
+
+    def test_the_same_seed_plays_the_same_pattern(self):
+        for model in WIND_MODELS:
+            first = ChimePattern(model, seed=7).take(600, DEGREES)
+            second = ChimePattern(model, seed=7).take(600, DEGREES)
+            self.assertGreater(len(first[0]), 0, model)
+            self.assertSamePattern(first, second, model)
+
+    def test_another_seed_plays_another_pattern(self):
+        for model in WIND_MODELS:
+            first = ChimePattern(model, seed=7).take(600, DEGREES)
+            second = ChimePattern(model, seed=8).take(600, DEGREES)
+            self.assertFalse(len(first[0]) == len(second[0]) and numpy.array_equal(first[0], second[0]), model)
+
+    def test_blocks_play_the_same_pattern_as_one_take(self):
+        for model in WIND_MODELS:
+            whole = ChimePattern(model, seed=3).take(300, DEGREES)
+            blocks = take_in_blocks(ChimePattern(model, seed=3), 300, 0.5)
+            self.assertSamePattern(whole, blocks, model)
+
+    def test_notes_are_in_order_and_in_range(self):
+        for model in WIND_MODELS:
+            pattern = ChimePattern(model, seed=11)
+            pattern.take(100, DEGREES)
+            times, notes, velocities = pattern.take(200, DEGREES)
+            self.assertTrue(numpy.all(numpy.diff(times) >= 0), model)
+            self.assertTrue(numpy.all((times >= 100) & (times < 200)), model)
+            self.assertTrue(set(notes.tolist()) <= set(DEGREES), model)
+            self.assertTrue(numpy.all((velocities > 0) & (velocities <= 1)), model)
+
+    def test_rounds_play_every_degree_once(self):
+        times, notes, velocities = ChimePattern('rounds', seed=5).take(30, DEGREES)
+        first_round = sorted(notes[:len(DEGREES)].tolist())
+        self.assertEqual(first_round, list(DEGREES))
+        self.assertTrue(numpy.all(velocities == 1))
+
+    def test_a_new_scale_carries_on_from_the_last_note_taken(self):
+        pattern = ChimePattern('uniform', seed=2)
+        pattern.take(10, DEGREES)
+        times, notes, velocities = pattern.take(20, (0, 3, 7, 12))
+        self.assertTrue(numpy.all(times >= 10))
+        self.assertTrue(set(notes.tolist()) <= {0, 3, 7, 12})
+
+        # And the same changes of scale, made the same way, give the same notes
+        again = ChimePattern('uniform', seed=2)
+        again.take(10, DEGREES)
+        self.assertSamePattern(again.take(20, (0, 3, 7, 12)), (times, notes, velocities))
+
+    def test_unknown_model(self):
+        with self.assertRaises(ValueError):
+            ChimePattern('hurricane')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+#! python3
+# test_event_log.py - Checks that an event log reads back exactly what was written to it, including text that
+# spans records and a log cut short, and that playing its settings back rebuilds the state it was recorded from.
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from event_log import (EventLogWriter, LogEvent, RECORD, HEADER, KINDS, read_events, read_header, group_events,
+                       apply_event, summarize)
+from chime_state import ChimeState
+from event_scheduler import ManualClock
+
+
+class EventLogTest(unittest.TestCase):
+    """Overall class to write logs to a temporary directory and read them back."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'session.uclog')
+        self.clock = ManualClock(100.0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_session(self):
+        """A method to record a short session: a snapshot, notes from each source, and a change of every kind."""
+
+        writer = EventLogWriter(self.path, clock=self.clock)
+        state = ChimeState(root=2, scale='ionian_♭5', mode=3, volumes=[7] * 13, drone_volumes=[4, 0], octave=-1,
+                           tuning='just', detune=12.3)
+        writer.snapshot(state)
+
+        self.clock.advance(0.5)
+        writer.note(17, 0.75, 'key')
+        self.clock.advance(0.25)
+        writer.release(17)
+        writer.chime(True, 'gusty')
+        self.clock.advance(1.0)
+        writer.note(30, 0.5, 'chime')
+        writer.setting('scale', None, 'bebop_locrian_♮2')
+        writer.setting('mode', None, 1)
+        writer.setting('volumes', 4, 10)
+        writer.setting('drone_volumes', 1, 6)
+        writer.chime(False, 'gusty')
+        writer.close()
+        return writer
+
+    def test_round_trip(self):
+        writer = self.write_session()
+        events = list(read_events(self.path))
+
+        self.assertEqual(events[:6], [LogEvent(0.0, 'root', 0, 2, 0.0),
+                                      LogEvent(0.0, 'scale', 0, 'ionian_♭5', 0.0),
+                                      LogEvent(0.0, 'mode', 0, 3, 0.0),
+                                      LogEvent(0.0, 'octave', 0, -1, 0.0),
+                                      LogEvent(0.0, 'tuning', 0, 'just', 0.0),
+                                      LogEvent(0.0, 'detune', 0, 0, 12.3)])
+        self.assertEqual([event.kind for event in events[6:21]], ['volume'] * 13 + ['drone'] * 2)
+        self.assertEqual(events[21:], [LogEvent(0.5, 'note', 'key', 17, 0.75),
+                                       LogEvent(0.75, 'release', 'key', 17, 0.0),
+                                       LogEvent(0.75, 'chime', 1, 'gusty', 0.0),
+                                       LogEvent(1.75, 'note', 'chime', 30, 0.5),
+                                       LogEvent(1.75, 'scale', 0, 'bebop_locrian_♮2', 0.0),
+                                       LogEvent(1.75, 'mode', 0, 1, 0.0),
+                                       LogEvent(1.75, 'volume', 4, 10, 0.0),
+                                       LogEvent(1.75, 'drone', 1, 6, 0.0),
+                                       LogEvent(1.75, 'chime', 0, 'gusty', 0.0),
+                                       LogEvent(1.75, 'end', 0, 0, 0.0)])
+
+        # Every record and name is counted in the size, and each name is written once
+        self.assertEqual(writer.stats()['bytes'], os.path.getsize(self.path))
+        self.assertEqual(writer.count, len(events))
+        self.assertEqual(len(writer.names), 4)
+
+    def test_a_log_cut_short_reads_to_its_last_whole_record(self):
+        self.write_session()
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) - RECORD.size - 5)
+
+        events = list(read_events(self.path))
+        self.assertEqual(events[-1], LogEvent(1.75, 'drone', 1, 6, 0.0))
+        summary = summarize(self.path)
+        self.assertFalse(summary['complete'])
+        self.assertEqual(summary['notes'], {'key': 1, 'chime': 1})
+        self.assertEqual(summary['seconds'], 1.75)
+
+    def test_unknown_kinds_are_skipped(self):
+        self.write_session()
+        with open(self.path, 'ab') as f:
+            f.write(RECORD.pack(2.0, max(KINDS.values()) + 1, 0, 0, 0.0))
+            f.write(RECORD.pack(2.5, KINDS['note'], 9, 12, 0.25))
+        self.assertEqual(list(read_events(self.path))[-2:], [LogEvent(1.75, 'end', 0, 0, 0.0),
+                                                             LogEvent(2.5, 'note', 'other', 12, 0.25)])
+
+    def test_not_a_log(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'RIFF' + bytes(HEADER.size))
+        with self.assertRaises(ValueError):
+            list(read_events(self.path))
+        with open(os.devnull, 'rb') as f, self.assertRaises(ValueError):
+            read_header(f)
+
+    def test_playing_the_settings_back_rebuilds_the_state(self):
+        self.write_session()
+        state = ChimeState()
+        for group in group_events(read_events(self.path)):
+            for event in group:
+                apply_event(state, event)
+
+        self.assertEqual((state.root, state.scale, state.mode, state.octave, state.tuning, state.detune),
+                         (2, 'bebop_locrian_♮2', 1, -1, 'just', 12.3))
+        self.assertEqual(state.volumes, [7] * 4 + [10] + [7] * 8)
+        self.assertEqual(state.drone_volumes, [4, 6])
+
+    def test_settings_changed_together_are_grouped(self):
+        self.write_session()
+        groups = [[event.kind for event in group] for group in group_events(read_events(self.path))]
+        self.assertEqual(len(groups[0]), 21)
+        self.assertEqual(groups[1:], [['note'], ['release'], ['chime'], ['note'],
+                                      ['scale', 'mode', 'volume', 'drone', 'chime', 'end']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#! python3
+# test_event_scheduler.py - Checks that cancelling a tag drops its queued events, and (through the cancel marks)
+# the ones already handed to a worker, while events scheduled after the cancel still run.
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from event_scheduler import EventScheduler, ManualClock
+
+
+def wait_for(condition, timeout=5.0):
+    """A function to poll condition until it is true, or fail after timeout seconds."""
+
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            raise AssertionError('Timed out')
+        time.sleep(0.001)
+
+
+class CancelTest(unittest.TestCase):
+    """Overall class to cancel events on a ManualClock, run with run_due."""
+
+    def setUp(self):
+        self.clock = ManualClock()
+        self.scheduler = EventScheduler(clock=self.clock)
+        self.fired = []
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def add(self, delay, name, tag):
+        return self.scheduler.schedule(delay, self.fired.append, (name,), tag=tag)
+
+    def test_cancel_drops_only_its_tag(self):
+        for i in range(0, 3):
+            self.add(i, f'chime{i}', 'chime')
+            self.add(i + 0.5, f'scale{i}', 'scale')
+
+        self.assertEqual(self.scheduler.cancel('chime'), 3)
+        self.assertEqual(self.scheduler.cancel('chime'), 0)
+        self.assertEqual(self.scheduler.pending('chime'), 0)
+        self.assertEqual(self.scheduler.pending('scale'), 3)
+
+        self.clock.advance(10)
+        self.assertEqual(self.scheduler.run_due(), 3)
+        self.assertEqual(self.fired, ['scale0', 'scale1', 'scale2'])
+        self.assertEqual(self.scheduler.stats()['cancelled'], 3)
+
+    def test_events_scheduled_after_a_cancel_still_run(self):
+        self.add(1, 'before', 'chime')
+        self.scheduler.cancel('chime')
+        self.add(1, 'after', 'chime')
+
+        self.clock.advance(1)
+        self.scheduler.run_due()
+        self.assertEqual(self.fired, ['after'])
+
+    def test_cancel_marks_drop_events_already_taken_from_the_queue(self):
+        sequence = self.add(0, 'taken', 'chime')
+        self.scheduler.cancel('chime')
+
+        # As if the scheduling thread had popped the event just before the cancel, and a worker runs it after
+        self.scheduler.in_flight += 1
+        self.scheduler._fire(0.0, 'chime', self.fired.append, ('taken',), None, sequence)
+        self.assertEqual(self.fired, [])
+        self.assertEqual(self.scheduler.stats()['in_flight'], 0)
+
+
+class WorkerCancelTest(unittest.TestCase):
+    """Overall class to cancel an event that is waiting for a busy worker on a running scheduler."""
+
+    def test_cancel_reaches_an_event_waiting_for_a_worker(self):
+        scheduler = EventScheduler(workers=1).start()
+        release = threading.Event()
+        fired = []
+
+        # The only worker is held, so the next event waits for it once it is due
+        scheduler.schedule(0, release.wait, (5.0,), tag='hold')
+        scheduler.schedule(0, fired.append, ('late',), tag='chime')
+        wait_for(lambda: scheduler.pending() == 0)
+
+        self.assertEqual(scheduler.cancel('chime'), 0)
+        release.set()
+        wait_for(lambda: scheduler.stats()['in_flight'] == 0)
+
+        self.assertEqual(fired, [])
+        self.assertEqual(scheduler.stats()['cancelled'], 1)
+        self.assertEqual(scheduler.stats()['fired'], 1)
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
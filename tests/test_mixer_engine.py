@@ -0,0 +1,109 @@
+#! python3
+# test_mixer_engine.py - Checks which voice the mixer steals when every voice is busy, and that the drones keep
+# their voices while the root dial is spun through a crossfade after crossfade.
+
+import os
+import sys
+import unittest
+import numpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Run without a sound device. Set before pygame is imported.
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from mixer_engine import MixerEngine
+from sample_bank import SampleBank
+from music_theory import TheoryTable
+from chime_state import ChimeState
+from chime_session import ChimeSession
+from event_scheduler import ManualClock
+
+
+def note(frames=44100):
+    """A function to make a second of a quiet tone, shaped (frames, 2)."""
+
+    return numpy.full((frames, 2), 100.0, dtype=numpy.float32)
+
+
+class VoiceStealingTest(unittest.TestCase):
+    """Overall class to check the voice picked by _steal, for both policies."""
+
+    def test_oldest_note_is_stolen_before_a_drone(self):
+        engine = MixerEngine(voices=4)
+        drone = engine.trigger(note(), loop=True)
+        notes = [engine.trigger(note()) for i in range(0, 3)]
+        voice = engine.trigger(note())
+        self.assertEqual(voice, notes[0])
+        self.assertTrue(engine.looping[drone])
+        self.assertEqual(engine.stolen, 1)
+
+    def test_releasing_drone_is_stolen_before_a_note(self):
+        engine = MixerEngine(voices=4)
+        old = engine.trigger(note(), loop=True)
+        live = engine.trigger(note(), loop=True)
+        for i in range(0, 2):
+            engine.trigger(note())
+        engine.release(old, fade=0.5)
+        self.assertEqual(engine.trigger(note()), old)
+        self.assertTrue(engine.looping[live])
+
+    def test_quietest_skips_live_drones(self):
+        engine = MixerEngine(voices=3, steal='quietest')
+        drone = engine.trigger(note(), gain=0.0, loop=True)
+        loud = engine.trigger(note(), gain=1.0)
+        quiet = engine.trigger(note(), gain=0.5)
+        self.assertEqual(engine.trigger(note()), quiet)
+        self.assertTrue(engine.active[drone] and engine.active[loud])
+
+    def test_drones_are_stolen_when_every_voice_is_one(self):
+        engine = MixerEngine(voices=2)
+        first = engine.trigger(note(), loop=True)
+        engine.trigger(note(), loop=True)
+        self.assertEqual(engine.trigger(note()), first)
+
+
+class DroneCrossfadeTest(unittest.TestCase):
+    """Overall class to spin the root dial faster than the drones can crossfade."""
+
+    @classmethod
+    def setUpClass(cls):
+        pygame.mixer.init()
+        cls.theory = TheoryTable.load(os.path.join(ROOT, 'music_scales.json'), os.path.join(ROOT, 'roots.json'),
+                                      None, lazy=True)
+        cls.sample_bank = SampleBank(os.path.join(ROOT, 'AudioFiles'), 24).load()
+
+    @classmethod
+    def tearDownClass(cls):
+        pygame.mixer.quit()
+
+    def test_spinning_the_root_keeps_both_drones(self):
+        session = ChimeSession(self.sample_bank, self.theory, ChimeState(drone_volumes=[5, 5]), clock=ManualClock(),
+                               realtime=False)
+        session.apply()
+        session.advance(1.0)
+
+        # Twelve steps at 20 ms start 24 drones, each fading in while the last fades out, on 16 voices
+        for i in range(0, 12):
+            session.state.set('root', (session.state.root + 1) % 12)
+            session.apply()
+            session.advance(0.02)
+            session.play_note(i, 1.0, 'chime')
+
+        engine = session.mixer_engine
+        self.assertNotEqual(session.drone_first[0], session.drone_second[0])
+        for voice, started in (session.drone_first, session.drone_second):
+            self.assertEqual(engine.started[voice], started)
+
+        # Once the old drones have faded out, both drones are still playing
+        session.advance(1.0)
+        self.assertEqual(int(numpy.count_nonzero(engine.active & engine.looping)), 2)
+        self.assertEqual(len(session.status()['drone_frequencies']), 2)
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+#! python3
+# test_music_theory.py - Checks the compiled music theory table, and the cache it is saved to, against the golden
+# table worked out by the original window's methods (see make_music_theory_golden.py).
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from music_theory import TheoryTable, load_golden
+
+
+class TheoryTableTest(unittest.TestCase):
+    """Overall class to compare every scale/mode/root with the golden table."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.golden = load_golden(os.path.join(ROOT, 'music_theory_golden.json'))
+
+    def load(self, cache_path=None):
+        return TheoryTable.load(os.path.join(ROOT, 'music_scales.json'), os.path.join(ROOT, 'roots.json'), cache_path)
+
+    def test_every_entry_is_in_the_golden_table(self):
+        table = self.load()
+        self.assertEqual(set(table.entries), set(self.golden))
+
+    def test_compiled_table_matches_golden(self):
+        self.assertEqual(self.load().validate(self.golden), [])
+
+    def test_cached_table_matches_golden(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = os.path.join(directory, 'music_theory_cache.json')
+            self.load(cache_path)
+            table = self.load(cache_path)
+            self.assertTrue(table.from_cache)
+            self.assertEqual(table.validate(self.golden), [])
+
+    def test_a_wrong_entry_is_found(self):
+        table = self.load()
+        key = ('major', 1, 5)
+        table.entries[key] = table.entries[key]._replace(fifth=6)
+        self.assertEqual(table.validate(self.golden), [key])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#! python3
+# test_pitch_shifter.py - Checks that notes resampled up by one to three octaves (or a few cents past them) don't
+# alias: a tone above the new Nyquist frequency comes out as near silence, while a tone below it keeps its level.
+
+import os
+import sys
+import math
+import unittest
+import numpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pitch_shifter import resample
+
+# The most a tone above the new Nyquist frequency may be heard at, and how far a tone below it may drift, in dB
+ALIASING_LIMIT = -60
+PASSBAND_RIPPLE = 1.0
+
+
+def tone(frequency, frames=44100):
+    """A function to make a stereo int16 sine at frequency (in cycles per frame), shaped (frames, 2)."""
+
+    wave = 10000 * numpy.sin(2 * math.pi * frequency * numpy.arange(frames))
+    return numpy.repeat(numpy.rint(wave).astype(numpy.int16)[:, numpy.newaxis], 2, axis=1)
+
+
+def level(samples):
+    """A function to measure the middle half of samples against full scale, in dB, leaving out the filter's
+    ringing where the tone starts and stops."""
+
+    frames = len(samples)
+    middle = samples[frames // 4:3 * frames // 4].astype(numpy.float64)
+    return 20 * math.log10(max(math.sqrt(numpy.mean(middle ** 2)), 1e-9) / 32768)
+
+
+class ResampleTest(unittest.TestCase):
+    """Overall class to resample tones above and below the new Nyquist frequency."""
+
+    RATIOS = (2, 4, 8, 2 ** (37 / 12))
+
+    def test_length(self):
+        for ratio in self.RATIOS + (0.5, 2 ** (-1 / 12)):
+            samples = tone(0.01, 1000)
+            self.assertEqual(len(resample(samples, ratio)), int(999 / ratio) + 1)
+
+    def test_tones_above_the_new_nyquist_do_not_alias(self):
+        for ratio in self.RATIOS:
+            nyquist = 0.5 / ratio
+            for frequency in (nyquist * 1.1, nyquist * 1.5, min(nyquist * 3, 0.45)):
+                samples = tone(frequency)
+                aliased = level(resample(samples, ratio)) - level(samples)
+                self.assertLess(aliased, ALIASING_LIMIT, (ratio, frequency))
+
+    def test_tones_below_the_new_nyquist_keep_their_level(self):
+        for ratio in self.RATIOS:
+            samples = tone(0.2 / ratio)
+            self.assertLess(abs(level(resample(samples, ratio)) - level(samples)), PASSBAND_RIPPLE, ratio)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#! python3
+# test_scale_registry.py - Checks that bad scale files are turned away with every problem listed, and that a scale
+# file of the user's own, with degrees the built-in scales don't have, compiles into a usable table.
+
+import os
+import sys
+import json
+import copy
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scale_registry import ScaleRegistry, check_scales
+from music_theory import TheoryTable
+
+
+def user_scale(degrees, root='C'):
+    """A function to make one scale of a scale file, with every mode on the same root."""
+
+    modes = [f'Mode {mode}' for mode in range(1, len(degrees))]
+    roots = {str(mode): [root] * 12 for mode in range(1, len(degrees))}
+    return {'name': 'Mine', 'degrees': degrees, 'modes': modes, 'roots': roots}
+
+
+class ScaleRegistryTest(unittest.TestCase):
+    """Overall class to load good and bad scale files."""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(ROOT, 'music_scales.json'), encoding='utf-8') as f:
+            cls.scale_data = json.load(f)
+        with open(os.path.join(ROOT, 'roots.json'), encoding='utf-8') as f:
+            cls.root_data = json.load(f)
+        cls.roots = cls.root_data['Roots']
+
+    def check(self, scales):
+        return check_scales({'Scales': scales}, self.roots)
+
+    def test_built_in_scales_are_valid(self):
+        self.assertEqual(check_scales(self.scale_data, self.roots), [])
+        registry = ScaleRegistry(self.scale_data, self.roots)
+        self.assertEqual(registry.find('MAJOR PENTATONIC').key, 'major_pentatonic')
+        self.assertEqual(len(registry.with_mode_count(7)), 15)
+
+    def test_bad_degrees(self):
+        for degrees in ([0, 12, 7], [2, 4, 12], [0, 4, 11], [0], [0, 4.0, 12], [0, 4, 4, 12]):
+            scale = user_scale([0, 4, 12])
+            scale['degrees'] = degrees
+            self.assertEqual(len(self.check({'mine': scale})), 1, degrees)
+
+    def test_wrong_number_of_modes_and_roots(self):
+        scale = user_scale([0, 4, 7, 12])
+        scale['modes'].pop()
+        self.assertIn('"modes" must name 3 modes', self.check({'mine': scale})[0])
+
+        scale = user_scale([0, 4, 7, 12])
+        scale['roots']['2'] = ['C'] * 11
+        self.assertEqual(self.check({'mine': scale}), ['mine: "roots" must have 12 note names for mode 2'])
+
+    def test_misspelled_root(self):
+        scale = user_scale([0, 4, 7, 12])
+        scale['roots']['3'][5] = 'H'
+        self.assertEqual(self.check({'mine': scale}), ['mine: "H" (mode 3) is not a root in roots.json'])
+        with self.assertRaises(ValueError):
+            ScaleRegistry({'Scales': {'mine': scale}}, self.roots)
+
+    def test_names_that_can_be_mistaken(self):
+        scales = {'mine': user_scale([0, 4, 12]), 'MINE': user_scale([0, 5, 12])}
+        scales['MINE']['name'] = 'Other'
+        self.assertEqual(self.check(scales), ['MINE: "mine" is already the key or name of mine'])
+
+    def test_every_problem_is_listed(self):
+        scales = copy.deepcopy(self.scale_data['Scales'])
+        scales['major']['roots']['1'][0] = 'Q'
+        scales['minor']['modes'] = []
+        scales['kumoi']['name'] = ''
+        with self.assertRaises(ValueError) as raised:
+            ScaleRegistry({'Scales': scales}, self.roots)
+        self.assertEqual(str(raised.exception).count('\n'), 3)
+        self.assertEqual(self.check({}), ['The file must have a "Scales" object with at least one scale'])
+
+    def test_bad_spellings_marks_and_mode_label(self):
+        scale = user_scale([0, 4, 7, 12])
+        scale['mode_label'] = 'roman'
+        scale['spellings'] = {'1': {'12': '8'}, '4': {'4': '♭4'}}
+        scale['marks'] = {'2': {'12': {'0': '♫'}}}
+        self.assertEqual(self.check({'mine': scale}),
+                         ['mine: "mode_label" must be one of number, name, none',
+                          'mine: "spellings" of mode 1 must map semitones (1-11) to interval names',
+                          'mine: "spellings" of mode 4 must map semitones (1-11) to interval names',
+                          'mine: "marks" of mode 2 must map roots (0-11) to note indexes (0-12) to text'])
+
+    def test_facts_are_in_the_records(self):
+        registry = ScaleRegistry(self.scale_data, self.roots)
+        self.assertEqual(registry['whole_tone'].mode_label, 'none')
+        self.assertEqual(registry['augmented'].mode_label, 'name')
+        self.assertEqual(registry['major'].mode_label, 'number')
+        self.assertEqual(registry['pelog'].spellings[3], ((3, '♯2'), (8, '♯5')))
+        self.assertEqual(registry['chromatic'].marks, ((11, 11, 11, '♫'),))
+
+    def test_user_spellings_and_label(self):
+        scale = user_scale([0, 3, 6, 9, 12])
+        scale['mode_label'] = 'name'
+        scale['spellings'] = {'1': {'3': '♯2'}}
+        scale['marks'] = {'1': {'5': {'2': '*'}}}
+        table = TheoryTable({'Scales': {'mine': scale}}, self.root_data)
+        table.compile()
+        entry = table.lookup('mine', 1, 5)
+        self.assertEqual(entry.intervals[3], '♯2')
+        self.assertEqual(entry.display_notes[:3], ('C', 'D♯', '*'))
+        self.assertEqual(entry.label, 'C Mine Scale, Mode 1')
+        self.assertEqual(table.lookup('mine', 2, 5).intervals[3], '♭3')
+
+    def test_user_degrees_are_named(self):
+        scale_data = {'Scales': {'mine': user_scale([0, 4, 6, 11, 12])}}
+        table = TheoryTable(scale_data, self.root_data)
+        table.compile()
+        for entry in table.entries.values():
+            self.assertEqual(len(entry.intervals), 13)
+            self.assertEqual(sum(1 for interval in entry.intervals if interval), len(entry.degrees))
+        entry = table.lookup('mine', 1, 5)
+        self.assertEqual(entry.intervals, ('1', '', '', '', '3', '', '♭5', '', '', '', '', '7', '8'))
+        self.assertEqual(entry.display_notes[:4], ('C', 'E', 'G♭', 'B'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#! python3
+# test_widget_table.py - Checks that WidgetTable only passes text, style sheets, and slider values on to the
+# widgets when they change, and counts every call it skipped.
+
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from widget_table import WidgetTable
+
+
+class Widget:
+    """Overall class to stand in for a QLabel or QSlider, counting the calls that would reach Qt."""
+
+    def __init__(self, text='', style='', value=0):
+        self.position = value
+        self.current_text = text
+        self.style = style
+        self.calls = []
+
+    def text(self):
+        self.calls.append('text')
+        return self.current_text
+
+    def setText(self, text):
+        self.calls.append('setText')
+        self.current_text = text
+
+    def styleSheet(self):
+        return self.style
+
+    def setStyleSheet(self, style):
+        self.calls.append('setStyleSheet')
+        self.style = style
+
+    def value(self):
+        return self.position
+
+    def setValue(self, value):
+        self.calls.append('setValue')
+        self.position = value
+
+
+def window():
+    """A function to make a stand-in for the window, with the widgets WidgetTable looks up by name."""
+
+    widgets = {}
+    for i in range(0, 13):
+        widgets['note_%02d_label' % i] = Widget('C')
+        widgets['scale_degree_%02d_label' % i] = Widget('1')
+        widgets['volume_slider_%02d' % i] = Widget(value=5)
+    for i in range(0, 2):
+        widgets['drone_label_%02d' % i] = Widget('C')
+        widgets['drone_slider_%02d' % i] = Widget(value=0)
+    return SimpleNamespace(**widgets)
+
+
+class WidgetTableTest(unittest.TestCase):
+    """Overall class to set the text, style sheets, and values of stand-in widgets."""
+
+    def setUp(self):
+        self.window = window()
+        self.widgets = WidgetTable(self.window)
+        self.label = self.widgets.note_labels[3]
+        self.label.calls.clear()
+
+    def test_the_same_text_is_skipped(self):
+        self.assertFalse(self.widgets.set_text(self.label, 'C'))
+        self.assertTrue(self.widgets.set_text(self.label, 'D♭'))
+        self.assertFalse(self.widgets.set_text(self.label, 'D♭'))
+        self.assertTrue(self.widgets.set_text(self.label, 'C'))
+
+        self.assertEqual(self.label.calls, ['setText', 'setText'])
+        self.assertEqual(self.widgets.stats(), {'applied': 2, 'skipped': 2})
+
+    def test_text_is_read_without_asking_the_widget(self):
+        self.widgets.set_text(self.label, 'E')
+        self.assertEqual(self.widgets.text(self.label), 'E')
+        self.assertEqual(self.label.calls, ['setText'])
+
+        # A widget outside the table is asked once, then remembered
+        other = Widget('G')
+        self.assertEqual(self.widgets.text(other), 'G')
+        self.assertEqual(self.widgets.text(other), 'G')
+        self.assertEqual(other.calls, ['text'])
+
+    def test_the_same_style_is_skipped(self):
+        style = 'color: rgb(120, 120, 120)'
+        self.assertTrue(self.widgets.set_style(self.label, style))
+        self.assertFalse(self.widgets.set_style(self.label, style))
+        self.assertFalse(self.widgets.set_style(self.widgets.degree_labels[0], ''))
+        self.assertEqual(self.label.calls, ['setStyleSheet'])
+
+    def test_a_slider_already_in_place_is_not_moved(self):
+        slider = self.widgets.volume_sliders[0]
+        self.assertFalse(self.widgets.set_value(slider, 5))
+        self.assertTrue(self.widgets.set_value(slider, 8))
+        self.assertEqual(slider.calls, ['setValue'])
+        self.assertEqual(self.widgets.stats(), {'applied': 1, 'skipped': 1})
+
+    def test_redrawing_a_column_unchanged_reaches_no_widget(self):
+        columns = [(self.widgets.note_labels[i], self.widgets.degree_labels[i]) for i in range(0, 13)]
+        for note_label, degree_label in columns:
+            self.widgets.set_text(note_label, 'F♯')
+            self.widgets.set_text(degree_label, '♯4')
+        applied = self.widgets.applied
+
+        for note_label, degree_label in columns:
+            self.widgets.set_text(note_label, 'F♯')
+            self.widgets.set_text(degree_label, '♯4')
+        self.assertEqual(self.widgets.applied, applied)
+        self.assertEqual(self.widgets.skipped, 26)
+
+
+if __name__ == '__main__':
+    unittest.main()
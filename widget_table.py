@@ -0,0 +1,77 @@
+#! python3
+# widget_table.py - Finds the window's note labels, scale degree labels, and sliders once, and passes only real
+# changes of their text, style sheets, and values on to Qt.
+
+
+class WidgetTable:
+    """Overall class to hold the widgets of the 13 note columns and the 2 drones, and to set their text, style
+    sheets, and values only when they change. Every call that would have changed nothing is counted as
+    skipped. (Setting a style sheet makes Qt polish the widget again, even when it is the same style sheet.)"""
+
+    def __init__(self, window):
+        """A method to look up the widgets of a window built from Ukulele_Chimes_Layout.ui."""
+
+        self.note_labels = [getattr(window, "note_%02d_label" % i) for i in range(0, 13)]
+        self.degree_labels = [getattr(window, "scale_degree_%02d_label" % i) for i in range(0, 13)]
+        self.volume_sliders = [getattr(window, "volume_slider_%02d" % i) for i in range(0, 13)]
+        self.drone_labels = [window.drone_label_00, window.drone_label_01]
+        self.drone_sliders = [window.drone_slider_00, window.drone_slider_01]
+
+        # The text and style sheet last given to each label, starting from what the layout set
+        self.texts = {}
+        self.styles = {}
+        for label in self.note_labels + self.degree_labels + self.drone_labels:
+            self.texts[label] = label.text()
+            self.styles[label] = label.styleSheet()
+
+        # Counters
+        self.applied = 0
+        self.skipped = 0
+
+    def text(self, widget):
+        """A method to return the text of a label, without asking Qt."""
+
+        text = self.texts.get(widget)
+        if text is None:
+            text = self.texts[widget] = widget.text()
+        return text
+
+    def set_text(self, widget, text):
+        """A method to set the text of a label, if it is different. Returns True if it was set."""
+
+        if self.texts.get(widget) == text:
+            self.skipped += 1
+            return False
+
+        widget.setText(text)
+        self.texts[widget] = text
+        self.applied += 1
+        return True
+
+    def set_style(self, widget, style):
+        """A method to set the style sheet of a widget, if it is different. Returns True if it was set."""
+
+        if self.styles.get(widget) == style:
+            self.skipped += 1
+            return False
+
+        widget.setStyleSheet(style)
+        self.styles[widget] = style
+        self.applied += 1
+        return True
+
+    def set_value(self, slider, value):
+        """A method to move a slider (or dial), if it is somewhere else. Returns True if it was moved."""
+
+        if slider.value() == value:
+            self.skipped += 1
+            return False
+
+        slider.setValue(value)
+        self.applied += 1
+        return True
+
+    def stats(self):
+        """A method to count the calls that reached Qt, and the calls skipped because nothing changed."""
+
+        return {'applied': self.applied, 'skipped': self.skipped}